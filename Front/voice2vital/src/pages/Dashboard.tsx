@@ -58,35 +58,48 @@ const Dashboard: React.FC = () => {
 
   const [patients, setPatients] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [totalPatients, setTotalPatients] = useState<number | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  useEffect(() => {
-    if (!user.id || !user.token) return;
+  const fetchPatients = async (cursor: string | null = null) => {
+    const params = new URLSearchParams({ fields: 'id,first_name,last_name', limit: '50' });
+    if (cursor) params.set('cursor', cursor);
 
-    const fetchPatients = async () => {
-      try {
-        const res = await fetch(`http://127.0.0.1:5000/doctor/${user.id}/patients`, {
-          headers: {
-            "Authorization": `Bearer ${user.token}`,
-            "Content-Type": "application/json"
-          }
-        });
-
-        const data = await res.json();
-        if (data.success) {
-          setPatients(data.patients || []);
-        } else {
-          console.error("Error fetching patients:", data.error);
+    try {
+      const res = await fetch(`http://127.0.0.1:5000/doctor/${user.id}/patients?${params}`, {
+        headers: {
+          "Authorization": `Bearer ${user.token}`,
+          "Content-Type": "application/json"
         }
-      } catch (err) {
-        console.error("Fetch error:", err);
-      } finally {
-        setLoading(false);
+      });
+
+      const data = await res.json();
+      if (data.success) {
+        setPatients(prev => cursor ? [...prev, ...(data.patients || [])] : (data.patients || []));
+        setNextCursor(data.next_cursor || null);
+        // The total is only estimated on the first page
+        if (!cursor) setTotalPatients(data.total_estimate ?? null);
+      } else {
+        console.error("Error fetching patients:", data.error);
       }
-    };
+    } catch (err) {
+      console.error("Fetch error:", err);
+    }
+  };
 
-    fetchPatients();
+  useEffect(() => {
+    if (!user.id || !user.token) return;
+
+    fetchPatients().finally(() => setLoading(false));
   }, [user.id, user.token]);
 
+  const loadMorePatients = async () => {
+    setLoadingMore(true);
+    await fetchPatients(nextCursor);
+    setLoadingMore(false);
+  };
+
   const recordSession = (patient: any) => {
     nav('/session', {
       state: {
@@ -294,7 +307,9 @@ const Dashboard: React.FC = () => {
               color: '#718096',
               margin: '0'
             }}>
-              {patients.length} patient{patients.length !== 1 ? 's' : ''} registered
+              {nextCursor && totalPatients !== null
+                ? `About ${Math.max(totalPatients, patients.length)} patients registered`
+                : `${patients.length} patient${patients.length !== 1 ? 's' : ''} registered`}
             </p>
           </div>
 
@@ -433,6 +448,25 @@ const Dashboard: React.FC = () => {
                     </button>
                   </div>
                 ))}
+                {nextCursor && (
+                  <button
+                    onClick={loadMorePatients}
+                    disabled={loadingMore}
+                    style={{
+                      width: '100%',
+                      padding: isMobile ? '12px' : '14px',
+                      fontSize: isMobile ? '13px' : '14px',
+                      fontWeight: '600',
+                      border: 'none',
+                      background: 'transparent',
+                      color: '#319795',
+                      cursor: loadingMore ? 'default' : 'pointer',
+                      fontFamily: 'inherit'
+                    }}
+                  >
+                    {loadingMore ? 'Loading...' : 'Load more patients'}
+                  </button>
+                )}
               </div>
             )}
           </div>
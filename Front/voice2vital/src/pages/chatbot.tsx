@@ -76,36 +76,68 @@ const ChatBox: React.FC = () => {
         setIsTyping(true);
 
         try {
-            // Make API call to backend
+            // Make API call to backend, streaming the answer as it is generated
             const response = await fetch('http://127.0.0.1:5000/chat/query', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    message: userMessage
+                    message: userMessage,
+                    stream: true
                 })
             });
 
-            const data = await response.json();
-
+            const botMessageId = Date.now();
             let botResponse = '';
 
-            if (data.success && data.ai_response) {
-                botResponse = data.ai_response;
-            } else {
-                // Fallback response if API fails
-                botResponse = data.error || 'Sorry, I encountered an issue processing your request. Please try again.';
+            const updateBotMessage = (content: string) => {
+                setMessages(prev => {
+                    const existing = prev.find(message => message.id === botMessageId);
+                    if (existing) {
+                        return prev.map(message => message.id === botMessageId ? { ...message, content } : message);
+                    }
+                    return [...prev, { id: botMessageId, content, isBot: true, timestamp: new Date() }];
+                });
+            };
+
+            if (!response.ok || !response.body) {
+                const data = await response.json();
+                updateBotMessage(data.error || 'Sorry, I encountered an issue processing your request. Please try again.');
+                return;
             }
 
-            const newMessage: Message = {
-                id: Date.now(),
-                content: botResponse,
-                isBot: true,
-                timestamp: new Date()
-            };
+            // The response is newline-delimited JSON events
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop() || '';
+
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const event = JSON.parse(line);
+
+                    if (event.type === 'text') {
+                        botResponse += event.text;
+                        setIsTyping(false);
+                        updateBotMessage(botResponse);
+                    } else if (event.type === 'error') {
+                        botResponse = botResponse || event.error || 'Sorry, I encountered an issue processing your request. Please try again.';
+                        updateBotMessage(botResponse);
+                    }
+                }
+            }
 
-            setMessages(prev => [...prev, newMessage]);
+            if (!botResponse) {
+                updateBotMessage('Sorry, I encountered an issue processing your request. Please try again.');
+            }
 
         } catch (error) {
             console.error('Error calling chat API:', error);
@@ -0,0 +1,259 @@
+# ASGI serving mode for the API.
+#
+# The slow AI routes (/chat/query and /transcribe/audio) run as coroutines on
+# the server's event loop, so one process can hold hundreds of them open while
+# they wait on MCP, Gemini and Rev.ai. Every other route is served by the Flask
+# app in main.py through a WSGI adapter.
+#
+# Live transcription can also stream over a WebSocket at
+# /transcribe/live/<session_id>/ws instead of one POST per audio frame.
+#
+# Chat, Gemini and Rev.ai calls are async end to end. What is still blocking
+# (spooling uploads to disk, saving notes through supabase-py, feeding live
+# audio frames) runs on a pool of ASGI_BLOCKING_THREADS threads, so at most
+# that many of those steps run at once and the rest wait their turn; the
+# event loop itself never blocks. Flask routes get their own ASGI_WSGI_THREADS.
+#
+# Run with:
+#     uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+from werkzeug.utils import secure_filename
+
+import main
+from client import process_user_question, answer_user_question_async, astream_user_question, CHAT_MODE
+from transcribe import transcribe
+from metrics import span, start_trace, end_trace
+from ratelimit import work_started
+
+# --- Config ---
+ASGI_BLOCKING_THREADS = int(os.getenv("ASGI_BLOCKING_THREADS", "32"))  # threads for blocking steps of the async routes
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "10"))  # threads serving the Flask routes
+
+
+async def chat_with_database(request):
+    """Async version of main.chat_with_database"""
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+
+        if not data:
+            return JSONResponse({
+                'error': 'No data provided',
+                'success': False
+            }, status_code=400)
+
+        user_message = data.get('message')
+
+        if not user_message:
+            return JSONResponse({
+                'error': 'Message is required',
+                'success': False
+            }, status_code=400)
+
+        if data.get('stream'):
+            return StreamingResponse(chat_event_lines(user_message), media_type='application/x-ndjson')
+
+        try:
+            if CHAT_MODE == 'function_calling':
+                ai_response = await answer_user_question_async(user_message)
+            else:
+                ai_response = await process_user_question(user_message)
+        except Exception as process_error:
+            return JSONResponse({
+                'error': f'AI processing failed: {str(process_error)}',
+                'success': False
+            }, status_code=500)
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Query processed successfully',
+            'user_message': user_message,
+            'ai_response': ai_response
+        }, status_code=200)
+
+    except Exception as e:
+        return JSONResponse({
+            'error': f'Chat query error: {str(e)}',
+            'success': False
+        }, status_code=500)
+
+
+async def chat_event_lines(user_message):
+    """Async version of main.chat_event_lines"""
+    try:
+        async for event in astream_user_question(user_message):
+            yield json.dumps(event) + "\n"
+    except Exception as stream_error:
+        yield json.dumps({'type': 'error', 'error': f'AI processing failed: {str(stream_error)}'}) + "\n"
+    yield json.dumps({'type': 'done'}) + "\n"
+
+
+async def submit_audio_for_transcription(request):
+    """Async version of main.submit_audio_for_transcription, with the same opt-in trace"""
+    if not main.trace_requested(request.query_params, request.headers):
+        return await transcribe_audio(request)
+
+    trace, token = start_trace(request.headers.get('X-Trace-Id'))
+    try:
+        response = await transcribe_audio(request)
+    finally:
+        end_trace(token)
+    body = main.attach_trace(json.loads(response.body), trace)
+    return JSONResponse(body, status_code=response.status_code, headers={'X-Trace-Id': trace.id})
+
+
+async def transcribe_audio(request):
+    try:
+        form = await request.form()
+        patient_id = form.get('patient_id') or "1"
+        doctor_id = form.get('doctor_id') or "1"
+
+        upload = form.get('audio_file')
+        if upload is None or isinstance(upload, str):
+            return JSONResponse({
+                'error': 'No audio file provided',
+                'success': False
+            }, status_code=400)
+
+        if upload.filename == '':
+            return JSONResponse({
+                'error': 'No file selected',
+                'success': False
+            }, status_code=400)
+
+        if not main.allowed_file(upload.filename):
+            return JSONResponse({
+                'error': f'Invalid file type. Allowed types: {", ".join(main.ALLOWED_EXTENSIONS)}',
+                'success': False
+            }, status_code=400)
+
+        filename = secure_filename(upload.filename)
+        with tempfile.NamedTemporaryFile(delete=False, dir=main.TRANSCRIBE_SPOOL_DIR, suffix=f".{filename.rsplit('.', 1)[1].lower()}") as temp_file:
+            await asyncio.to_thread(shutil.copyfileobj, upload.file, temp_file)
+            temp_file_path = temp_file.name
+        await form.close()
+
+        if request.query_params.get('mode', main.TRANSCRIBE_MODE) == 'queue':
+            return JSONResponse(main.enqueue_transcription({
+                'file_path': temp_file_path,
+                'patient_id': patient_id,
+                'doctor_id': doctor_id
+            }), status_code=202)
+
+        try:
+            with span('pipeline'), work_started():
+                try:
+                    clinical_note = await transcribe(temp_file_path)
+                finally:
+                    try:
+                        os.unlink(temp_file_path)
+                    except OSError:
+                        pass
+
+                result = await asyncio.to_thread(main.save_clinical_note, clinical_note, patient_id, doctor_id)
+
+            return JSONResponse({
+                'success': True,
+                'message': 'Audio transcribed successfully',
+                **result
+            }, status_code=200)
+
+        except Exception as transcription_error:
+            return JSONResponse({
+                'error': f'Transcription failed: {str(transcription_error)}',
+                'success': False
+            }, status_code=500)
+
+    except Exception as e:
+        return JSONResponse({
+            'error': f'Audio processing error: {str(e)}',
+            'success': False
+        }, status_code=500)
+
+
+async def live_transcription_socket(websocket):
+    """
+    Stream audio frames for a live session started with POST /transcribe/live.
+    Binary messages are audio; the server answers each with the session state.
+    Sending the text message "finish" saves the note and closes the socket.
+    """
+    session = main.live_sessions.get(websocket.path_params['session_id'])
+    await websocket.accept()
+
+    if not session:
+        await websocket.send_json({'error': 'Live session not found', 'success': False})
+        await websocket.close(code=4404)
+        return
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message.get('bytes'):
+                await asyncio.to_thread(session.feed, message['bytes'])
+                await websocket.send_json({'success': True, **session.snapshot(include_transcript=False)})
+            elif message.get('text') == 'finish':
+                break
+
+        main.live_sessions.discard(session.id)
+        clinical_note = await asyncio.to_thread(session.finish)
+        if clinical_note is None:
+            await websocket.send_json({'error': 'No speech was transcribed', 'success': False})
+        else:
+            result = await asyncio.to_thread(main.save_clinical_note, clinical_note,
+                                             session.metadata['patient_id'], session.metadata['doctor_id'])
+            await websocket.send_json({
+                'success': True,
+                'message': 'Live transcription completed successfully',
+                'transcript': session.transcript(),
+                **result
+            })
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        # The session stays open so the client can reconnect or finish over HTTP
+        pass
+    except Exception as e:
+        await websocket.send_json({'error': f'Live transcription failed: {str(e)}', 'success': False})
+        await websocket.close(code=1011)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # asyncio.to_thread runs on the loop's default executor; size it explicitly
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=ASGI_BLOCKING_THREADS, thread_name_prefix='asgi-blocking'))
+    main.resume_transcription_jobs()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route('/chat/query', chat_with_database, methods=['POST']),
+        Route('/transcribe/audio', submit_audio_for_transcription, methods=['POST']),
+        WebSocketRoute('/transcribe/live/{session_id}/ws', live_transcription_socket),
+        # Everything else is served by the Flask app
+        Mount('/', app=WSGIMiddleware(main.app, workers=ASGI_WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ]
+)
@@ -1,16 +1,45 @@
 import re
 from werkzeug.security import generate_password_hash
 
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PATTERN = re.compile(r'^\+?\d{10,15}$')
+PHONE_SEPARATORS = re.compile(r'[\s\-\(\)]')
+
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_phone(phone):
     """Validate phone number format (basic validation)"""
     if not phone:
         return True  # Phone is optional
     # Remove spaces, dashes, and parentheses
-    cleaned_phone = re.sub(r'[\s\-\(\)]', '', phone)
+    cleaned_phone = PHONE_SEPARATORS.sub('', phone)
     # Check if it contains only digits and optional + at the start
-    return re.match(r'^\+?\d{10,15}$', cleaned_phone) is not None
+    return PHONE_PATTERN.match(cleaned_phone) is not None
+
+def validate_patient_rows(rows, required=('id_number', 'first_name', 'last_name')):
+    """
+    Validate patient rows in one pass.
+    
+    Args:
+        rows: list of patient dicts
+        required: fields every row must have
+    
+    Returns:
+        list: one list of error messages per row (empty when the row is valid)
+    """
+    errors = []
+    for row in rows:
+        row_errors = [f'{field} is required' for field in required if not str(row.get(field) or '').strip()]
+        email = row.get('email_address')
+        if email and not validate_email(str(email)):
+            row_errors.append('Invalid email format')
+        for field in ('phone_number', 'emergency_contact_phone'):
+            if not validate_phone(str(row.get(field) or '')):
+                row_errors.append(f'Invalid {field.replace("_", " ")} format')
+        physician = row.get('primary_physician')
+        if physician not in (None, '') and not str(physician).isdigit():
+            row_errors.append('primary_physician must be a doctor id')
+        errors.append(row_errors)
+    return errors
@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'bench-key')
+
+import processing
+from processing import ClinicalNote
+from extractors import set_extractor
+
+# Latency model for the fake Gemini call, roughly shaped like a hosted flash model:
+# fixed overhead, plus prompt processing, plus generation of the JSON note.
+BASE_LATENCY = float(os.getenv('BENCH_BASE_LATENCY', '0.4'))  # seconds
+INPUT_TOKEN_LATENCY = float(os.getenv('BENCH_INPUT_TOKEN_LATENCY', '0.00002'))  # seconds per prompt token
+OUTPUT_TOKEN_LATENCY = float(os.getenv('BENCH_OUTPUT_TOKEN_LATENCY', '0.004'))  # seconds per generated token
+TIME_SCALE = float(os.getenv('BENCH_TIME_SCALE', '0.1'))  # shrink sleeps so the benchmark runs quickly
+MINUTES = [int(m) for m in os.getenv('BENCH_MINUTES', '15,30,60,90').split(',')]
+PARALLEL = int(os.getenv('EXTRACTION_MAX_PARALLEL', '4'))
+
+MEDICATIONS = ["metformin 500 mg", "lisinopril 10 mg", "atorvastatin 20 mg", "omeprazole 20 mg",
+               "levothyroxine 50 mcg", "amlodipine 5 mg", "sertraline 50 mg", "albuterol inhaler"]
+ALLERGIES = ["penicillin", "sulfa drugs", "latex", "peanuts"]
+FILLER = ["Okay, and how long has that been going on?", "It started a few weeks ago, maybe a month.",
+          "Does anything make it better or worse?", "Not really, it comes and goes.",
+          "Alright, let me take a look.", "Any changes in your sleep or appetite?"]
+
+
+def estimate_tokens(text):
+    return len(text) // 4
+
+
+def synthetic_transcript(minutes, seed=0):
+    """About 150 spoken words a minute, with medications and allergies mentioned throughout."""
+    rng = random.Random(seed)
+    lines = []
+    words = 0
+    while words < minutes * 150:
+        roll = rng.random()
+        if roll < 0.05:
+            line = f"Person 2: I also take {rng.choice(MEDICATIONS)} every day."
+        elif roll < 0.07:
+            line = f"Person 2: I'm allergic to {rng.choice(ALLERGIES)}."
+        else:
+            line = f"Person {rng.randint(1, 2)}: {rng.choice(FILLER)}"
+        lines.append(line)
+        words += len(line.split()) - 2
+    return "\n".join(lines)
+
+
+class FakeExtractor:
+    """Extractor with Gemini-like latency that picks facts out of the prompt with regexes."""
+
+    name = "fake"
+    cache_key = "fake"
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.max_input_tokens = 0
+        self.lock = threading.Lock()
+
+    def generate(self, contents, schema):
+        transcript = contents.split("Transcript:\n", 1)[-1]
+        medications = list(dict.fromkeys(re.findall(r"I also take (.+?) every day", transcript)))
+        allergies = list(dict.fromkeys(re.findall(r"I'm allergic to (.+?)\.", transcript)))
+        note = ClinicalNote.model_validate({
+            "patient_info": {"patient_name": "Not stated", "sex": "Not stated"},
+            "history_of_present_illness": "Intermittent symptoms for about a month." if transcript.strip() else "Not stated",
+            "medications": medications,
+            "allergies": allergies,
+            "previous_history": {}, "review_of_systems": {}, "physical_exam": {}
+        })
+
+        input_tokens = estimate_tokens(contents)
+        output_tokens = estimate_tokens(note.model_dump_json())
+        with self.lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.max_input_tokens = max(self.max_input_tokens, input_tokens)
+        time.sleep(TIME_SCALE * (BASE_LATENCY + input_tokens * INPUT_TOKEN_LATENCY + output_tokens * OUTPUT_TOKEN_LATENCY))
+        return note
+
+    def generate_batch(self, prompts, schema):
+        with ThreadPoolExecutor(max_workers=PARALLEL) as executor:
+            return list(executor.map(lambda prompt: self.generate(prompt, schema), prompts))
+
+
+def run(transcript, chunked):
+    fake = FakeExtractor()
+    set_extractor(fake)
+    start = time.perf_counter()
+    if chunked:
+        note = processing.extract_clinical_note_chunked(transcript, reconcile=False)
+    else:
+        note = processing.generate_note(processing.build_prompt(transcript))
+    elapsed = (time.perf_counter() - start) / TIME_SCALE
+    return note, elapsed, fake
+
+
+if __name__ == "__main__":
+    print(f"{'minutes':>7} {'mode':>8} {'calls':>5} {'latency_s':>9} {'max_prompt_tok':>14} "
+          f"{'total_in_tok':>12} {'total_out_tok':>13} {'meds':>4} {'allergies':>9}")
+    for minutes in MINUTES:
+        transcript = synthetic_transcript(minutes)
+        single_note = None
+        for chunked in (False, True):
+            note, elapsed, fake = run(transcript, chunked)
+            if not chunked:
+                single_note = note
+            print(f"{minutes:>7} {'chunked' if chunked else 'single':>8} {fake.calls:>5} {elapsed:>9.2f} "
+                  f"{fake.max_input_tokens:>14} {fake.input_tokens:>12} {fake.output_tokens:>13} "
+                  f"{len(note.medications):>4} {len(note.allergies):>9}")
+        assert set(note.medications) == set(single_note.medications)
+        assert set(note.allergies) == set(single_note.allergies)
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'bench-key')
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+os.environ.setdefault('REV_AI_TOKEN', 'bench-token')
+os.environ.setdefault('GEMINI_API_KEY', 'bench-key')
+
+import main
+from fake_supabase import FakeSupabase
+
+REQUESTS = int(os.getenv('BENCH_REQUESTS', '2000'))
+
+
+def run(cache_enabled):
+    main.supabase = FakeSupabase({
+        'doctor_table': [{
+            'id': 1, 'first_name': 'Emily', 'last_name': 'Stone',
+            'email_address': 'emily@example.com', 'password': 'password123',
+            'id_number': '1', 'phone_number': None, 'practice_number': None,
+            'specialty': None, 'hospital': None
+        }],
+        'patient_table': [{'id': 1, 'first_name': 'Sam', 'primary_physician': 1}]
+    })
+    main.principal_cache.clear()
+    main.principal_cache.hits = main.principal_cache.misses = 0
+    main.row_cache.clear()
+    client = main.app.test_client()
+
+    token = client.post('/signin/doctor', json={
+        'email_address': 'emily@example.com', 'password': 'password123'
+    }).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    calls_before = main.supabase.calls
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        if not cache_enabled:
+            main.principal_cache.clear()
+            main.row_cache.clear()
+        client.get('/doctor/1/patients', headers=headers)
+    elapsed = time.perf_counter() - start
+
+    db_calls = main.supabase.calls - calls_before
+    print(f"cache {'on ' if cache_enabled else 'off'}: {REQUESTS} requests in {elapsed:.2f}s, "
+          f"{db_calls / REQUESTS:.2f} DB calls/request, hit rate {main.principal_cache.stats()['hit_rate']}")
+
+
+if __name__ == "__main__":
+    run(cache_enabled=False)
+    run(cache_enabled=True)
@@ -0,0 +1,361 @@
+# Local stand-ins for the services the backend talks to, so it can be
+# benchmarked without network access or API spend:
+#
+#   FakeRevAi      Rev.ai async job API; jobs finish `turnaround` seconds after submission
+#   FakeGemini     generateContent; canned ClinicalNote JSON or chat answers after an injected latency
+#   FakePostgrest  PostgREST and storage endpoints over FakeSupabase's in-memory tables
+#
+# Each one is a threaded HTTP server on 127.0.0.1 running in a background thread.
+# Point the backend at `service.url` (REV_AI_URL, GEMINI_BASE_URL, SUPABASE_URL).
+
+import re
+import json
+import time
+import uuid
+import random
+import threading
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, unquote
+from fake_supabase import FakeSupabase, parse_logic_filter
+
+
+def read_body(handler):
+    """Read a request body sent with Content-Length or chunked transfer encoding."""
+    if handler.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int(handler.rfile.readline().split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                handler.rfile.readline()
+                return body
+            body += handler.rfile.read(size)
+            handler.rfile.readline()
+    length = int(handler.headers.get('Content-Length') or 0)
+    return handler.rfile.read(length) if length else b''
+
+
+class LocalService:
+    """
+    Threaded HTTP server on a free local port. Subclasses implement
+    handle(method, path, query, headers, body) and return (status, headers, payload),
+    where payload is bytes or anything JSON-serializable. With a `capacity`,
+    requests beyond that many in flight are refused with 429, like a provider
+    enforcing its concurrency limit.
+    """
+
+    def __init__(self, port=0, capacity=0):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def dispatch(self):
+                parts = urlsplit(self.path)
+                body = read_body(self)
+                admitted = service.enter()
+                try:
+                    if not admitted:
+                        status, headers, payload = 429, {}, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED',
+                                                                       'message': 'Too many concurrent requests'}}
+                    else:
+                        status, headers, payload = service.handle(
+                            self.command, unquote(parts.path), parse_qsl(parts.query, keep_blank_values=True),
+                            self.headers, body
+                        )
+                except Exception as e:
+                    status, headers, payload = 500, {}, {'message': str(e)}
+                finally:
+                    service.leave(admitted)
+                if not isinstance(payload, bytes):
+                    payload = json.dumps(payload).encode()
+                    headers = {'Content-Type': 'application/json', **headers}
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = dispatch
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.capacity = capacity
+        self.requests = 0
+        self.refused = 0
+        self.in_flight = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    def enter(self):
+        """Count a request; False if it is over capacity."""
+        with self._count_lock:
+            self.requests += 1
+            if self.capacity and self.in_flight >= self.capacity:
+                self.refused += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self, admitted):
+        if admitted:
+            with self._count_lock:
+                self.in_flight -= 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, method, path, query, headers, body):
+        raise NotImplementedError
+
+
+CONVERSATION = [
+    (0, "Good morning, what brings you in today?"),
+    (1, "I've had a cough and a low fever for about five days."),
+    (0, "Any shortness of breath or chest pain?"),
+    (1, "A little short of breath when I climb stairs, no chest pain."),
+    (0, "Are you taking any medications, and do you have any allergies?"),
+    (1, "Metformin 500 milligrams twice a day. I'm allergic to penicillin."),
+    (0, "Your temperature is 38.2 and oxygen saturation is 96 percent. Your chest has some crackles on the right."),
+    (0, "This looks like a community acquired pneumonia. I'll start you on doxycycline and order a chest x-ray."),
+]
+
+
+def canned_transcript(conversation=CONVERSATION):
+    """Rev.ai transcript JSON (monologues of text and punctuation elements) for a conversation."""
+    monologues = []
+    for speaker, line in conversation:
+        elements = []
+        for i, word in enumerate(line.split(' ')):
+            if i:
+                elements.append({'type': 'punct', 'value': ' '})
+            elements.append({'type': 'text', 'value': word, 'ts': float(i), 'end_ts': i + 0.5, 'confidence': 0.98})
+        monologues.append({'speaker': speaker, 'elements': elements})
+    return {'monologues': monologues}
+
+
+class FakeRevAi(LocalService):
+    """Rev.ai job API: jobs report "in_progress" until `turnaround` seconds after submission."""
+
+    def __init__(self, turnaround=2.0, transcript=None, port=0, capacity=0):
+        super().__init__(port, capacity)
+        self.turnaround = turnaround
+        self.transcript = transcript or canned_transcript()
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def _job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        done = time.monotonic() - job['submitted'] >= self.turnaround
+        return {
+            'id': job_id,
+            'created_on': job['created_on'],
+            'status': 'transcribed' if done else 'in_progress',
+            'type': 'async',
+            'name': job['name']
+        }
+
+    def handle(self, method, path, query, headers, body):
+        match = re.fullmatch(r'/speechtotext/v1/jobs(?:/([^/]+))?(/transcript)?', path)
+        if not match:
+            return 404, {}, {'title': 'Not found'}
+        job_id, transcript = match.groups()
+
+        if method == 'POST' and not job_id:
+            job_id = uuid.uuid4().hex[:12]
+            name = re.search(rb'filename="([^"]*)"', body)
+            with self._lock:
+                self.jobs[job_id] = {
+                    'submitted': time.monotonic(),
+                    'created_on': datetime.now(timezone.utc).isoformat(),
+                    'name': name.group(1).decode() if name else None
+                }
+            return 200, {}, self._job(job_id)
+
+        job = self._job(job_id) if job_id else None
+        if method != 'GET' or job is None:
+            return 404, {}, {'title': 'Could not find job'}
+        if not transcript:
+            return 200, {}, job
+        if job['status'] != 'transcribed':
+            return 409, {}, {'title': 'Job is not transcribed'}
+        return 200, {'Content-Type': 'application/vnd.rev.transcript.v1.0+json'}, json.dumps(self.transcript).encode()
+
+
+CLINICAL_NOTE = {
+    'patient_info': {'patient_name': 'Sam Carter', 'age': '54', 'sex': 'male', 'date_of_clinic_visit': '2025-03-14'},
+    'history_of_present_illness': 'Five days of cough and low-grade fever with exertional shortness of breath.',
+    'allergies': ['penicillin'],
+    'medications': ['metformin 500 mg twice daily'],
+    'previous_history': {'past_medical_history': ['type 2 diabetes']},
+    'review_of_systems': {'positive_findings': ['cough', 'fever', 'dyspnea on exertion'], 'negative_findings': ['chest pain']},
+    'physical_exam': {
+        'general_appearance': 'Alert, mildly unwell',
+        'vital_signs': {'temperature': '38.2 C', 'oxygen_saturation': '96%'},
+        'examination_findings': 'Right basal crackles'
+    },
+    'assessment': 'Community acquired pneumonia',
+    'icd10_codes': ['J18.9'],
+    'plan': ['Doxycycline', 'Chest x-ray'],
+    'medical_decision_making': 'Penicillin allergy, so doxycycline rather than amoxicillin.'
+}
+
+TOOL_DECISION = {
+    'context_understood': True,
+    'available_tables': ['doctor_table', 'patient_table', 'clinical_notes'],
+    'relevant_table': 'doctor_table',
+    'tool_needed': True,
+    'tool_name': 'search_doctors',
+    'parameters': {'search_term': 'Emily', 'search_field': 'first_name'},
+    'reasoning': 'The question asks about a doctor by first name.'
+}
+
+
+class FakeGemini(LocalService):
+    """
+    Gemini generateContent. Requests for JSON output get the canned clinical
+    note, the chat tool-picking prompt gets a search_doctors decision, and
+    anything else gets a short text answer, each after `latency` ± `jitter` seconds.
+    """
+
+    def __init__(self, latency=0.8, jitter=0.2, note=None, port=0, capacity=0):
+        super().__init__(port, capacity)
+        self.latency = latency
+        self.jitter = jitter
+        self.note = note or CLINICAL_NOTE
+
+    def answer(self, request):
+        prompt = ' '.join(part.get('text', '') for content in request.get('contents', [])
+                          for part in content.get('parts', []))
+        config = request.get('generationConfig') or {}
+        if config.get('responseMimeType') == 'application/json':
+            return json.dumps(self.note)
+        if 'tool_needed' in prompt:
+            return json.dumps(TOOL_DECISION)
+        return "Yes, Dr. Emily Stone is in the database."
+
+    def handle(self, method, path, query, headers, body):
+        match = re.fullmatch(r'/v1(?:beta)?/models/([^:]+):generateContent', path)
+        if method != 'POST' or not match:
+            return 404, {}, {'error': {'code': 404, 'message': f'{path} is not supported', 'status': 'NOT_FOUND'}}
+        text = self.answer(json.loads(body or b'{}'))
+        time.sleep(max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter)))
+        return 200, {}, {
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP', 'index': 0}],
+            'usageMetadata': {'promptTokenCount': len(body) // 4, 'candidatesTokenCount': len(text) // 4},
+            'modelVersion': match.group(1)
+        }
+
+
+def _projection(select):
+    if not select or select.strip() == '*':
+        return None
+    return [column.strip() for column in select.split(',') if column.strip()]
+
+
+def _multipart_file(body, content_type):
+    """The first file in a multipart/form-data body."""
+    message = BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+    for part in message.get_payload() if message.is_multipart() else []:
+        if part.get_filename():
+            return part.get_payload(decode=True)
+    return body
+
+
+class FakePostgrest(LocalService):
+    """
+    The PostgREST (/rest/v1) and storage (/storage/v1) endpoints supabase-py
+    calls, backed by a FakeSupabase. Covers select projection, column and
+    and/or filters, order, limit, counts via Content-Range, insert, upsert and
+    update. Unknown RPC functions answer 404 like PostgREST does.
+    """
+
+    def __init__(self, tables=None, port=0):
+        super().__init__(port)
+        self.db = FakeSupabase(tables)
+        self.objects = {}
+
+    def handle(self, method, path, query, headers, body):
+        if path.startswith('/storage/v1/'):
+            return self.handle_storage(method, path[len('/storage/v1/'):], headers, body)
+        if path.startswith('/rest/v1/rpc/'):
+            return 404, {}, {'code': 'PGRST202', 'message': f'Could not find the function {path.rsplit("/", 1)[1]}',
+                             'details': None, 'hint': None}
+        if not path.startswith('/rest/v1/'):
+            return 404, {}, {'message': 'Not found'}
+
+        prefer = headers.get('Prefer', '')
+        request = self.db.table(path[len('/rest/v1/'):])
+        select = None
+        for name, value in query:
+            if name == 'select':
+                select = value
+            elif name == 'limit':
+                request.limit(int(value))
+            elif name == 'order':
+                for term in value.split(','):
+                    column, *options = term.split('.')
+                    nullsfirst = True if 'nullsfirst' in options else False if 'nullslast' in options else None
+                    request.order(column, desc='desc' in options, nullsfirst=nullsfirst)
+            elif name in ('or', 'and'):
+                request.filters.append(parse_logic_filter(f'{name}{value}'))
+            elif name not in ('on_conflict', 'columns'):
+                request.filters.append(parse_logic_filter(f'{name}.{value}'))
+
+        if method == 'GET':
+            count = re.search(r'count=(\w+)', prefer)
+            request.select(count=count.group(1) if count else None)
+        elif method == 'POST':
+            payload = json.loads(body)
+            if 'resolution=' in prefer:
+                request.upsert(payload, on_conflict=dict(query).get('on_conflict'),
+                               ignore_duplicates='resolution=ignore-duplicates' in prefer)
+            else:
+                request.insert(payload)
+        elif method == 'PATCH':
+            request.update(json.loads(body))
+        else:
+            return 405, {}, {'message': f'{method} is not supported'}
+
+        try:
+            response = request.execute()
+        except ValueError as e:
+            return 400, {}, {'code': '21000', 'message': str(e), 'details': None, 'hint': None}
+
+        columns = _projection(select)
+        rows = response.data if columns is None else [{c: row.get(c) for c in columns} for row in response.data]
+        result_headers = {}
+        if response.count is not None:
+            span = f'0-{len(rows) - 1}' if rows else '*'
+            result_headers['Content-Range'] = f'{span}/{response.count}'
+        return (201 if method == 'POST' else 200), result_headers, rows
+
+    def handle_storage(self, method, path, headers, body):
+        public = re.fullmatch(r'object/public/(.+)', path)
+        if method == 'GET' and public:
+            stored = self.objects.get(public.group(1))
+            if stored is None:
+                return 404, {}, {'statusCode': '404', 'error': 'not_found', 'message': 'Object not found'}
+            return 200, {'Content-Type': 'application/json'}, stored
+        upload = re.fullmatch(r'object/(.+)', path)
+        if method in ('POST', 'PUT') and upload:
+            content_type = headers.get('Content-Type', '')
+            data = _multipart_file(body, content_type) if content_type.startswith('multipart/') else body
+            self.objects[upload.group(1)] = data
+            return 200, {}, {'Key': upload.group(1), 'Id': uuid.uuid4().hex}
+        return 404, {}, {'statusCode': '404', 'error': 'not_found', 'message': f'{method} {path} is not supported'}
@@ -0,0 +1,223 @@
+import re
+import threading
+from itertools import count
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _split_top_level(text):
+    """Split "a,or(b,c),d" on the commas that are not nested or quoted."""
+    parts, depth, quoted, current = [], 0, False, ''
+    for i, char in enumerate(text):
+        if char == '"' and (i == 0 or text[i - 1] != '\\'):
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+def _like_to_regex(pattern):
+    """LIKE pattern (with PostgREST's * for %) to a regex; backslash escapes the next character."""
+    regex = ''
+    chars = iter(pattern)
+    for char in chars:
+        if char == '\\':
+            regex += re.escape(next(chars, '\\'))
+        elif char in '*%':
+            regex += '.*'
+        elif char == '_':
+            regex += '.'
+        else:
+            regex += re.escape(char)
+    return regex
+
+
+def _compare(value, other):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value, type(value)(other)
+    return str(value), other
+
+
+def parse_logic_filter(text):
+    """
+    Turn a PostgREST logic tree such as "and(or(a.eq.1,b.is.null),id.gt.5)"
+    into a row predicate. Supports eq, neq, gt, gte, lt, lte, in, is and ilike.
+    """
+    match = re.fullmatch(r'(and|or)\((.*)\)', text, re.S)
+    if match:
+        combine = all if match.group(1) == 'and' else any
+        children = [parse_logic_filter(part) for part in _split_top_level(match.group(2))]
+        return lambda row: combine(child(row) for child in children)
+
+    column, op, value = text.split('.', 2)
+    if value.startswith('"'):
+        value = value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    if op == 'is':
+        return lambda row: row.get(column) is None
+    if op == 'in':
+        options = {part.strip('"') for part in _split_top_level(value.strip('()'))}
+        return lambda row: row.get(column) is not None and str(row.get(column)) in options
+    if op == 'ilike':
+        regex = re.compile(_like_to_regex(value), re.I)
+        return lambda row: bool(regex.fullmatch(str(row.get(column) or '')))
+
+    def predicate(row):
+        if row.get(column) is None:
+            return False
+        left, right = _compare(row.get(column), value)
+        return {
+            'eq': left == right, 'neq': left != right,
+            'gt': left > right, 'gte': left >= right,
+            'lt': left < right, 'lte': left <= right
+        }[op]
+    return predicate
+
+
+class FakeQuery:
+    """Mimics the parts of the supabase-py query builder the backend uses."""
+
+    def __init__(self, db, table_name):
+        self.db = db
+        self.table_name = table_name
+        self.filters = []
+        self.order_by = []
+        self.row_limit = None
+        self.count = None
+        self.action = 'select'
+        self.payload = None
+
+    def select(self, columns='*', count=None, **kwargs):
+        self.count = count
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def in_(self, column, values):
+        wanted = {str(value) for value in values}
+        self.filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def ilike(self, column, pattern):
+        needle = pattern.strip('%').lower()
+        self.filters.append(lambda row: needle in str(row.get(column) or '').lower())
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def or_(self, filters):
+        self.filters.append(parse_logic_filter(f'or({filters})'))
+        return self
+
+    def order(self, column, desc=False, nullsfirst=None):
+        self.order_by.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def insert(self, payload):
+        self.action = 'insert'
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False):
+        self.action = 'upsert'
+        self.payload = payload
+        self.conflict_column = on_conflict or 'id'
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self.action = 'update'
+        self.payload = payload
+        return self
+
+    def execute(self):
+        return self.db.execute(self)
+
+
+class FakeSupabase:
+    """In-memory stand-in for the Supabase client that counts every query."""
+
+    def __init__(self, tables=None):
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.calls = 0
+        # New rows get ids after any seeded ones
+        seeded = [row['id'] for rows in self.tables.values() for row in rows if isinstance(row.get('id'), int)]
+        self._ids = count(max(seeded + [999]) + 1)
+        self._lock = threading.Lock()
+
+    def table(self, table_name):
+        return FakeQuery(self, table_name)
+
+    def execute(self, query):
+        with self._lock:
+            self.calls += 1
+            rows = self.tables.setdefault(query.table_name, [])
+            if query.action == 'insert':
+                new_rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                inserted = []
+                for row in new_rows:
+                    row = dict(row)
+                    row.setdefault('id', next(self._ids))
+                    rows.append(row)
+                    inserted.append(row)
+                return FakeResponse(inserted)
+
+            if query.action == 'upsert':
+                new_rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                keys = [row.get(query.conflict_column) for row in new_rows]
+                if len(set(keys)) != len(keys):
+                    raise ValueError("ON CONFLICT DO UPDATE command cannot affect row a second time")
+                upserted = []
+                for row in new_rows:
+                    existing = next((r for r in rows if r.get(query.conflict_column) == row.get(query.conflict_column)), None)
+                    if existing is None:
+                        existing = dict(row, id=next(self._ids))
+                        rows.append(existing)
+                    elif query.ignore_duplicates:
+                        # ON CONFLICT DO NOTHING returns only the inserted rows
+                        continue
+                    else:
+                        existing.update(row)
+                    upserted.append(dict(existing))
+                return FakeResponse(upserted)
+
+            matched = [row for row in rows if all(f(row) for f in query.filters)]
+            if query.action == 'update':
+                for row in matched:
+                    row.update(query.payload)
+                return FakeResponse(matched)
+
+            total = len(matched)
+            for column, desc, nullsfirst in reversed(query.order_by):
+                # Postgres puts NULLs last ascending and first descending by default
+                nulls_first = desc if nullsfirst is None else nullsfirst
+                present = [row for row in matched if row.get(column) is not None]
+                missing = [row for row in matched if row.get(column) is None]
+                present.sort(key=lambda row: row.get(column), reverse=desc)
+                matched = missing + present if nulls_first else present + missing
+            if query.row_limit is not None:
+                matched = matched[:query.row_limit]
+            return FakeResponse([dict(row) for row in matched], total if query.count else None)
@@ -0,0 +1,82 @@
+# Load test comparing the WSGI (Flask) and ASGI serving modes.
+#
+# Start the API in each mode, e.g.
+#     python main.py                                   # WSGI, port 5000
+#     uvicorn asgi:app --port 5001                     # ASGI, port 5001
+# then run
+#     python benchmarks/load_test.py --url http://127.0.0.1:5000 --url http://127.0.0.1:5001 \
+#         --path /chat/query --json '{"message": "Is there a doctor Emily?"}' --concurrency 200
+
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(base_url, path, method, body, concurrency, total, timeout):
+    latencies = []
+    errors = 0
+    pending = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                 limits=httpx.Limits(max_connections=concurrency)) as http:
+        async def worker():
+            nonlocal errors
+            for _ in pending:
+                start = time.perf_counter()
+                try:
+                    response = await http.request(method, path, json=body)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        'url': base_url + path,
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare API serving modes under concurrent load")
+    parser.add_argument('--url', action='append', required=True, help="Base URL of a running server (repeatable)")
+    parser.add_argument('--path', default='/chat/query')
+    parser.add_argument('--method', default='POST')
+    parser.add_argument('--json', default='{"message": "Is there a doctor Emily?"}', help="JSON request body")
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    body = json.loads(args.json) if args.json else None
+    for base_url in args.url:
+        result = asyncio.run(run_load(base_url, args.path, args.method, body,
+                                      args.concurrency, args.requests, args.timeout))
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
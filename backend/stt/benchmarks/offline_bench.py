@@ -0,0 +1,288 @@
+# Offline benchmark of the whole backend. Boots main.py (or asgi.py) and
+# server.py as subprocesses against the local stand-ins in fake_services.py,
+# drives /transcribe/audio, /chat/query and the patient endpoints at a fixed
+# concurrency and prints a JSON baseline with p50/p95/p99 latency and
+# throughput per scenario. Nothing leaves the machine and no API is billed.
+#
+#     python benchmarks/offline_bench.py --concurrency 20 --requests 200 --output baseline.json
+#     python benchmarks/offline_bench.py --server asgi --scenario chat_query --gemini-latency 1.5
+#
+# The backend reads the rest of its configuration from the environment as
+# usual, e.g. REV_AI_POLL_INITIAL_DELAY=0.2 or CHAT_MODE=function_calling.
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+import httpx
+from load_test import percentile
+from fake_services import FakeRevAi, FakeGemini, FakePostgrest
+
+STT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('patient_get', 'patients_list', 'patient_create', 'chat_query', 'transcribe_audio')
+FIRST_NAMES = ['Emily', 'James', 'Thandi', 'Sipho', 'Maria', 'Chen', 'Aisha', 'Pieter', 'Naledi', 'Liam']
+LAST_NAMES = ['Stone', 'Nkosi', 'Smith', 'van der Merwe', 'Naidoo', 'Botha', 'Dlamini', 'Patel', 'Jones', 'Mokoena']
+PASSWORD = 'bench-password'
+
+
+def seed_tables(doctors, patients):
+    """Doctor and patient rows shaped like the production tables."""
+    doctor_rows = [{
+        'id': i, 'first_name': FIRST_NAMES[i % len(FIRST_NAMES)], 'last_name': LAST_NAMES[i % len(LAST_NAMES)],
+        'id_number': f'80010{i:05d}', 'email_address': f'doctor{i}@example.com', 'phone_number': None,
+        'practice_number': f'PR{i:05d}', 'specialty': 'General Practice', 'hospital': 'Bench Hospital',
+        'password': PASSWORD, 'created_at': '2025-01-01T00:00:00'
+    } for i in range(1, doctors + 1)]
+    patient_rows = [{
+        'id': i, 'first_name': FIRST_NAMES[i % 7], 'last_name': LAST_NAMES[i % 9],
+        'id_number': f'90020{i:06d}', 'dob': f'19{50 + i % 50}-0{1 + i % 9}-1{i % 10}', 'sex': 'F' if i % 2 else 'M',
+        'language': 'English', 'email_address': f'patient{i}@example.com', 'phone_number': None,
+        'emergency_contact_name': None, 'emergency_contact_phone': None, 'med_aid_provider': 'N/A',
+        'med_aid_number': 'N/A', 'primary_physician': 1 + i % doctors, 'allergies': 'N/A',
+        'med_conditions': 'N/A', 'created_at': f'2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}'
+    } for i in range(1, patients + 1)]
+    return {'doctor_table': doctor_rows, 'patient_table': patient_rows, 'clinical_notes': []}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_process(command, env, log):
+    return subprocess.Popen(command, cwd=STT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_for_port(port, process, log_path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as log:
+                raise RuntimeError(f"{process.args} exited early:\n{log.read()[-2000:]}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{process.args} did not listen on port {port} within {timeout}s")
+
+
+class Scenarios:
+    """One request per call for each benchmarked endpoint."""
+
+    def __init__(self, token, doctor_id, doctors, patients, audio_bytes):
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.doctor_id = doctor_id
+        self.doctors = doctors
+        self.patients = patients
+        self.audio_bytes = audio_bytes
+
+    async def patient_get(self, http, i):
+        return await http.get(f'/patient/{random.randint(1, self.patients)}', headers=self.headers)
+
+    async def patients_list(self, http, i):
+        # Doctors may only list their own patients
+        return await http.get(f'/doctor/{self.doctor_id}/patients', headers=self.headers, params={
+            'limit': 50, 'fields': 'id,first_name,last_name', 'sort': random.choice(('id', 'last_name', 'created_at'))
+        })
+
+    async def patient_create(self, http, i):
+        return await http.post('/patients', headers=self.headers, json={
+            'first_name': random.choice(FIRST_NAMES), 'last_name': random.choice(LAST_NAMES),
+            'id_number': f'bench-{i}-{random.getrandbits(32)}', 'dob': '1980-05-17', 'sex': 'F',
+            'primary_physician': random.randint(1, self.doctors)
+        })
+
+    async def chat_query(self, http, i):
+        return await http.post('/chat/query', headers=self.headers, json={'message': 'Is there a doctor Emily?'})
+
+    async def transcribe_audio(self, http, i):
+        # Random bytes so every upload misses the result cache
+        audio = random.randbytes(self.audio_bytes)
+        return await http.post('/transcribe/audio', headers=self.headers,
+                               files={'audio_file': (f'visit-{i}.mp3', audio, 'audio/mpeg')},
+                               data={'patient_id': str(random.randint(1, self.patients)),
+                                     'doctor_id': str(random.randint(1, self.doctors))})
+
+
+def succeeded(response):
+    if response.status_code >= 400:
+        return False
+    try:
+        return response.json().get('success', True) is not False
+    except ValueError:
+        return True
+
+
+async def run_scenario(base_url, name, send, concurrency, total, warmup, timeout):
+    latencies = []
+    errors = 0
+    statuses = {}
+    pending = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                 limits=httpx.Limits(max_connections=concurrency)) as http:
+        for i in range(warmup):
+            await send(http, -1 - i)
+
+        async def worker():
+            nonlocal errors
+            for i in pending:
+                start = time.perf_counter()
+                try:
+                    response = await send(http, i)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    if not succeeded(response):
+                        errors += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        'scenario': name,
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': errors,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items(), key=str)},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend offline against local fakes")
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi', help="Flask dev server or uvicorn asgi:app")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help="Repeatable; default is all")
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=100, help="Per scenario")
+    parser.add_argument('--transcribe-requests', type=int, help="Requests for transcribe_audio (default --requests)")
+    parser.add_argument('--warmup', type=int, default=2, help="Unmeasured requests before each scenario")
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--audio-bytes', type=int, default=256 * 1024)
+    parser.add_argument('--revai-turnaround', type=float, default=2.0, help="Seconds until a fake Rev.ai job is done")
+    parser.add_argument('--gemini-latency', type=float, default=0.8, help="Seconds per fake Gemini call")
+    parser.add_argument('--gemini-jitter', type=float, default=0.2)
+    parser.add_argument('--revai-capacity', type=int, default=0, help="Concurrent Rev.ai requests before 429s, 0 = unlimited")
+    parser.add_argument('--gemini-capacity', type=int, default=0, help="Concurrent Gemini requests before 429s, 0 = unlimited")
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', help="Also write the baseline JSON to this file")
+    args = parser.parse_args()
+
+    revai = FakeRevAi(turnaround=args.revai_turnaround, capacity=args.revai_capacity).start()
+    gemini = FakeGemini(latency=args.gemini_latency, jitter=args.gemini_jitter, capacity=args.gemini_capacity).start()
+    postgrest = FakePostgrest(seed_tables(args.doctors, args.patients)).start()
+
+    api_port, mcp_port = free_port(), free_port()
+    env = dict(os.environ)
+    env.update({
+        'SUPABASE_URL': postgrest.url,
+        'SUPABASE_KEY': 'bench-key',
+        'JWT_SECRET': 'bench-secret',
+        'REV_AI_TOKEN': 'bench-token',
+        'REV_AI_URL': revai.url,
+        'GEMINI_API_KEY': 'bench-key',
+        'GEMINI_BASE_URL': gemini.url,
+        'MCP_PORT': str(mcp_port),
+        'MCP_SERVER_URL': f'http://localhost:{mcp_port}/mcp',
+        'RESULT_CACHE_ENABLED': 'false',
+        'PYTHONUNBUFFERED': '1'
+    })
+    if args.server == 'wsgi':
+        api_command = [sys.executable, '-m', 'flask', '--app', 'main', 'run', '--port', str(api_port), '--with-threads']
+    else:
+        api_command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(api_port), '--log-level', 'warning']
+
+    logs = tempfile.mkdtemp(prefix='offline-bench-')
+    api_log, mcp_log = os.path.join(logs, 'api.log'), os.path.join(logs, 'mcp.log')
+    processes = []
+    try:
+        with open(mcp_log, 'w') as log:
+            processes.append(start_process([sys.executable, 'server.py'], env, log))
+        with open(api_log, 'w') as log:
+            processes.append(start_process(api_command, env, log))
+        wait_for_port(mcp_port, processes[0], mcp_log)
+        wait_for_port(api_port, processes[1], api_log)
+
+        base_url = f'http://127.0.0.1:{api_port}'
+        signin = httpx.post(f'{base_url}/signin/doctor', timeout=30,
+                            json={'email_address': 'doctor1@example.com', 'password': PASSWORD})
+        signin.raise_for_status()
+        session = signin.json()
+        scenarios = Scenarios(session['access_token'], session['doctor']['id'],
+                              args.doctors, args.patients, args.audio_bytes)
+
+        results = []
+        for name in args.scenario or SCENARIOS:
+            total = args.requests
+            if name == 'transcribe_audio' and args.transcribe_requests is not None:
+                total = args.transcribe_requests
+            result = asyncio.run(run_scenario(base_url, name, getattr(scenarios, name), args.concurrency,
+                                              total, args.warmup, args.timeout))
+            print(json.dumps(result), file=sys.stderr)
+            results.append(result)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for service in (revai, gemini, postgrest):
+            service.stop()
+
+    baseline = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'server': args.server,
+        'python': platform.python_version(),
+        'fakes': {
+            'revai_turnaround_s': args.revai_turnaround,
+            'gemini_latency_s': args.gemini_latency,
+            'gemini_jitter_s': args.gemini_jitter,
+            'revai_capacity': args.revai_capacity,
+            'gemini_capacity': args.gemini_capacity,
+            'doctors': args.doctors,
+            'patients': args.patients,
+            'audio_bytes': args.audio_bytes
+        },
+        'upstream_requests': {
+            'revai': revai.requests,
+            'gemini': gemini.requests,
+            'postgrest': postgrest.requests
+        },
+        'upstream_refused': {
+            'revai': revai.refused,
+            'gemini': gemini.refused
+        },
+        'scenarios': results,
+        'logs': logs
+    }
+    output = json.dumps(baseline, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Bulk import of archived consultation recordings.
+
+Usage:
+    python bulk_import.py manifest.jsonl             # start a new run
+    python bulk_import.py --resume <run_id>          # continue an interrupted run
+
+The manifest is JSONL or CSV with one recording per row:
+    {"audio_path": "archive/2023/visit_0001.mp3", "patient_id": 12, "doctor_id": 3}
+
+Progress is checkpointed to a SQLite file per run. The transcript and note of
+every recording are kept there as soon as they exist, so a resumed run skips
+finished stages and never pays for the same provider call twice.
+"""
+import os
+import csv
+import json
+import uuid
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Config ---
+BULK_IMPORT_DIR = os.getenv("BULK_IMPORT_DIR", "bulk_imports")  # checkpoint files, one per run
+BULK_IMPORT_ROOT = os.getenv("BULK_IMPORT_ROOT")  # audio paths must resolve inside this directory
+BULK_IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", "4"))
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "50"))
+
+# Item states, in order
+PENDING = "pending"
+TRANSCRIBED = "transcribed"
+EXTRACTED = "extracted"
+SAVED = "saved"
+FAILED = "failed"
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+class ManifestError(ValueError):
+    """Raised when a manifest row is missing fields or points outside the import root."""
+
+
+def read_manifest(path):
+    """Read manifest rows from a JSONL or CSV file."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def resolve_import_path(path, root=BULK_IMPORT_ROOT):
+    """
+    Resolve a manifest or audio path, relative to root when one is set.
+
+    Raises:
+        ManifestError: if the path resolves outside root
+    """
+    if not root:
+        return os.path.realpath(path)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([resolved, os.path.realpath(root)]) != os.path.realpath(root):
+        raise ManifestError(f"{path} is outside the import root")
+    return resolved
+
+
+def validate_manifest(rows, root=BULK_IMPORT_ROOT):
+    """
+    Check manifest rows and resolve their audio paths.
+
+    Returns:
+        list: rows with audio_path made absolute and ids as ints
+    """
+    items = []
+    for number, row in enumerate(rows, start=1):
+        audio_path = (row.get('audio_path') or '').strip()
+        if not audio_path:
+            raise ManifestError(f"Row {number}: audio_path is required")
+        try:
+            patient_id = int(row.get('patient_id'))
+            doctor_id = int(row.get('doctor_id'))
+        except (TypeError, ValueError):
+            raise ManifestError(f"Row {number}: patient_id and doctor_id must be integers")
+
+        try:
+            resolved = resolve_import_path(audio_path, root)
+        except ManifestError:
+            raise ManifestError(f"Row {number}: audio_path is outside the import root")
+
+        items.append({'audio_path': resolved, 'patient_id': patient_id, 'doctor_id': doctor_id})
+    return items
+
+
+class ImportCheckpoint:
+    """SQLite record of every manifest item and how far it got."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    idx INTEGER PRIMARY KEY,
+                    audio_path TEXT NOT NULL,
+                    patient_id INTEGER NOT NULL,
+                    doctor_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    transcript TEXT,
+                    note TEXT,
+                    note_id INTEGER,
+                    storage_url TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def add_items(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (idx, audio_path, patient_id, doctor_id, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(i, item['audio_path'], item['patient_id'], item['doctor_id'], PENDING, _now())
+                 for i, item in enumerate(items)]
+            )
+            self._conn.commit()
+
+    def items(self, statuses):
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM items WHERE status IN ({placeholders}) ORDER BY idx", tuple(statuses)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, idx, **fields):
+        fields['updated_at'] = _now()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE items SET {assignments} WHERE idx = ?", (*fields.values(), idx))
+            self._conn.commit()
+
+    def update_many(self, updates):
+        """Apply several (idx, fields) updates in one transaction."""
+        with self._lock:
+            for idx, fields in updates:
+                fields['updated_at'] = _now()
+                assignments = ", ".join(f"{key} = ?" for key in fields)
+                self._conn.execute(f"UPDATE items SET {assignments} WHERE idx = ?", (*fields.values(), idx))
+            self._conn.commit()
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM items GROUP BY status").fetchall()
+        counts = {status: 0 for status in (PENDING, TRANSCRIBED, EXTRACTED, SAVED, FAILED)}
+        counts.update({row['status']: row['n'] for row in rows})
+        counts['total'] = sum(counts.values())
+        return counts
+
+    def errors(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, audio_path, error FROM items WHERE status = ? ORDER BY idx LIMIT ?", (FAILED, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class BulkImport:
+    """
+    One import run. Recordings are transcribed and extracted on a bounded
+    worker pool; provider calls wait in line with the API's own under
+    revai_limit and gemini_limit (REV_AI_RATE, GEMINI_RATE, ...). Finished notes are stored in batches through
+    save_batch, which takes [(clinical_note, patient_id, doctor_id)] and returns
+    one result dict per note.
+    """
+
+    def __init__(self, run_id, save_batch, root=BULK_IMPORT_DIR, workers=BULK_IMPORT_WORKERS,
+                 batch_size=BULK_INSERT_BATCH_SIZE):
+        os.makedirs(root, exist_ok=True)
+        self.run_id = run_id
+        self.save_batch = save_batch
+        self.workers = workers
+        self.batch_size = batch_size
+        self.checkpoint = ImportCheckpoint(os.path.join(root, f"{run_id}.db"))
+        self.running = False
+        self._stop = threading.Event()
+
+    @classmethod
+    def create(cls, items, save_batch, **kwargs):
+        """Start a new run for validated manifest items."""
+        run = cls(uuid.uuid4().hex, save_batch, **kwargs)
+        run.checkpoint.add_items(items)
+        return run
+
+    def status(self):
+        return {
+            'run_id': self.run_id,
+            'running': self.running,
+            'counts': self.checkpoint.counts(),
+            'errors': self.checkpoint.errors()
+        }
+
+    def stop(self):
+        """Stop after the recordings in progress; the run can be resumed later."""
+        self._stop.set()
+
+    def run(self, retry_failed=True):
+        """Process every unfinished item. Safe to call again after an interruption."""
+        from processing import ClinicalNote
+
+        self.running = True
+        self._stop.clear()
+        try:
+            statuses = [PENDING, TRANSCRIBED] + ([FAILED] if retry_failed else [])
+            todo = self.checkpoint.items(statuses)
+            ready = [(item, ClinicalNote.model_validate_json(item['note']))
+                     for item in self.checkpoint.items([EXTRACTED])]
+            print(f"Bulk import {self.run_id}: {len(todo)} to process, {len(ready)} waiting to be saved")
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-import") as executor:
+                futures = {executor.submit(self._process, item): item for item in todo}
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    note = future.result()
+                    if note is not None:
+                        ready.append((futures[future], note))
+                    if len(ready) >= self.batch_size:
+                        self._flush(ready)
+                        ready = []
+                    if self._stop.is_set():
+                        for pending in futures:
+                            pending.cancel()
+            self._flush(ready)
+        finally:
+            self.running = False
+        return self.checkpoint.counts()
+
+    def _process(self, item):
+        """Transcribe and extract one recording, checkpointing after each stage."""
+        from event_loop import run_sync
+        from result_cache import sha256_file
+        from transcribe import get_stt_backend, audio_cache_key, extract_from_transcript
+
+        if self._stop.is_set():
+            return None
+        idx = item['idx']
+        try:
+            backend = get_stt_backend()
+            audio_hash = audio_cache_key(sha256_file(item['audio_path']), backend)
+
+            if item['transcript']:
+                transcript = json.loads(item['transcript'])
+            else:
+                transcript = run_sync(backend.transcribe_file(item['audio_path']))
+                self.checkpoint.update(idx, status=TRANSCRIBED, transcript=json.dumps(transcript))
+
+            note = extract_from_transcript(transcript, audio_hash)
+            self.checkpoint.update(idx, status=EXTRACTED, note=note.model_dump_json(), error=None)
+            return note
+
+        except Exception as e:
+            print(f"Bulk import {self.run_id}: item {idx} failed: {e}")
+            self.checkpoint.update(idx, status=FAILED, error=str(e), attempts=item['attempts'] + 1)
+            return None
+
+    def _flush(self, ready):
+        """Store a batch of notes with one database insert and checkpoint the outcome."""
+        if not ready:
+            return
+        try:
+            results = self.save_batch([(note, item['patient_id'], item['doctor_id']) for item, note in ready])
+        except Exception as e:
+            # Rows stay "extracted" and are retried on resume
+            print(f"Bulk import {self.run_id}: saving {len(ready)} notes failed: {e}")
+            return
+
+        updates = []
+        for (item, _), result in zip(ready, results):
+            if result.get('success'):
+                updates.append((item['idx'], {'status': SAVED, 'note_id': result.get('note_id'),
+                                              'storage_url': result.get('storage_url'), 'error': None}))
+            else:
+                updates.append((item['idx'], {'status': EXTRACTED, 'error': result.get('error')}))
+        self.checkpoint.update_many(updates)
+
+
+class BulkImportRegistry:
+    """Runs started through the API, each on its own background thread."""
+
+    def __init__(self, save_batch, root=BULK_IMPORT_DIR):
+        self.save_batch = save_batch
+        self.root = root
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def start(self, items):
+        run = BulkImport.create(items, self.save_batch, root=self.root)
+        self._launch(run)
+        return run
+
+    def resume(self, run_id):
+        """Resume a run by id, including runs left over from a previous process."""
+        run = self.get(run_id)
+        if run is None:
+            return None
+        if not run.running:
+            self._launch(run)
+        return run
+
+    def get(self, run_id):
+        with self._lock:
+            run = self._runs.get(run_id)
+        if run is None and self._exists(run_id):
+            run = BulkImport(run_id, self.save_batch, root=self.root)
+            with self._lock:
+                run = self._runs.setdefault(run_id, run)
+        return run
+
+    def _exists(self, run_id):
+        return len(run_id) == 32 and all(c in "0123456789abcdef" for c in run_id) and \
+            os.path.exists(os.path.join(self.root, f"{run_id}.db"))
+
+    def _launch(self, run):
+        with self._lock:
+            self._runs[run.run_id] = run
+        run.running = True
+        threading.Thread(target=run.run, name=f"bulk-import-{run.run_id[:8]}", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import archived consultation recordings")
+    parser.add_argument('manifest', nargs='?', help="JSONL or CSV manifest of audio_path, patient_id, doctor_id")
+    parser.add_argument('--resume', metavar='RUN_ID', help="Continue an interrupted run")
+    parser.add_argument('--workers', type=int, default=BULK_IMPORT_WORKERS)
+    parser.add_argument('--batch-size', type=int, default=BULK_INSERT_BATCH_SIZE)
+    parser.add_argument('--no-retry-failed', action='store_true', help="Skip items that failed in an earlier attempt")
+    args = parser.parse_args()
+
+    if not args.manifest and not args.resume:
+        parser.error("a manifest or --resume RUN_ID is required")
+
+    from main import save_clinical_notes
+
+    options = {'workers': args.workers, 'batch_size': args.batch_size}
+    if args.resume:
+        if not os.path.exists(os.path.join(BULK_IMPORT_DIR, f"{args.resume}.db")):
+            parser.error(f"no checkpoint found for run {args.resume}")
+        run = BulkImport(args.resume, save_clinical_notes, **options)
+    else:
+        run = BulkImport.create(validate_manifest(read_manifest(args.manifest)), save_clinical_notes, **options)
+        print(f"Started bulk import run {run.run_id}")
+
+    try:
+        counts = run.run(retry_failed=not args.no_retry_failed)
+    except KeyboardInterrupt:
+        print(f"Interrupted; resume with: python bulk_import.py --resume {run.run_id}")
+        raise SystemExit(1)
+    print(json.dumps({'run_id': run.run_id, 'counts': counts}))
+
+
+if __name__ == "__main__":
+    main()
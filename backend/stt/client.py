@@ -1,34 +1,71 @@
+import os
+import time
 import asyncio
 import json
-from fastmcp import Client
+import threading
 from dotenv import load_dotenv
 from google import genai
+from google.genai import types
+from fastmcp.client.messages import MessageHandler
+from mcp_session import MCPSessionPool
+from event_loop import run_sync
+from outbound import genai_http_options
+from ratelimit import gemini_limit
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Gemini client
-gemini_client = genai.Client()
+gemini_client = genai.Client(http_options=genai_http_options())
 
 config = {
     "mcpServers": {
         "mcp-server": {
             "transport": "http", 
-            "url": "http://localhost:8008/mcp",
+            "url": os.getenv("MCP_SERVER_URL", "http://localhost:8008/mcp"),
             "headers": {"Authorization": "bbd3f8b47e44bf4ddaafa0dd434a8b38c25e66affc3605a1f7c1a1eb5e0638c0"}
         }
     }
 }
 
-# Create HTTP client for MCP server
-mcp_client = Client(config)
+# "two_pass" picks a tool and phrases the answer in separate model calls;
+# "function_calling" runs one tool-use loop with the MCP tools as native function declarations
+CHAT_MODE = os.getenv("CHAT_MODE", "two_pass")
+CHAT_MODEL = "gemini-2.0-flash-exp"
+MAX_TOOL_ROUNDS = int(os.getenv("CHAT_MAX_TOOL_ROUNDS", "5"))
+
+# How long the database context and tool list are reused before checking the server's catalog version
+CATALOG_TTL = int(os.getenv("CHAT_CATALOG_TTL", "300"))  # seconds
+TOOL_ERROR_PREFIX = "Error executing tool"  # execute_mcp_tool reports failures as text starting with this
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def invalidate_catalog():
+    """Forget the cached database context and tool list."""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+class CatalogChangeHandler(MessageHandler):
+    """Drops the cached catalog when the MCP server announces a new tool list"""
+
+    async def on_tool_list_changed(self, message):
+        print("MCP tool list changed, invalidating catalog cache")
+        invalidate_catalog()
+
+# Shared, long-lived HTTP sessions to the MCP server
+mcp_sessions = MCPSessionPool(config, message_handler=CatalogChangeHandler())
 
 async def get_available_tools():
     """Get list of available MCP tools"""
     try:
-        async with mcp_client:
-            tools = await mcp_client.list_tools()
-            return [{"name": tool.name, "description": getattr(tool, 'description', 'No description')} for tool in tools]
+        tools = await mcp_sessions.run(lambda mcp_client: mcp_client.list_tools())
+        return [{
+            "name": tool.name,
+            "description": getattr(tool, 'description', 'No description'),
+            "parameters": getattr(tool, 'inputSchema', None)
+        } for tool in tools]
     except Exception as e:
         print(f"Error getting tools: {e}")
         return []
@@ -36,11 +73,61 @@ async def get_available_tools():
 async def execute_mcp_tool(tool_name: str, parameters: dict):
     """Execute a specific MCP tool with parameters"""
     try:
-        async with mcp_client:
-            result = await mcp_client.call_tool(tool_name, parameters)
-            return result.content[0].text if result.content else "No result"
+        result = await mcp_sessions.run(lambda mcp_client: mcp_client.call_tool(tool_name, parameters))
+        return result.content[0].text if result.content else "No result"
     except Exception as e:
-        return f"Error executing tool {tool_name}: {e}"
+        if "unknown tool" in str(e).lower():
+            # The server's tool set no longer matches what we cached
+            invalidate_catalog()
+        return f"{TOOL_ERROR_PREFIX} {tool_name}: {e}"
+
+def is_tool_error(result):
+    """Whether an execute_mcp_tool result is a failure report rather than the tool's output"""
+    return isinstance(result, str) and result.startswith(TOOL_ERROR_PREFIX)
+
+async def get_catalog_version():
+    """Get the server's catalog version stamp, or None if it cannot be read"""
+    try:
+        return json.loads(await execute_mcp_tool("get_catalog_version", {})).get("catalog_version")
+    except ValueError:
+        return None
+
+async def get_chat_catalog():
+    """
+    Get the database context and available tools for answering a question.
+    Both are cached; once CATALOG_TTL passes the cache is kept if the server's
+    catalog version is unchanged, and refetched otherwise.
+    """
+    global _catalog
+    with _catalog_lock:
+        catalog = _catalog
+
+    if catalog and catalog["expires_at"] > time.monotonic():
+        return catalog["database_context"], catalog["tools"]
+
+    if catalog:
+        version = await get_catalog_version()
+        if version and version == catalog["version"]:
+            with _catalog_lock:
+                _catalog = dict(catalog, expires_at=time.monotonic() + CATALOG_TTL)
+            return catalog["database_context"], catalog["tools"]
+
+    database_context, available_tools, version = await asyncio.gather(
+        get_database_context(), get_available_tools(), get_catalog_version()
+    )
+
+    # A failed MCP call comes back as an error string; caching it would keep serving it,
+    # and extending it for as long as the catalog version stays the same
+    if (database_context and available_tools
+            and not any(is_tool_error(result) for result in database_context.values())):
+        with _catalog_lock:
+            _catalog = {
+                "version": version,
+                "database_context": database_context,
+                "tools": available_tools,
+                "expires_at": time.monotonic() + CATALOG_TTL
+            }
+    return database_context, available_tools
 
 async def get_database_context():
     """Get database context first before answering any questions"""
@@ -57,7 +144,7 @@ async def get_database_context():
         print(f"Error getting database context: {e}")
         return None
 
-def ask_gemini_with_context(user_question: str, database_context: dict, available_tools: list) -> dict:
+async def ask_gemini_with_context(user_question: str, database_context: dict, available_tools: list) -> dict:
     """Ask Gemini to analyze question with database context and pick the right tool"""
     
     tools_description = "\n".join([f"- {tool['name']}: {tool['description']}" for tool in available_tools])
@@ -107,10 +194,10 @@ If the database context shows a table is called "doctor_table", use "doctor_tabl
 """
 
     try:
-        resp = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
+        resp = await gemini_limit.run_async(lambda: gemini_client.aio.models.generate_content(
+            model=CHAT_MODEL,
             contents=prompt
-        )
+        ))
         
         response_text = resp.text.strip()
         
@@ -151,21 +238,18 @@ async def process_user_question(user_question: str):
     print(f"\n🤔 User Question: {user_question}")
     print("=" * 50)
     
-    # Step 1: Get database context FIRST
-    print("1️⃣ Getting database context...")
-    database_context = await get_database_context()
+    # Step 1 & 2: Get database context and available tools (cached between questions)
+    print("1️⃣ Getting database context and available MCP tools...")
+    database_context, available_tools = await get_chat_catalog()
     
     if not database_context:
         return "❌ Unable to get database context. Please check the MCP server connection."
     
-    # Step 2: Get available tools
-    print("2️⃣ Getting available MCP tools...")
-    available_tools = await get_available_tools()
     print(f"Available tools: {[tool['name'] for tool in available_tools]}")
     
     # Step 3: Ask Gemini to analyze with context
     print("3️⃣ Asking Gemini to analyze question with database context...")
-    gemini_decision = ask_gemini_with_context(user_question, database_context, available_tools)
+    gemini_decision = await ask_gemini_with_context(user_question, database_context, available_tools)
     print(f"Gemini's analysis: {json.dumps(gemini_decision, indent=2)}")
     
     # Step 4: Execute tool if needed
@@ -189,10 +273,10 @@ Provide a helpful, natural language response. If the query found results, summar
 """
         
         try:
-            final_resp = gemini_client.models.generate_content(
-                model="gemini-2.0-flash-exp",
+            final_resp = await gemini_limit.run_async(lambda: gemini_client.aio.models.generate_content(
+                model=CHAT_MODEL,
                 contents=final_prompt
-            )
+            ))
             
             final_answer = final_resp.text.strip()
             print(f"✅ Final Answer: {final_answer}")
@@ -208,6 +292,131 @@ Provide a helpful, natural language response. If the query found results, summar
         print(f"ℹ️ No tool execution needed: {reasoning}")
         return f"Based on the database context: {reasoning}"
 
+def build_function_declarations(available_tools: list) -> list:
+    """Turn the MCP tool catalog into Gemini function declarations"""
+    return [
+        types.FunctionDeclaration(
+            name=tool["name"],
+            description=tool["description"] or "",
+            parameters_json_schema=tool.get("parameters") or {"type": "object", "properties": {}}
+        )
+        for tool in available_tools
+    ]
+
+def build_system_instruction(database_context: dict) -> str:
+    """System prompt for the function-calling chat mode"""
+    return f"""
+You are Dr. Vital, an assistant answering questions about a medical database.
+Call the provided tools to look up the data you need, as many times as necessary,
+then answer the user's question clearly in natural language.
+If the tools find nothing, say so clearly.
+
+Database Structure:
+{database_context.get('database_context', '')}
+
+Table Relationships:
+{database_context.get('relationships', '')}
+
+CRITICAL: Use the EXACT table names from the database context, not assumed names.
+"""
+
+async def astream_user_question(user_question: str):
+    """
+    Answer a question with native Gemini function calling in a single tool-use loop.
+    Yields events as they happen:
+        {"type": "tool", "name": ..., "parameters": ...}
+        {"type": "text", "text": ...}   (answer tokens, streamed)
+        {"type": "error", "error": ...}
+    """
+    print(f"\n🤔 User Question (function calling): {user_question}")
+
+    database_context, available_tools = await get_chat_catalog()
+    if not database_context:
+        yield {"type": "error", "error": "Unable to get database context. Please check the MCP server connection."}
+        return
+
+    config = types.GenerateContentConfig(
+        system_instruction=build_system_instruction(database_context),
+        tools=[types.Tool(function_declarations=build_function_declarations(available_tools))],
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True)
+    )
+    contents = [types.Content(role="user", parts=[types.Part(text=user_question)])]
+
+    for _ in range(MAX_TOOL_ROUNDS):
+        model_parts = []
+        function_calls = []
+
+        chunks = asyncio.Queue()
+
+        async def call_model():
+            # Streamed answers cannot be replayed, so they hold a slot without retries.
+            # Chunks are queued, so the slot is freed when the call ends, not when the reader catches up
+            try:
+                async with gemini_limit.slot_async():
+                    stream = await gemini_client.aio.models.generate_content_stream(model=CHAT_MODEL, contents=contents, config=config)
+                    async for chunk in stream:
+                        chunks.put_nowait(chunk)
+            finally:
+                chunks.put_nowait(None)
+
+        model_call = asyncio.create_task(call_model())
+        try:
+            while (chunk := await chunks.get()) is not None:
+                if not chunk.candidates or not chunk.candidates[0].content:
+                    continue
+                for part in chunk.candidates[0].content.parts or []:
+                    model_parts.append(part)
+                    if part.function_call:
+                        function_calls.append(part.function_call)
+                    elif part.text and not part.thought:
+                        yield {"type": "text", "text": part.text}
+            await model_call
+        finally:
+            model_call.cancel()
+
+        if not function_calls:
+            return
+
+        # Run every tool the model asked for this round, then hand the results back
+        contents.append(types.Content(role="model", parts=model_parts))
+        for call in function_calls:
+            print(f"🔧 Gemini called '{call.name}' with parameters: {dict(call.args or {})}")
+            yield {"type": "tool", "name": call.name, "parameters": dict(call.args or {})}
+
+        results = await asyncio.gather(*(execute_mcp_tool(call.name, dict(call.args or {})) for call in function_calls))
+        contents.append(types.Content(role="user", parts=[
+            types.Part.from_function_response(name=call.name, response={"result": result})
+            for call, result in zip(function_calls, results)
+        ]))
+
+    yield {"type": "error", "error": f"Stopped after {MAX_TOOL_ROUNDS} rounds of tool calls without a final answer."}
+
+def stream_user_question(user_question: str):
+    """astream_user_question for sync callers; the loop runs on the shared event loop."""
+    events = astream_user_question(user_question)
+    try:
+        while True:
+            try:
+                yield run_sync(events.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_sync(events.aclose())
+
+async def answer_user_question_async(user_question: str) -> str:
+    """Answer a question with the function-calling loop and return the full answer text"""
+    answer = []
+    async for event in astream_user_question(user_question):
+        if event["type"] == "text":
+            answer.append(event["text"])
+        elif event["type"] == "error":
+            return f"❌ {event['error']}"
+    return "".join(answer).strip()
+
+def answer_user_question(user_question: str) -> str:
+    """answer_user_question_async for sync callers"""
+    return run_sync(answer_user_question_async(user_question))
+
 async def main():
     print("🚀 Gemini + MCP Integration with Database Context")
     print("=" * 50)
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+import contextvars
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_shared_loop():
+    """Return the process-wide background event loop, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="shared-event-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine on the shared loop and block until it finishes.
+    Lets sync code (Flask views, worker threads) share one loop and the async
+    clients bound to it, instead of building a new loop per request.
+    The caller's context variables (e.g. the request trace) carry over.
+    """
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), get_shared_loop()).result()
+
+
+async def _in_context(coro, context):
+    # The task starts from the loop thread's context; copy the caller's values in
+    for var, value in context.items():
+        var.set(value)
+    return await coro
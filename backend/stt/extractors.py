@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from ratelimit import gemini_limit
+
+load_dotenv()
+
+# --- Config ---
+EXTRACTOR_BACKEND = os.getenv("EXTRACTOR_BACKEND", "gemini")  # gemini | local
+GEMINI_MODEL = os.getenv("GEMINI_EXTRACTION_MODEL", "gemini-2.5-flash")
+GEMINI_MAX_PARALLEL = int(os.getenv("EXTRACTION_MAX_PARALLEL", "4"))
+LOCAL_LLM_MODEL_PATH = os.getenv("LOCAL_LLM_MODEL_PATH")  # GGUF file, e.g. a quantized Llama or Qwen instruct model
+LOCAL_LLM_CONTEXT = int(os.getenv("LOCAL_LLM_CONTEXT", "16384"))  # tokens
+LOCAL_LLM_MAX_TOKENS = int(os.getenv("LOCAL_LLM_MAX_TOKENS", "2048"))
+LOCAL_LLM_PARALLEL = int(os.getenv("LOCAL_LLM_PARALLEL", "1"))  # model instances decoding side by side; see LlamaCppExtractor for memory
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", "0")) or None  # per instance; None lets llama.cpp decide
+
+
+class GeminiExtractor:
+    """Structured extraction with Gemini's schema-constrained JSON output."""
+
+    name = "gemini"
+
+    def __init__(self, model=GEMINI_MODEL, max_parallel=GEMINI_MAX_PARALLEL):
+        self.model = model
+        self.max_parallel = max_parallel
+        self.cache_key = model
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                from google import genai
+                from outbound import genai_http_options
+                self._client = genai.Client(http_options=genai_http_options())  # reads GEMINI_API_KEY from .env
+            return self._client
+
+    def generate(self, prompt, schema):
+        """Run one prompt and return an instance of the pydantic schema."""
+        resp = gemini_limit.run(lambda: self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": schema,
+            },
+        ))
+        return resp.parsed
+
+    def generate_batch(self, prompts, schema):
+        """Run several prompts as concurrent API calls, keeping their order."""
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(prompts))) as executor:
+            return list(executor.map(lambda prompt: self.generate(prompt, schema), prompts))
+
+
+class LlamaCppExtractor:
+    """
+    Structured extraction with a local GGUF model through llama.cpp.
+    The JSON schema is compiled to a grammar, so the model can only emit JSON
+    that validates against it. Batches are spread over `parallel` model
+    instances; each keeps its KV cache, so the shared prompt instructions are
+    only evaluated once per instance.
+
+    Every instance is a full llama.cpp context: the weights are memory-mapped
+    and shared between instances on CPU, but layers offloaded to a GPU are
+    copied per instance, and each has its own KV cache sized for n_ctx tokens
+    (about 2 GB at 16k tokens for an 8B model with an f16 cache). Budget
+    roughly parallel x (KV cache + offloaded layers) on top of the model file
+    before raising LOCAL_LLM_PARALLEL above its default of 1.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path=LOCAL_LLM_MODEL_PATH, parallel=LOCAL_LLM_PARALLEL,
+                 n_ctx=LOCAL_LLM_CONTEXT, n_threads=LOCAL_LLM_THREADS, max_tokens=LOCAL_LLM_MAX_TOKENS):
+        if not model_path:
+            raise ValueError("LOCAL_LLM_MODEL_PATH must point to a GGUF model for the local extractor")
+        self.model_path = model_path
+        self.parallel = max(1, parallel)
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.max_tokens = max_tokens
+        self.cache_key = f"{self.name}:{os.path.basename(model_path)}"
+        self._instances = queue.Queue()
+        self._created = 0
+        self._create_lock = threading.Lock()
+
+    def _acquire(self):
+        with self._create_lock:
+            if self._instances.empty() and self._created < self.parallel:
+                from llama_cpp import Llama
+                self._created += 1
+                return Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.n_threads, verbose=False)
+        return self._instances.get()
+
+    def generate(self, prompt, schema):
+        """Run one prompt and return an instance of the pydantic schema."""
+        llm = self._acquire()
+        try:
+            resp = llm.create_chat_completion(
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object", "schema": schema.model_json_schema()},
+                temperature=0,
+                max_tokens=self.max_tokens,
+            )
+        finally:
+            self._instances.put(llm)
+        return schema.model_validate_json(resp["choices"][0]["message"]["content"])
+
+    def generate_batch(self, prompts, schema):
+        """Decode prompts side by side on the model instances, keeping their order."""
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.parallel, len(prompts))) as executor:
+            return list(executor.map(lambda prompt: self.generate(prompt, schema), prompts))
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor():
+    """Extraction backend selected by EXTRACTOR_BACKEND."""
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = LlamaCppExtractor() if EXTRACTOR_BACKEND == "local" else GeminiExtractor()
+        return _extractor
+
+
+def set_extractor(extractor):
+    """Swap the extraction backend, e.g. for a fake in offline benchmarks."""
+    global _extractor
+    with _extractor_lock:
+        _extractor = extractor
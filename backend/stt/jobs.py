@@ -0,0 +1,342 @@
+import os
+import json
+import uuid
+import queue
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# --- Config ---
+QUEUE_BACKEND = os.getenv("TRANSCRIBE_QUEUE_BACKEND", "memory")  # memory | sqlite
+QUEUE_DB_PATH = os.getenv("TRANSCRIBE_QUEUE_DB", "transcribe_jobs.db")
+QUEUE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "4"))
+FINISHED_JOB_TTL = float(os.getenv("TRANSCRIBE_FINISHED_JOB_TTL", "3600"))  # seconds a finished job's result stays readable
+FINISHED_JOB_LIMIT = int(os.getenv("TRANSCRIBE_FINISHED_JOB_LIMIT", "1000"))  # finished jobs kept at most
+JOB_LEASE_TTL = float(os.getenv("TRANSCRIBE_JOB_LEASE_TTL", "300"))  # seconds a claim holds without renewal (sqlite)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+# Told apart from the pid so a restarted process that reuses a pid (pid 1 in a container) is not taken for the old one
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def _owner_alive(owner):
+    """Whether the process behind an owner id ("<pid>:<token>") is still running on this host."""
+    pid = int(owner.split(':', 1)[0])
+    if pid == os.getpid():
+        return False  # our pid under another token: an earlier run that got the same pid
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class InMemoryJobQueue:
+    """
+    Process-local job queue. Jobs are lost when the process exits.
+    Finished jobs are dropped after finished_ttl seconds, oldest first once
+    more than finished_limit are kept.
+    """
+
+    def __init__(self, finished_ttl=FINISHED_JOB_TTL, finished_limit=FINISHED_JOB_LIMIT):
+        self.finished_ttl = finished_ttl
+        self.finished_limit = finished_limit
+        self._pending = queue.Queue()
+        self._jobs = {}
+        self._finished = OrderedDict()  # job id -> time.monotonic() it finished, oldest first
+        self._lock = threading.Lock()
+
+    def submit(self, payload):
+        """Add a job and return its id."""
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': QUEUED,
+                'payload': payload,
+                'result': None,
+                'error': None,
+                'created_at': _now(),
+                'updated_at': _now()
+            }
+        self._pending.put(job_id)
+        return job_id
+
+    def claim(self, timeout=1.0):
+        """Take the next queued job, or return None if nothing arrives in time."""
+        try:
+            job_id = self._pending.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = RUNNING
+            job['updated_at'] = _now()
+            return dict(job)
+
+    def complete(self, job_id, result):
+        self._finish(job_id, DONE, result=result)
+
+    def fail(self, job_id, error):
+        self._finish(job_id, FAILED, error=error)
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = status
+            job['result'] = result
+            job['error'] = error
+            job['updated_at'] = _now()
+            self._finished[job_id] = time.monotonic()
+            self._evict()
+
+    def _evict(self):
+        expires_before = time.monotonic() - self.finished_ttl
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at >= expires_before and len(self._finished) <= self.finished_limit:
+                break
+            del self._finished[job_id]
+            del self._jobs[job_id]
+
+
+class SQLiteJobQueue:
+    """
+    Job queue persisted to a SQLite file so queued work survives restarts.
+    Several processes may share the file: each claim records its owner and a
+    lease that the owner renews while the job runs. A running job is only
+    handed out again once its lease has expired or its owner process is gone.
+    Finished jobs are dropped like in InMemoryJobQueue.
+    """
+
+    def __init__(self, db_path=QUEUE_DB_PATH, lease_ttl=JOB_LEASE_TTL,
+                 finished_ttl=FINISHED_JOB_TTL, finished_limit=FINISHED_JOB_LIMIT):
+        self.db_path = db_path
+        self.lease_ttl = lease_ttl
+        self.finished_ttl = finished_ttl
+        self.finished_limit = finished_limit
+        self.owner = f"{os.getpid()}:{_PROCESS_TOKEN}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._heartbeat = None
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    owner TEXT,
+                    lease_until REAL,
+                    finished_at REAL
+                )
+            """)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (('owner', 'TEXT'), ('lease_until', 'REAL'), ('finished_at', 'REAL')):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            # Files from before finished_at existed: start their TTL now
+            self._conn.execute(
+                "UPDATE jobs SET finished_at = ? WHERE status IN (?, ?) AND finished_at IS NULL",
+                (time.time(), DONE, FAILED)
+            )
+            self._conn.commit()
+            self._requeue_abandoned()
+            self._evict()
+
+    def submit(self, payload):
+        """Add a job and return its id."""
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._evict()
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload), _now(), _now())
+            )
+            self._conn.commit()
+            self._wakeup.notify()
+        return job_id
+
+    def claim(self, timeout=1.0):
+        """Take the oldest queued job, or return None if nothing arrives in time."""
+        with self._lock:
+            self._requeue_abandoned()
+            job = self._claim_next()
+            if job is None:
+                self._wakeup.wait(timeout)
+                job = self._claim_next()
+        if job is not None:
+            self._start_heartbeat()
+        return job
+
+    def complete(self, job_id, result):
+        self._finish(job_id, DONE, result=result)
+
+    def fail(self, job_id, error):
+        self._finish(job_id, FAILED, error=error)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _claim_next(self):
+        # Another process may take the same row between the SELECT and the UPDATE;
+        # the status check in the UPDATE lets exactly one of them win
+        while True:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, self.owner, time.time() + self.lease_ttl, _now(), row['id'], QUEUED)
+            ).rowcount
+            self._conn.commit()
+            if claimed == 1:
+                job = self._row_to_job(row)
+                job['status'] = RUNNING
+                return job
+
+    def _requeue_abandoned(self):
+        """Put running jobs back in the queue when their lease ran out or their owner process is gone."""
+        now = time.time()
+        rows = self._conn.execute(
+            "SELECT id, owner, lease_until FROM jobs WHERE status = ?", (RUNNING,)
+        ).fetchall()
+        for row in rows:
+            if row['owner'] == self.owner:
+                continue
+            if row['owner'] and (row['lease_until'] or 0) > now and _owner_alive(row['owner']):
+                continue
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND owner IS ?",
+                (QUEUED, _now(), row['id'], RUNNING, row['owner'])
+            ).rowcount
+            if requeued:
+                print(f"Requeued job {row['id']} abandoned by {row['owner'] or 'an unknown worker'}")
+        self._conn.commit()
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._renew_leases, name="transcribe-job-leases", daemon=True)
+            self._heartbeat.start()
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.lease_ttl / 3)
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?",
+                    (time.time() + self.lease_ttl, self.owner, RUNNING)
+                )
+                self._conn.commit()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            finished = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, finished_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                (status, json.dumps(result) if result is not None else None, error, _now(), time.time(),
+                 job_id, self.owner)
+            ).rowcount
+            self._conn.commit()
+        if not finished:
+            print(f"Job {job_id} was taken over by another worker; dropping this result")
+
+    def _evict(self):
+        self._conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - self.finished_ttl)
+        )
+        self._conn.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?) "
+            "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+            (DONE, FAILED, self.finished_limit)
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _row_to_job(row):
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'payload': json.loads(row['payload']),
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+
+
+class JobWorkerPool:
+    """Background threads that pull jobs off a queue and run them through a handler."""
+
+    def __init__(self, job_queue, handler, workers=QUEUE_WORKERS):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.workers = workers
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"transcribe-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.job_queue.claim()
+            if job is None:
+                continue
+            print(f"Worker picked up job {job['id']}")
+            try:
+                result = self.handler(job['payload'])
+                self.job_queue.complete(job['id'], result)
+            except Exception as e:
+                print(f"Job {job['id']} failed: {str(e)}")
+                self.job_queue.fail(job['id'], str(e))
+
+
+def create_job_queue(backend=QUEUE_BACKEND):
+    """Build the job queue selected by TRANSCRIBE_QUEUE_BACKEND."""
+    if backend == "sqlite":
+        return SQLiteJobQueue()
+    if backend == "memory":
+        return InMemoryJobQueue()
+    raise ValueError(f"Unknown job queue backend: {backend}")
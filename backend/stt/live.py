@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Config ---
+LIVE_STT_PROVIDER = os.getenv("LIVE_STT_PROVIDER", "revai")  # revai | fake
+LIVE_CONTENT_TYPE = os.getenv("LIVE_CONTENT_TYPE", "audio/*")  # e.g. audio/webm from MediaRecorder
+LIVE_DRAFT_INTERVAL = float(os.getenv("LIVE_DRAFT_INTERVAL", "30"))  # seconds between draft note updates
+LIVE_DRAFT_CONTEXT_LINES = int(os.getenv("LIVE_DRAFT_CONTEXT_LINES", "2"))  # earlier lines repeated for context
+LIVE_DRAFT_WORKERS = int(os.getenv("LIVE_DRAFT_WORKERS", "4"))
+LIVE_SESSION_IDLE_TIMEOUT = float(os.getenv("LIVE_SESSION_IDLE_TIMEOUT", "900"))  # seconds
+LIVE_CLOSE_TIMEOUT = 30  # seconds to wait for the provider's last hypotheses
+FAKE_BYTES_PER_UTTERANCE = int(os.getenv("LIVE_FAKE_BYTES_PER_UTTERANCE", "32000"))
+FAKE_SCRIPT_FILE = os.getenv("LIVE_FAKE_SCRIPT")  # JSON list of {"speaker": 0, "text": "..."}
+
+FAKE_SCRIPT = [
+    {"speaker": 0, "text": "Good morning, what brings you in today?"},
+    {"speaker": 1, "text": "I've had a dry cough for about two weeks."},
+    {"speaker": 0, "text": "Any fever or shortness of breath?"},
+    {"speaker": 1, "text": "A low fever at night, no shortness of breath."},
+    {"speaker": 0, "text": "Are you taking any medications?"},
+    {"speaker": 1, "text": "Just lisinopril 10 mg once a day."},
+    {"speaker": 0, "text": "Any allergies?"},
+    {"speaker": 1, "text": "I'm allergic to penicillin."},
+    {"speaker": 0, "text": "Let's get a chest X-ray and see you back in a week."},
+]
+
+draft_executor = ThreadPoolExecutor(max_workers=LIVE_DRAFT_WORKERS, thread_name_prefix="live-draft")
+
+
+class FakeStreamingProvider:
+    """
+    Offline stand-in for a streaming STT provider.
+    Every bytes_per_utterance bytes of audio produce the next scripted utterance,
+    first as a partial hypothesis and then as a final one.
+    """
+
+    def __init__(self, script=None, bytes_per_utterance=FAKE_BYTES_PER_UTTERANCE):
+        if script is None and FAKE_SCRIPT_FILE:
+            with open(FAKE_SCRIPT_FILE, 'r', encoding='utf-8') as f:
+                script = json.load(f)
+        self.script = script or FAKE_SCRIPT
+        self.bytes_per_utterance = bytes_per_utterance
+
+    def open_stream(self, on_hypothesis):
+        return FakeStream(self, on_hypothesis)
+
+
+class FakeStream:
+    def __init__(self, provider, on_hypothesis):
+        self.provider = provider
+        self.on_hypothesis = on_hypothesis
+        self.received = 0
+        self.emitted = 0
+
+    def send(self, data):
+        self.received += len(data)
+        script = self.provider.script
+        while self.emitted < len(script) and self.received >= (self.emitted + 1) * self.provider.bytes_per_utterance:
+            self._emit(script[self.emitted])
+        if self.emitted < len(script) and self.received > self.emitted * self.provider.bytes_per_utterance:
+            utterance = script[self.emitted]
+            words = utterance["text"].split()
+            self.on_hypothesis(" ".join(words[:max(1, len(words) // 2)]), False, utterance["speaker"])
+
+    def close(self):
+        # Audio that stopped mid-utterance still yields that utterance
+        if self.emitted < len(self.provider.script) and self.received > self.emitted * self.provider.bytes_per_utterance:
+            self._emit(self.provider.script[self.emitted])
+
+    def _emit(self, utterance):
+        self.emitted += 1
+        self.on_hypothesis(utterance["text"], True, utterance["speaker"])
+
+
+class RevAiStreamingProvider:
+    """
+    Rev.ai streaming speech-to-text. Streaming hypotheses carry no speaker
+    labels, so every line is attributed to speaker 0.
+    """
+
+    def __init__(self, token=None, content_type=LIVE_CONTENT_TYPE):
+        self.token = token or os.getenv('REV_AI_TOKEN')
+        self.content_type = content_type
+
+    def open_stream(self, on_hypothesis):
+        return RevAiStream(self, on_hypothesis)
+
+
+class RevAiStream:
+    def __init__(self, provider, on_hypothesis):
+        from rev_ai.models import MediaConfig
+        from rev_ai.streamingclient import RevAiStreamingClient
+
+        self.on_hypothesis = on_hypothesis
+        self.frames = queue.Queue()
+        self.client = RevAiStreamingClient(provider.token, MediaConfig(provider.content_type))
+        responses = self.client.start(self._audio_frames())
+        self.reader = threading.Thread(target=self._read, args=(responses,), name="revai-stream", daemon=True)
+        self.reader.start()
+
+    def _audio_frames(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                return
+            yield frame
+
+    def _read(self, responses):
+        try:
+            for response in responses:
+                hypothesis = json.loads(response)
+                text = "".join(el["value"] for el in hypothesis.get("elements", []))
+                if hypothesis.get("type") == "final":
+                    self.on_hypothesis(text.strip(), True, 0)
+                else:
+                    # Partial elements are bare words
+                    self.on_hypothesis(" ".join(el["value"] for el in hypothesis.get("elements", [])), False, 0)
+        except Exception as e:
+            print(f"Rev.ai stream error: {e}")
+
+    def send(self, data):
+        self.frames.put(data)
+
+    def close(self):
+        self.frames.put(None)
+        self.reader.join(timeout=LIVE_CLOSE_TIMEOUT)
+        self.client.end()
+
+
+def get_streaming_provider():
+    """Streaming provider selected by LIVE_STT_PROVIDER."""
+    if LIVE_STT_PROVIDER == "fake":
+        return FakeStreamingProvider()
+    return RevAiStreamingProvider()
+
+
+def extract_window(window, index):
+    """Default draft extractor: one clinical note for a window of new transcript lines."""
+    from processing import build_window_prompt, generate_note
+    return generate_note(build_window_prompt(window, index))
+
+
+def merge_drafts(notes):
+    from processing import merge_notes
+    return merge_notes(notes)
+
+
+class LiveSession:
+    """
+    A consultation being transcribed while it is recorded.
+    Final hypotheses are kept as a rolling "Person N: ..." transcript, the same
+    format refine_transcript produces. Every draft_interval seconds the lines
+    added since the last draft are extracted in the background and merged into
+    the draft note, so only the tail is left to extract when recording stops.
+    """
+
+    def __init__(self, provider, metadata=None, draft_interval=LIVE_DRAFT_INTERVAL,
+                 extract=extract_window, merge=merge_drafts, executor=draft_executor):
+        self.id = uuid.uuid4().hex
+        self.metadata = metadata or {}
+        self.draft_interval = draft_interval
+        self.extract = extract
+        self.merge = merge
+        self.executor = executor
+        self.lines = []  # [speaker, text]
+        self.partial = ""
+        self.draft = None
+        self.drafted_lines = 0
+        self.draft_count = 0
+        self._revision = 0  # bumped on every final hypothesis
+        self._drafted_revision = 0
+        self.finished = False
+        self.last_active = time.monotonic()
+        self._last_draft_at = time.monotonic()
+        self._draft_future = None
+        self._lock = threading.Lock()
+        self._draft_lock = threading.Lock()
+        self.stream = provider.open_stream(self._on_hypothesis)
+
+    def feed(self, data):
+        """Send a frame of recorded audio to the provider."""
+        if self.finished:
+            raise RuntimeError("Session is already finished")
+        self.last_active = time.monotonic()
+        self.stream.send(data)
+
+    def _on_hypothesis(self, text, final, speaker=0):
+        with self._lock:
+            if not final:
+                self.partial = text
+                return
+            self.partial = ""
+            if not text:
+                return
+            if self.lines and self.lines[-1][0] == speaker:
+                self.lines[-1][1] = f"{self.lines[-1][1]} {text}"
+            else:
+                self.lines.append([speaker, text])
+            self._revision += 1
+        self.maybe_draft()
+
+    def transcript(self):
+        with self._lock:
+            return "\n".join(f"Person {speaker + 1}: {text}" for speaker, text in self.lines)
+
+    def maybe_draft(self):
+        """Start a background draft update if one is due and none is running."""
+        with self._lock:
+            due = time.monotonic() - self._last_draft_at >= self.draft_interval
+            running = self._draft_future is not None and not self._draft_future.done()
+            if not due or running or self.finished or self._revision == self._drafted_revision:
+                return
+            self._last_draft_at = time.monotonic()
+            self._draft_future = self.executor.submit(self._update_draft)
+
+    def _update_draft(self):
+        """Extract the lines added since the last draft and merge them into it."""
+        with self._draft_lock:
+            with self._lock:
+                end = len(self.lines)
+                revision = self._revision
+                if revision == self._drafted_revision and self.draft is not None:
+                    return self.draft
+                # Earlier lines give context; the last drafted one may also have grown since
+                context = max(0, self.drafted_lines - max(1, LIVE_DRAFT_CONTEXT_LINES))
+                window ="\n".join(f"Person {speaker + 1}: {text}" for speaker, text in self.lines[context:end])
+            if not window:
+                return self.draft
+            try:
+                note = self.extract(window, self.draft_count)
+            except Exception as e:
+                print(f"Draft note update failed: {e}")
+                return self.draft
+            draft = self.merge([self.draft, note]) if self.draft is not None else note
+            with self._lock:
+                self.draft = draft
+                self.drafted_lines = end
+                self._drafted_revision = revision
+                self.draft_count += 1
+            return draft
+
+    def finish(self):
+        """Flush the provider, extract the remaining lines and return the final note."""
+        with self._lock:
+            self.finished = True
+        self.stream.close()
+        future = self._draft_future
+        if future is not None:
+            future.result()
+        return self._update_draft()
+
+    def snapshot(self, include_transcript=True):
+        with self._lock:
+            state = {
+                'session_id': self.id,
+                'line_count': len(self.lines),
+                'partial': self.partial,
+                'drafted_lines': self.drafted_lines,
+                'finished': self.finished,
+                'draft_note': self.draft.model_dump() if self.draft is not None else None
+            }
+        if include_transcript:
+            state['transcript'] = self.transcript()
+        return state
+
+
+class LiveSessionStore:
+    """In-process registry of live sessions; idle sessions are closed and dropped."""
+
+    def __init__(self, idle_timeout=LIVE_SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, provider=None, metadata=None, **kwargs):
+        self.reap()
+        session = LiveSession(provider or get_streaming_provider(), metadata, **kwargs)
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def discard(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            idle = [s for s in self._sessions.values() if now - s.last_active > self.idle_timeout]
+            for session in idle:
+                del self._sessions[session.id]
+        for session in idle:
+            try:
+                session.stream.close()
+            except Exception as e:
+                print(f"Error closing idle live session {session.id}: {e}")
@@ -0,0 +1,123 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# --- Config ---
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "small.en")  # any faster-whisper model name or path
+LOCAL_STT_COMPUTE_TYPE = os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8")
+LOCAL_STT_LANGUAGE = os.getenv("LOCAL_STT_LANGUAGE") or None
+LOCAL_STT_BEAM_SIZE = int(os.getenv("LOCAL_STT_BEAM_SIZE", "1"))
+LOCAL_STT_THREADS_PER_WORKER = int(os.getenv("LOCAL_STT_THREADS_PER_WORKER", "2"))
+LOCAL_STT_WORKERS = int(os.getenv("LOCAL_STT_WORKERS", "0"))  # 0 = one worker per LOCAL_STT_THREADS_PER_WORKER cores
+TRAILING_PUNCTUATION = ".,?!;:"
+
+_model = None
+
+
+def default_worker_count(threads_per_worker=LOCAL_STT_THREADS_PER_WORKER):
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_worker))
+
+
+def _load_model(model_name, compute_type, cpu_threads):
+    """Worker process initializer: load the model once per process."""
+    global _model
+    from faster_whisper import WhisperModel
+    _model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _word_elements(words):
+    """Turn Whisper words (" Hello,") into Rev.ai-style text and punct elements."""
+    elements = []
+    for word in words:
+        value = word.word.strip()
+        trailing = ""
+        while value and value[-1] in TRAILING_PUNCTUATION:
+            trailing = value[-1] + trailing
+            value = value[:-1]
+        if not value:
+            if elements and trailing:
+                elements.append({"type": "punct", "value": trailing})
+            continue
+        if elements:
+            elements.append({"type": "punct", "value": " "})
+        elements.append({
+            "type": "text",
+            "value": value,
+            "ts": round(word.start, 3),
+            "end_ts": round(word.end, 3),
+            "confidence": round(word.probability, 3)
+        })
+        if trailing:
+            elements.append({"type": "punct", "value": trailing})
+    return elements
+
+
+def transcribe_in_worker(file_path, language=LOCAL_STT_LANGUAGE, beam_size=LOCAL_STT_BEAM_SIZE):
+    """
+    Transcribe one file with the worker's model.
+    Returns the monologue/element JSON that Rev.ai produces. Whisper does not
+    diarize, so each segment becomes a monologue of speaker 0.
+    """
+    segments, _ = _model.transcribe(file_path, language=language, beam_size=beam_size,
+                                    word_timestamps=True, vad_filter=True)
+    monologues = []
+    for segment in segments:
+        elements = _word_elements(segment.words or [])
+        if elements:
+            monologues.append({"speaker": 0, "elements": elements})
+    return {"monologues": monologues}
+
+
+class LocalWhisperBackend:
+    """
+    On-prem speech-to-text with a faster-whisper model on CPU.
+    Each worker process loads its own copy of the model, and the pool is sized
+    to the available cores so throughput stays predictable under load.
+    """
+
+    name = "local"
+
+    def __init__(self, model=LOCAL_STT_MODEL, workers=LOCAL_STT_WORKERS,
+                 threads_per_worker=LOCAL_STT_THREADS_PER_WORKER, compute_type=LOCAL_STT_COMPUTE_TYPE):
+        self.model = model
+        self.workers = workers or default_worker_count(threads_per_worker)
+        self.threads_per_worker = threads_per_worker
+        self.compute_type = compute_type
+        self.cache_key = f"{self.name}:{model}:{compute_type}"
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn, not fork: the API process already runs event loop threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_model,
+                    initargs=(self.model, self.compute_type, self.threads_per_worker)
+                )
+                print(f"Started {self.workers} local speech-to-text workers ({self.model})")
+            return self._pool
+
+    async def transcribe_file(self, file_path, filename=None):
+        """Transcribe an audio file and return the transcript JSON."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            return await loop.run_in_executor(pool, transcribe_in_worker, file_path)
+        except BrokenProcessPool:
+            # A worker died (or could not load the model); start fresh next time
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise RuntimeError("Local speech-to-text worker crashed or failed to load the model")
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -1,18 +1,37 @@
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 import jwt
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import tempfile
 import json
+import io
+import re
+import csv
+import base64
+import hmac
+from urllib.parse import urlencode
 import uuid
 from supabase import create_client, Client
 import os
+import time
+import threading
 from datetime import datetime, timedelta
-from auth import validate_email, validate_phone
+from auth import validate_email, validate_phone, validate_patient_rows
 from flask_cors import CORS
-from transcribe import transcribe
+from transcribe import transcribe, transcribe_job, submit_audio_stream, AudioTooLarge, job_completions, get_stt_backend, CALLBACK_SECRET, STREAM_CHUNK_SIZE
+from jobs import create_job_queue, JobWorkerPool, QUEUE_BACKEND, DONE, FAILED
+from cache import TTLCache
+from outbound import get_http_client, supabase_options, host_limits
+import metrics
+from metrics import span, start_trace, end_trace
+from ratelimit import revai_limit, gemini_limit, work_started
+from row_cache import row_cache, cached_patient, cached_doctor, forget_patients, forget_doctor, doctor_patients_scope
+from event_loop import run_sync
+from uploads import ChunkedUploadStore, OffsetMismatch
+from live import LiveSessionStore
+from bulk_import import BulkImportRegistry, ManifestError, validate_manifest, read_manifest, resolve_import_path, BULK_IMPORT_ROOT
 
 # Load environment variables
 load_dotenv()
@@ -21,9 +40,44 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 JWT_SECRET = os.environ.get('JWT_SECRET')
 JWT_EXPIRY_HOURS = 24
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))  # seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+TRANSCRIBE_MODE = os.getenv("TRANSCRIBE_MODE", "sync")  # sync | queue
+TRANSCRIBE_SPOOL_DIR = os.getenv("TRANSCRIBE_SPOOL_DIR") or None  # where uploads wait for a worker
 
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=supabase_options())
+
+# Doctors whose token was verified against doctor_table recently, keyed by token
+principal_cache = TTLCache(max_size=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+# Resumable uploads that arrive in chunks while a consultation is recorded
+chunked_uploads = ChunkedUploadStore()
+live_sessions = LiveSessionStore()
+bulk_imports = BulkImportRegistry(save_batch=lambda items: save_clinical_notes(items))
+LIVE_FRAME_READ_SIZE = 16 * 1024  # bytes forwarded to the STT provider at a time
+
+# Note bodies are fetched from storage in parallel over the shared outbound client
+NOTE_FETCH_WORKERS = int(os.getenv("NOTE_FETCH_WORKERS", "16"))
+NOTE_FETCH_TIMEOUT = 10  # seconds
+note_fetch_executor = ThreadPoolExecutor(max_workers=NOTE_FETCH_WORKERS, thread_name_prefix="note-fetch")
+
+# Where clinical notes are kept: "bucket" uploads every note to the Notes bucket,
+# "inline" stores notes in clinical_notes.note_json and only uses the bucket for large ones
+NOTE_STORAGE_MODE = os.getenv("NOTE_STORAGE_MODE", "bucket")
+NOTE_INLINE_MAX_BYTES = int(os.getenv("NOTE_INLINE_MAX_BYTES", str(256 * 1024)))
+PATIENT_BULK_BATCH_SIZE = int(os.getenv("PATIENT_BULK_BATCH_SIZE", "500"))  # rows per upsert request
+PATIENT_BULK_MAX_ROWS = int(os.getenv("PATIENT_BULK_MAX_ROWS", "50000"))
+PATIENTS_MAX_PAGE_SIZE = int(os.getenv("PATIENTS_MAX_PAGE_SIZE", "200"))
+PATIENT_COLUMNS = {
+    "id", "first_name", "last_name", "id_number", "dob", "sex", "language", "email_address",
+    "phone_number", "emergency_contact_name", "emergency_contact_phone", "med_aid_provider",
+    "med_aid_number", "primary_physician", "allergies", "med_conditions", "created_at"
+}
+PATIENT_SORT_COLUMNS = {"id", "first_name", "last_name", "id_number", "dob", "created_at"}
+PATIENT_SEARCH_COLUMNS = ("first_name", "last_name", "id_number")
+PATIENT_SEARCH_MAX_WORDS = 3
+PATIENT_SEARCH_MAX_LENGTH = 64
 
 app = Flask(__name__)
 CORS(app)
@@ -32,6 +86,74 @@ CORS(app)
 def home():
     return jsonify({"message": "Flask + Supabase API is running 🚀"})
 
+def trace_requested(args, headers):
+    """Per-request tracing is opt-in with ?trace=1 or an X-Trace: 1 header."""
+    return args.get('trace') == '1' or headers.get('X-Trace') == '1'
+
+def attach_trace(body, trace):
+    """Add the trace to a JSON response body (a dict)."""
+    if isinstance(body, dict):
+        body['trace'] = trace.to_dict()
+    return body
+
+@app.before_request
+def start_request_trace():
+    if trace_requested(request.args, request.headers):
+        g.trace, g.trace_token = start_trace(request.headers.get('X-Trace-Id'))
+
+@app.after_request
+def return_request_trace(response):
+    trace = g.pop('trace', None)
+    if trace is None:
+        return response
+    response.headers['X-Trace-Id'] = trace.id
+    if response.is_json and not response.is_streamed:
+        response.set_data(json.dumps(attach_trace(response.get_json(), trace)))
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus text exposition: per-stage pipeline timings as histograms
+    labelled by stage, provider and outcome, plus cache and outbound HTTP counters.
+    Each worker process keeps its own numbers.
+    """
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+def cache_and_http_metrics():
+    principal, rows, outbound = principal_cache.stats(), row_cache.stats(), host_limits.stats()
+    return {
+        'principal_cache_hits_total': ('counter', 'Verified-principal cache hits', principal['hits']),
+        'principal_cache_misses_total': ('counter', 'Verified-principal cache misses', principal['misses']),
+        'row_cache_hits_total': ('counter', 'Patient/doctor row cache hits in memory', rows['hits']),
+        'row_cache_loads_total': ('counter', 'Patient/doctor row cache loads from the database', rows['loads']),
+        'outbound_requests_total': ('counter', 'Outbound HTTP requests', outbound['requests']),
+        'outbound_retries_total': ('counter', 'Outbound HTTP retries', outbound['retries']),
+        'outbound_retry_budget_exhausted_total': ('counter', 'Retries skipped because the host retry budget was spent',
+                                                  outbound['retry_budget_exhausted'])
+    }
+
+def provider_limit_metrics():
+    samples = {}
+    for limit in (revai_limit, gemini_limit):
+        stats = limit.stats()
+        samples.update({
+            f'{limit.name}_concurrency_limit': ('gauge', f'Calls allowed in flight to {limit.name}', stats['concurrency_limit']),
+            f'{limit.name}_in_flight': ('gauge', f'Calls in flight to {limit.name}', stats['in_flight']),
+            f'{limit.name}_waiting': ('gauge', f'Calls waiting for a {limit.name} slot', stats['waiting']),
+            f'{limit.name}_throttled_total': ('counter', f'{limit.name} calls answered with 429 or 5xx', stats['throttled'])
+        })
+    return samples
+
+metrics.registry.add_collector(cache_and_http_metrics)
+metrics.registry.add_collector(provider_limit_metrics)
+
 
 
 
@@ -65,18 +187,27 @@ def token_required(f):
             # Decode token
             payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
             current_doctor_id = payload['doctor_id']
+            cache_key = principal_cache_key(payload)
             
-            # Verify doctor still exists
-            doctor_result = supabase.table('doctor_table').select('id, email_address, first_name, last_name').eq('id', current_doctor_id).execute()
-            
-            if not doctor_result.data:
-                return jsonify({
-                    'error': 'Invalid token - doctor not found',
-                    'success': False
-                }), 401
+            # Verify doctor still exists, unless this token was verified recently
+            current_doctor = principal_cache.get(cache_key)
+            if current_doctor is None:
+                doctor = cached_doctor(supabase, current_doctor_id)
+                
+                if not doctor:
+                    return jsonify({
+                        'error': 'Invalid token - doctor not found',
+                        'success': False
+                    }), 401
+                
+                current_doctor = {k: doctor.get(k) for k in ('id', 'email_address', 'first_name', 'last_name')}
+                # Never cache a principal beyond the token's own expiry
+                ttl = min(PRINCIPAL_CACHE_TTL, payload['exp'] - time.time()) if 'exp' in payload else PRINCIPAL_CACHE_TTL
+                principal_cache.set(cache_key, current_doctor, ttl=ttl)
             
             # Add doctor info to request context
-            request.current_doctor = doctor_result.data[0]
+            request.current_doctor = current_doctor
+            request.token_payload = payload
             
         except jwt.ExpiredSignatureError:
             return jsonify({
@@ -93,6 +224,20 @@ def token_required(f):
     
     return decorated
 
+def principal_cache_key(payload):
+    """Cache key for a verified token: its jti, or doctor id + issue time for older tokens."""
+    return payload.get('jti') or f"{payload['doctor_id']}:{payload.get('iat')}"
+
+@app.route('/auth/cache/stats', methods=['GET'])
+@token_required
+def principal_cache_stats():
+    """Hit/miss counters for the verified-principal cache and the patient/doctor row cache"""
+    return jsonify({
+        'success': True,
+        'principal_cache': principal_cache.stats(),
+        'row_cache': row_cache.stats()
+    }), 200
+
 @app.route('/chat/query', methods=['POST'])
 def chat_with_database():
     """
@@ -100,8 +245,16 @@ def chat_with_database():
     
     Expected JSON payload:
     {
-        "message": "Your question about the database"
+        "message": "Your question about the database",
+        "stream": false
     }
+    
+    With "stream": true the answer is produced by a single Gemini function-calling
+    loop and streamed back as newline-delimited JSON events:
+        {"type": "tool", "name": "...", "parameters": {...}}
+        {"type": "text", "text": "..."}
+        {"type": "error", "error": "..."}
+        {"type": "done"}
     """
     try:
         # Get JSON data from request
@@ -123,15 +276,30 @@ def chat_with_database():
             }), 400
         
         # Import and use the MCP client functionality
-        import asyncio
-        from client import process_user_question
+        from client import process_user_question, answer_user_question, CHAT_MODE
+        
+        if data.get('stream'):
+            return Response(stream_with_context(chat_event_lines(user_message)), mimetype='application/x-ndjson')
         
-        # Run the async function in the current thread
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        if CHAT_MODE == 'function_calling':
+            try:
+                ai_response = answer_user_question(user_message)
+            except Exception as process_error:
+                return jsonify({
+                    'error': f'AI processing failed: {str(process_error)}',
+                    'success': False
+                }), 500
+            
+            return jsonify({
+                'success': True,
+                'message': 'Query processed successfully',
+                'user_message': user_message,
+                'ai_response': ai_response
+            }), 200
         
+        # Run the async function on the shared event loop
         try:
-            ai_response = loop.run_until_complete(process_user_question(user_message))
+            ai_response = run_sync(process_user_question(user_message))
             
             return jsonify({
                 'success': True,
@@ -146,8 +314,6 @@ def chat_with_database():
                 'error': f'AI processing failed: {str(process_error)}',
                 'success': False
             }), 500
-        finally:
-            loop.close()
     
     except Exception as e:
         return jsonify({
@@ -155,6 +321,17 @@ def chat_with_database():
             'success': False
         }), 500
 
+def chat_event_lines(user_message):
+    """Stream the function-calling chat answer as newline-delimited JSON events."""
+    from client import stream_user_question
+    
+    try:
+        for event in stream_user_question(user_message):
+            yield json.dumps(event) + "\n"
+    except Exception as stream_error:
+        yield json.dumps({'type': 'error', 'error': f'AI processing failed: {str(stream_error)}'}) + "\n"
+    yield json.dumps({'type': 'done'}) + "\n"
+
 @app.route('/patient/<int:patient_id>', methods=['GET'])
 def get_patient(patient_id):
     """
@@ -164,10 +341,9 @@ def get_patient(patient_id):
     try:
         
         # Fetch patient info
-        patient_result = supabase.table('patient_table').select('*').eq('id', patient_id).execute()
+        patient = cached_patient(supabase, patient_id)
 
-        
-        if not patient_result.data:
+        if not patient:
             return jsonify({
                 'success': False,
                 'error': 'Patient not found'
@@ -175,7 +351,7 @@ def get_patient(patient_id):
             
         return jsonify({
             'success': True,
-            'patient': patient_result.data[0]
+            'patient': patient
         }), 200
         
     except Exception as e:
@@ -190,8 +366,13 @@ def get_patient_notes(patient_id, doctor_id):
     Fetch all notes for a specific patient written by a specific doctor.
     Requires Authorization header with Bearer token.
 
+    Query parameters:
+    - limit: Maximum number of notes to return (optional, returns all notes if omitted)
+    - cursor: Note id to continue after, taken from next_cursor of the previous page
+    - fields: "meta" to return note metadata only, without fetching the note bodies
+
     Example request:
-        GET /patient/1/doctor/2/notes
+        GET /patient/1/doctor/2/notes?limit=20&cursor=41
         Headers: Authorization: Bearer <token>
     """
     try:
@@ -200,38 +381,62 @@ def get_patient_notes(patient_id, doctor_id):
         # if current_doctor["id"] != doctor_id:
         #     return jsonify({'error': 'Unauthorized', 'success': False}), 403
 
-        print(f"Fetching notes for patient {patient_id}, doctor {doctor_id}");
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor', type=int)
+        meta_only = request.args.get('fields') == 'meta'
+
+        if limit is not None and limit <= 0:
+            return jsonify({
+                'error': 'limit must be a positive integer',
+                'success': False
+            }), 400
 
-        # Fetch notes for this patient & doctor
-        notes_result = (
+        # Fetch notes for this patient & doctor, oldest first so the cursor is stable
+        query = (
             supabase.table('clinical_notes')
             .select('*')
             .eq('patient_id', patient_id)
             .eq('doctor_id', doctor_id)
-            .execute()
+            .order('id')
         )
-
-        print("Query result:", notes_result)
+        if cursor is not None:
+            query = query.gt('id', cursor)
+        if limit is not None:
+            # Fetch one extra row to know whether there is another page
+            query = query.limit(limit + 1)
+        notes_result = query.execute()
 
         if not notes_result.data:
             return jsonify({
                 'success': True,
                 'message': 'No notes found for this patient from this doctor',
-                'notes': []
+                'notes': [],
+                'next_cursor': None
             }), 200
 
-        # Fetch the content of each note from its URL
-        notes_with_content = []
-        for note in notes_result.data:
-            note_url = note.get('Note')
-            note_content = None
-            try:
-                response = requests.get(note_url)
-                response.raise_for_status()
-                note_content = response.text  # or response.json() if stored as JSON
-            except Exception as e:
-                note_content = f"Error fetching note content: {str(e)}"
+        notes = notes_result.data
+        next_cursor = None
+        if limit is not None and len(notes) > limit:
+            notes = notes[:limit]
+            next_cursor = notes[-1]['id']
+
+        if meta_only:
+            return jsonify({
+                'success': True,
+                'notes': [{
+                    'id': note['id'],
+                    'created_at': note['created_at'],
+                    'doctor_id': note['doctor_id'],
+                    'patient_id': note['patient_id']
+                } for note in notes],
+                'next_cursor': next_cursor
+            }), 200
 
+        # Inline notes are already in the row; the rest are fetched concurrently from their URL
+        note_contents = note_fetch_executor.map(load_note_content, notes)
+
+        notes_with_content = []
+        for note, note_content in zip(notes, note_contents):
             notes_with_content.append({
                 'id': note['id'],
                 'note': note_content,
@@ -242,7 +447,8 @@ def get_patient_notes(patient_id, doctor_id):
 
         return jsonify({
             'success': True,
-            'notes': notes_with_content
+            'notes': notes_with_content,
+            'next_cursor': next_cursor
         }), 200
 
     except Exception as e:
@@ -251,6 +457,21 @@ def get_patient_notes(patient_id, doctor_id):
             'success': False
         }), 500
 
+def load_note_content(note):
+    """Return the note body, from the inline note_json column when present."""
+    if note.get('note_json') is not None:
+        return json.dumps(note['note_json'], indent=2)
+    return fetch_note_content(note.get('Note'))
+
+def fetch_note_content(note_url):
+    """Fetch a stored note body over the shared outbound client."""
+    try:
+        response = get_http_client().get(note_url, timeout=NOTE_FETCH_TIMEOUT)
+        response.raise_for_status()
+        return response.text  # or response.json() if stored as JSON
+    except Exception as e:
+        return f"Error fetching note content: {str(e)}"
+
 @app.route('/patients', methods=['POST'])
 def create_patient():
     """
@@ -260,23 +481,8 @@ def create_patient():
         data = request.json
 
         # Insert into patient_table
-        result = supabase.table('patient_table').insert({
-            "first_name": data.get("first_name"),
-            "last_name": data.get("last_name"),
-            "id_number": data.get("id_number"),
-            "dob": data.get("dob"),
-            "sex": data.get("sex"),
-            "language": data.get("language"),
-            "email_address": data.get("email_address"),
-            "phone_number": data.get("phone_number"),
-            "emergency_contact_name": data.get("emergency_contact_name"),
-            "emergency_contact_phone": data.get("emergency_contact_phone"),
-            "med_aid_provider": data.get("med_aid_provider", "N/A"),
-            "med_aid_number": data.get("med_aid_number", "N/A"),
-            "primary_physician": data.get("primary_physician"),
-            "allergies": data.get("allergies", "N/A"),
-            "med_conditions": data.get("med_conditions", "N/A"),
-        }).execute()
+        result = supabase.table('patient_table').insert(patient_record(data)).execute()
+        forget_patients(result.data)
 
         return jsonify({
             "success": True,
@@ -287,15 +493,266 @@ def create_patient():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def patient_record(data):
+    """Map request fields to a patient_table row, with the defaults create_patient uses"""
+    return {
+        "first_name": data.get("first_name"),
+        "last_name": data.get("last_name"),
+        "id_number": data.get("id_number"),
+        "dob": data.get("dob"),
+        "sex": data.get("sex"),
+        "language": data.get("language"),
+        "email_address": data.get("email_address"),
+        "phone_number": data.get("phone_number"),
+        "emergency_contact_name": data.get("emergency_contact_name"),
+        "emergency_contact_phone": data.get("emergency_contact_phone"),
+        "med_aid_provider": data.get("med_aid_provider", "N/A"),
+        "med_aid_number": data.get("med_aid_number", "N/A"),
+        "primary_physician": data.get("primary_physician"),
+        "allergies": data.get("allergies", "N/A"),
+        "med_conditions": data.get("med_conditions", "N/A"),
+    }
+
+@app.route('/patients/bulk', methods=['POST'])
+@token_required
+def create_patients_bulk():
+    """
+    Register many patients from a JSON lines or CSV request body.
+    
+    The body is read as a stream, one row at a time, and rows are upserted on
+    id_number in batches of PATIENT_BULK_BATCH_SIZE. Invalid rows are reported
+    and skipped; they do not fail the rest of the upload.
+    
+    Query parameters:
+    - format: "jsonl" or "csv" (defaults from the Content-Type, else jsonl)
+    - batch_size: rows per database request (optional)
+    
+    Example request:
+        curl -X POST "http://localhost:5000/patients/bulk?format=csv" \
+             -H "Authorization: Bearer <token>" -H "Content-Type: text/csv" \
+             --data-binary @patients.csv
+    
+    Returns per-row errors as {"row": <1-based row number>, "id_number": ..., "errors": [...]}.
+    """
+    fmt = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'jsonl')
+    batch_size = min(request.args.get('batch_size', PATIENT_BULK_BATCH_SIZE, type=int), PATIENT_BULK_BATCH_SIZE)
+
+    if fmt not in ('jsonl', 'csv') or batch_size < 1:
+        return jsonify({
+            'error': 'format must be jsonl or csv and batch_size must be positive',
+            'success': False
+        }), 400
+
+    report = {'received': 0, 'upserted': 0, 'failed': 0, 'errors': []}
+    pending = []
+    seen_id_numbers = {}
+
+    def reject(row_number, id_number, errors):
+        report['failed'] += 1
+        report['errors'].append({'row': row_number, 'id_number': id_number or None, 'errors': errors})
+
+    def flush():
+        # Validate the whole batch in one pass, then upsert the valid rows together
+        batch = []
+        for (row_number, row), row_errors in zip(pending, validate_patient_rows([row for _, row in pending])):
+            id_number = str(row.get('id_number') or '').strip()
+            if not id_number:
+                reject(row_number, None, row_errors or ['id_number is required'])
+                continue
+            if id_number in seen_id_numbers:
+                # Postgres cannot upsert the same key twice in one statement
+                row_errors.append(f'Duplicate id_number, already given in row {seen_id_numbers[id_number]}')
+            if row_errors:
+                reject(row_number, id_number, row_errors)
+                continue
+            seen_id_numbers[id_number] = row_number
+            row['id_number'] = id_number
+            batch.append((row_number, row))
+
+        upserted, errors = upsert_patient_batch(batch, request.current_doctor['id'])
+        report['upserted'] += upserted
+        report['failed'] += len(errors)
+        report['errors'].extend(errors)
+        pending.clear()
+
+    try:
+        for row_number, row in enumerate(read_patient_rows(request.stream, fmt), start=1):
+            report['received'] += 1
+            if report['received'] > PATIENT_BULK_MAX_ROWS:
+                flush()
+                return jsonify({
+                    'error': f'Too many rows. Maximum per upload: {PATIENT_BULK_MAX_ROWS}; rows after that were not read',
+                    'success': False,
+                    **report
+                }), 413
+
+            if isinstance(row, Exception):
+                reject(row_number, None, [str(row)])
+                continue
+
+            pending.append((row_number, row))
+            if len(pending) >= batch_size:
+                flush()
+
+        flush()
+        report['errors'].sort(key=lambda error: error['row'])
+
+    except Exception as e:
+        return jsonify({
+            'error': f'Bulk registration error: {str(e)}',
+            'success': False,
+            **report
+        }), 500
+
+    return jsonify({
+        'success': True,
+        **report
+    }), 200
+
+def read_patient_rows(stream, fmt):
+    """
+    Yield patient dicts from a JSON lines or CSV byte stream.
+    A line that cannot be parsed is yielded as the exception instead.
+    """
+    lines = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as parse_error:
+                yield ValueError(f'Invalid CSV: {parse_error}')
+                continue
+            yield {key.strip(): (value.strip() or None) if isinstance(value, str) else value
+                   for key, value in row.items() if key}
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as parse_error:
+            yield ValueError(f'Invalid JSON: {parse_error}')
+            continue
+        yield row if isinstance(row, dict) else ValueError('Each line must be a JSON object')
+
+def upsert_patient_batch(batch, doctor_id):
+    """
+    Register a batch of (row_number, patient row) keyed on id_number.
+    
+    New patients are inserted with the defaults create_patient uses and are
+    always assigned to doctor_id. Existing patients are only updated if
+    doctor_id is their primary physician, and only in the columns the row
+    fills in, so a partial upload or an empty CSV cell never blanks data.
+    
+    Args:
+        batch: list of (row_number, patient row) with id_number set
+        doctor_id: id of the doctor making the upload
+    
+    Returns:
+        tuple: (number of rows upserted, list of per-row errors)
+    """
+    if not batch:
+        return 0, []
+
+    existing = supabase.table('patient_table') \
+        .select('id_number,primary_physician') \
+        .in_('id_number', [row['id_number'] for _, row in batch]) \
+        .execute().data or []
+    owners = {row['id_number']: row.get('primary_physician') for row in existing}
+
+    errors = []
+    new_patients = []
+    updates = {}
+    for row_number, row in batch:
+        if row['id_number'] not in owners:
+            record = patient_record({**row, 'primary_physician': doctor_id})
+            new_patients.append((row_number, record))
+        elif str(owners[row['id_number']]) != str(doctor_id):
+            errors.append({'row': row_number, 'id_number': row['id_number'],
+                           'errors': ['Patient is registered to another doctor']})
+        else:
+            # CSV rows carry every header, with None for an empty cell
+            record = {column: value for column, value in patient_record(row).items()
+                      if row.get(column) not in (None, '')}
+            # One request per column set, so PostgREST only writes the columns given
+            updates.setdefault(tuple(sorted(record)), []).append((row_number, record))
+
+    # A patient registered by someone else since the lookup is skipped, not overwritten
+    upserted, insert_errors = send_patient_batch(new_patients, ignore_duplicates=True)
+    errors.extend(insert_errors)
+    for rows in updates.values():
+        # Reassigned patients leave the uploader's list as well as joining another
+        updated, update_errors = send_patient_batch(rows, previous_physicians=[doctor_id])
+        upserted += updated
+        errors.extend(update_errors)
+    return upserted, errors
+
+def send_patient_batch(batch, ignore_duplicates=False, previous_physicians=()):
+    """
+    Upsert (row_number, record) pairs on id_number in one request.
+    If the request is rejected, rows are retried one at a time so only the
+    bad rows are reported. With ignore_duplicates, rows that already exist
+    are left alone and reported as conflicts. previous_physicians are the
+    doctors the rows belonged to, whose cached patient lists are dropped too.
+    
+    Returns:
+        tuple: (number of rows written, list of per-row errors)
+    """
+    if not batch:
+        return 0, []
+
+    def upsert(records):
+        result = supabase.table('patient_table') \
+            .upsert(records, on_conflict='id_number', ignore_duplicates=ignore_duplicates) \
+            .execute()
+        forget_patients(result.data or [], previous_physicians)
+        return {row.get('id_number') for row in result.data or []}
+
+    try:
+        written = upsert([record for _, record in batch])
+        pairs = [(row_number, record, record['id_number'] in written) for row_number, record in batch]
+    except Exception as batch_error:
+        print(f"Patient batch of {len(batch)} rejected ({batch_error}), retrying row by row")
+        pairs = None
+
+    errors = []
+    if pairs is None:
+        pairs = []
+        for row_number, record in batch:
+            try:
+                pairs.append((row_number, record, record['id_number'] in upsert(record)))
+            except Exception as row_error:
+                errors.append({'row': row_number, 'id_number': record.get('id_number'), 'errors': [str(row_error)]})
+
+    upserted = 0
+    for row_number, record, was_written in pairs:
+        if was_written:
+            upserted += 1
+        else:
+            errors.append({'row': row_number, 'id_number': record['id_number'],
+                           'errors': ['Patient was registered by another upload; not overwritten']})
+    return upserted, errors
+
 @app.route('/doctor/<int:doctor_id>/patients', methods=['GET'])
 @token_required
 def get_doctor_patients(doctor_id):
     """
-    Fetch all patients assigned to a specific doctor (by doctor_id).
+    Fetch the patients assigned to a specific doctor (by doctor_id).
     Requires Authorization header with Bearer token.
 
+    Query parameters (all optional; without them every patient is returned):
+    - limit: Page size, at most PATIENTS_MAX_PAGE_SIZE
+    - cursor: next_cursor from the previous page; total_estimate is only returned on the first page
+    - fields: Comma-separated columns to return, e.g. "id,first_name,last_name"
+    - sort: id, first_name, last_name, id_number, dob or created_at (default id)
+    - order: "asc" (default) or "desc"
+    - q: Prefix search over first name, last name and id_number; every word must match
+
     Example request:
-        GET /doctor/1/patients
+        GET /doctor/1/patients?limit=50&fields=id,first_name,last_name&sort=last_name&q=smi
         Headers: Authorization: Bearer <token>
     """
     try:
@@ -307,20 +764,91 @@ def get_doctor_patients(doctor_id):
                 'success': False
             }), 403
 
-        # Fetch patients assigned to this doctor
-        patients_result = supabase.table('patient_table').select('*').eq('primary_physician', doctor_id).execute()
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        sort = request.args.get('sort', 'id')
+        descending = request.args.get('order', 'asc') == 'desc'
+        search = request.args.get('q', '')
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+        paginated = limit is not None or cursor is not None
+
+        if limit is not None and not 0 < limit <= PATIENTS_MAX_PAGE_SIZE:
+            return jsonify({
+                'error': f'limit must be between 1 and {PATIENTS_MAX_PAGE_SIZE}',
+                'success': False
+            }), 400
+
+        if sort not in PATIENT_SORT_COLUMNS or request.args.get('order', 'asc') not in ('asc', 'desc'):
+            return jsonify({
+                'error': f'sort must be one of {", ".join(sorted(PATIENT_SORT_COLUMNS))} and order asc or desc',
+                'success': False
+            }), 400
 
-        if not patients_result.data:
+        unknown_fields = [f for f in fields if f not in PATIENT_COLUMNS]
+        if unknown_fields:
             return jsonify({
+                'error': f'Unknown fields: {", ".join(unknown_fields)}',
+                'success': False
+            }), 400
+
+        last_value = last_id = None
+        if cursor is not None:
+            try:
+                last_value, last_id = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({
+                    'error': 'Invalid cursor',
+                    'success': False
+                }), 400
+
+        def load_patients():
+            # The cursor needs the sort column and id of the last row
+            columns = ','.join(dict.fromkeys(['id', sort] + fields)) if fields else '*'
+            query = (
+                supabase.table('patient_table')
+                # Counting only on the first page; later pages keep the client's total
+                .select(columns, count='estimated' if paginated and cursor is None else None)
+                .eq('primary_physician', doctor_id)
+            )
+
+            filters = [f'or({condition})' for condition in patient_search_filters(search)]
+            if cursor is not None:
+                filters.append(f'or({patient_keyset_filter(sort, last_value, last_id, descending)})')
+            if filters:
+                query = query.or_(f"and({','.join(filters)})")
+
+            query = query.order(sort, desc=descending, nullsfirst=False)
+            if sort != 'id':
+                query = query.order('id', desc=descending)
+            if limit is not None:
+                # Fetch one extra row to know whether there is another page
+                query = query.limit(limit + 1)
+
+            patients_result = query.execute()
+            patients = patients_result.data or []
+
+            next_cursor = None
+            if limit is not None and len(patients) > limit:
+                patients = patients[:limit]
+                next_cursor = encode_cursor(patients[-1].get(sort), patients[-1]['id'])
+
+            response = {
                 'success': True,
-                'message': 'No patients found for this doctor',
-                'patients': []
-            }), 200
+                'patients': patients
+            }
+            if not patients:
+                response['message'] = 'No patients found for this doctor'
+            if paginated:
+                response['next_cursor'] = next_cursor
+                response['total_estimate'] = patients_result.count
+            return response
 
-        return jsonify({
-            'success': True,
-            'patients': patients_result.data
-        }), 200
+        # Each combination of query parameters is cached separately; adding or
+        # updating one of the doctor's patients drops them all
+        response = row_cache.get_or_load(doctor_patients_scope(doctor_id), load_patients,
+                                         variant=urlencode(sorted(request.args.items(multi=True))))
+
+        return jsonify(response), 200
 
     except Exception as e:
         return jsonify({
@@ -328,6 +856,50 @@ def get_doctor_patients(doctor_id):
             'success': False
         }), 500
 
+def encode_cursor(value, row_id):
+    """Opaque keyset cursor holding the sort value and id of the last row"""
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+    return value, row_id
+
+def postgrest_literal(value):
+    """Quote a value for use inside a PostgREST or/and filter"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def patient_keyset_filter(column, last_value, last_id, descending):
+    """
+    Rows after (last_value, last_id) in (column, id) order, with NULLs sorted last.
+    """
+    op = 'lt' if descending else 'gt'
+    if column == 'id':
+        return f'id.{op}.{last_id}'
+    if last_value is None:
+        return f'and({column}.is.null,id.{op}.{last_id})'
+    value = postgrest_literal(last_value)
+    return f'{column}.{op}.{value},and({column}.eq.{value},id.{op}.{last_id}),{column}.is.null'
+
+def like_prefix(word):
+    """ILIKE prefix pattern that matches word literally, with LIKE wildcards escaped"""
+    return word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '*'
+
+def patient_search_filters(search):
+    """
+    One OR-condition per search word: the word must be a prefix of the first
+    name, last name or id_number.
+    """
+    words = re.sub(r'[^\w\s.@\'-]', ' ', search)[:PATIENT_SEARCH_MAX_LENGTH].split()
+    return [
+        ','.join(f'{column}.ilike.{postgrest_literal(like_prefix(word))}' for column in PATIENT_SEARCH_COLUMNS)
+        for word in words[:PATIENT_SEARCH_MAX_WORDS]
+    ]
+
 @app.route('/signup/doctor', methods=['POST'])
 def doctor_signup():
     """
@@ -442,6 +1014,7 @@ def doctor_signup():
         if result.data:
             # Get the inserted doctor data (without password)
             inserted_doctor = result.data[0]
+            forget_doctor(inserted_doctor['id'])
             
             # Remove password from response
             response_data = {k: v for k, v in inserted_doctor.items() if k != 'password'}
@@ -555,6 +1128,7 @@ def doctor_signin():
             'email': doctor['email_address'],
             'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRY_HOURS),
             'iat': datetime.utcnow(),
+            'jti': str(uuid.uuid4()),
             'first_name' : doctor['first_name'],
             'last_name' : doctor['last_name'],
             'id_number' : doctor['id_number'],
@@ -575,6 +1149,7 @@ def doctor_signin():
             supabase.table('doctor_table').update({
                 'last_login': datetime.utcnow().isoformat()
             }).eq('id', doctor['id']).execute()
+            forget_doctor(doctor['id'])
         except:
             # Don't fail signin if last_login update fails
             pass
@@ -623,11 +1198,15 @@ def refresh_token():
             'doctor_id': doctor['id'],
             'email': doctor['email_address'],
             'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRY_HOURS),
-            'iat': datetime.utcnow()
+            'iat': datetime.utcnow(),
+            'jti': str(uuid.uuid4())
         }
         
         new_access_token = jwt.encode(token_payload, JWT_SECRET, algorithm='HS256')
         
+        # The old token is being replaced, so stop trusting its cached verification
+        principal_cache.invalidate(principal_cache_key(request.token_payload))
+        
         return jsonify({
             'success': True,
             'message': 'Token refreshed successfully',
@@ -650,12 +1229,22 @@ def logout():
     Logout endpoint - mainly for client-side cleanup
     Server-side logout would require token blacklisting (not implemented here)
     """
+    principal_cache.invalidate(principal_cache_key(request.token_payload))
+    
     return jsonify({
         'success': True,
         'message': 'Logged out successfully. Please remove the token from client storage.'
     }), 200
 
 
+ALLOWED_EXTENSIONS = {'mp3', 'wav', 'flac', 'm4a', 'ogg', 'webm'}
+MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+
+def allowed_file(filename):
+    """Check if the uploaded file has an allowed extension."""
+    return '.' in filename and \
+        filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
 @app.route('/transcribe/audio', methods=['POST'])
 #@token_required
 def submit_audio_for_transcription():
@@ -667,18 +1256,14 @@ def submit_audio_for_transcription():
     - patient_id: ID of the patient (optional)
     - doctor_id: ID of the doctor (optional)
     
+    Query parameters:
+    - mode: "sync" (default) waits for the clinical note, "queue" returns a
+      job id with 202 and processes the upload on a background worker
+    
     Headers required:
     Authorization: Bearer <access_token>
     """
 
-    ALLOWED_EXTENSIONS = {'mp3', 'wav', 'flac', 'm4a', 'ogg', 'webm'}
-    MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
-
-    def allowed_file(filename):
-        """Check if the uploaded file has an allowed extension."""
-        return '.' in filename and \
-            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
     try:
         # Get patient_id and doctor_id from form data or use defaults
         patient_id = request.form.get('patient_id') or "1"
@@ -711,100 +1296,811 @@ def submit_audio_for_transcription():
         filename = secure_filename(file.filename)
         
         # Create a temporary file to store the upload
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{filename.rsplit('.', 1)[1].lower()}") as temp_file:
+        with tempfile.NamedTemporaryFile(delete=False, dir=TRANSCRIBE_SPOOL_DIR, suffix=f".{filename.rsplit('.', 1)[1].lower()}") as temp_file:
             file.save(temp_file.name)
             temp_file_path = temp_file.name
         
-        try:
-            # Process the audio file
-            import asyncio
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            clinical_note = loop.run_until_complete(transcribe(temp_file_path))
-            
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            
-            # Upload to storage bucket
-            upload_result = upload_clinical_note_to_storage(clinical_note)
-            
-            if not upload_result.get('success'):
+        return dispatch_transcription({
+            'file_path': temp_file_path,
+            'patient_id': patient_id,
+            'doctor_id': doctor_id
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': f'Audio processing error: {str(e)}',
+            'success': False
+        }), 500
+
+
+@app.route('/transcribe/stream', methods=['POST'])
+def stream_audio_for_transcription():
+    """
+    Stream audio straight through to the transcription provider.
+    The request body is the raw audio (not form data) and is forwarded as it
+    arrives, without buffering the whole upload or writing it to disk.
+    
+    Query parameters:
+    - filename: Original file name, used for the file type (required)
+    - patient_id: ID of the patient (optional)
+    - doctor_id: ID of the doctor (optional)
+    - mode: "sync" (default) or "queue", as for /transcribe/audio
+    
+    Example request:
+        curl -X POST "http://localhost:5000/transcribe/stream?filename=visit.webm&patient_id=1&doctor_id=2" \
+             -H "Content-Type: application/octet-stream" -T visit.webm
+    """
+    try:
+        filename = secure_filename(request.args.get('filename', ''))
+        patient_id = request.args.get('patient_id') or "1"
+        doctor_id = request.args.get('doctor_id') or "1"
+
+        if not filename or not allowed_file(filename):
+            return jsonify({
+                'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}',
+                'success': False
+            }), 400
+
+        if get_stt_backend().name != 'revai':
+            # Local backends read from disk; spool the body instead of streaming it on
+            with tempfile.NamedTemporaryFile(delete=False, dir=TRANSCRIBE_SPOOL_DIR, suffix=f".{filename.rsplit('.', 1)[1].lower()}") as temp_file:
+                size = 0
+                while size <= MAX_FILE_SIZE:
+                    chunk = request.stream.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    temp_file.write(chunk)
+                temp_file_path = temp_file.name
+            if size > MAX_FILE_SIZE:
+                os.unlink(temp_file_path)
                 return jsonify({
-                    'error': f'Failed to upload to storage: {upload_result.get("error")}',
+                    'error': 'File too large. Maximum size: 100MB',
                     'success': False
-                }), 500
-            
-            # Save to database if patient_id and doctor_id are provided
-            db_result = None
-            if patient_id and doctor_id:
-                db_result = upload_note_to_db(
-                    upload_result['public_url'], 
-                    int(patient_id), 
-                    int(doctor_id)
-                )
+                }), 413
+            return dispatch_transcription({
+                'file_path': temp_file_path,
+                'patient_id': patient_id,
+                'doctor_id': doctor_id
+            })
 
+        try:
+            provider_job_id = submit_audio_stream(request.stream, filename, max_bytes=MAX_FILE_SIZE)
+        except AudioTooLarge:
             return jsonify({
-                'success': True,
-                'message': 'Audio transcribed successfully',
-                'clinical_note': clinical_note.model_dump(),
-                'storage_url': upload_result['public_url'],
-                'database_result': db_result
-            }), 200
-            
-        except Exception as transcription_error:
-            # Clean up temporary file in case of error
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
-            
+                'error': 'File too large. Maximum size: 100MB',
+                'success': False
+            }), 413
+        except Exception as submit_error:
             return jsonify({
-                'error': f'Transcription failed: {str(transcription_error)}',
+                'error': f'Transcription failed: {str(submit_error)}',
                 'success': False
             }), 500
-    
+
+        return dispatch_transcription({
+            'provider_job_id': provider_job_id,
+            'patient_id': patient_id,
+            'doctor_id': doctor_id
+        })
+
     except Exception as e:
         return jsonify({
             'error': f'Audio processing error: {str(e)}',
             'success': False
         }), 500
 
-
-
-def upload_clinical_note_to_storage(clinical_note):
+@app.route('/transcribe/uploads', methods=['POST'])
+def init_chunked_upload():
     """
-    Upload clinical note JSON to Supabase storage bucket
+    Start a resumable chunked upload, e.g. while a consultation is still being recorded.
     
-    Args:
-        clinical_note: ClinicalNote object from transcription
-        doctor_id: Optional doctor ID (not used in filename)
+    Expected JSON payload:
+    {
+        "filename": "consultation.webm",
+        "patient_id": "1",
+        "doctor_id": "2"
+    }
     
-    Returns:
-        dict: Upload result with file path and URL
+    Chunks are then sent with PUT /transcribe/uploads/<upload_id>?offset=<bytes so far>
+    and the upload is processed with POST /transcribe/uploads/<upload_id>/finalize.
     """
-    try:
-        # Convert clinical note to JSON
-        json_data = clinical_note.model_dump()
-        json_string = json.dumps(json_data, indent=2)
-        
-        # Generate pure random filename
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        random_name = str(uuid.uuid4())[:8]  # Random 8-character string
-        
-        # Simple file path with random name only
-        file_path = f"Notes/{timestamp}_{random_name}.json"
-        
-        print(f"Attempting to upload to path: {file_path}")  # Debug log
-        
-        # Create temporary JSON file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as temp_json_file:
-            temp_json_file.write(json_string)
-            temp_json_path = temp_json_file.name
-        
-        try:
-            # Upload the temporary file to Supabase storage
-            with open(temp_json_path, 'rb') as f:
-                response = supabase.storage.from_("Notes").upload(
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+
+    if not filename or not allowed_file(filename):
+        return jsonify({
+            'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}',
+            'success': False
+        }), 400
+
+    upload = chunked_uploads.create(filename, {
+        'patient_id': data.get('patient_id') or "1",
+        'doctor_id': data.get('doctor_id') or "1"
+    })
+
+    return jsonify({
+        'success': True,
+        'upload_id': upload['id'],
+        'offset': upload['offset']
+    }), 201
+
+@app.route('/transcribe/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Get the current offset of a chunked upload, to resume after a dropped connection"""
+    upload = chunked_uploads.get(upload_id)
+
+    if not upload:
+        return jsonify({
+            'error': 'Upload not found',
+            'success': False
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'offset': upload['offset']
+    }), 200
+
+@app.route('/transcribe/uploads/<upload_id>', methods=['PUT'])
+def append_chunked_upload(upload_id):
+    """
+    Append the request body to a chunked upload.
+    The offset query parameter must equal the bytes received so far; otherwise
+    409 is returned with the offset to resume from.
+    """
+    offset = request.args.get('offset', type=int)
+
+    if offset is None:
+        return jsonify({
+            'error': 'offset is required',
+            'success': False
+        }), 400
+
+    if not chunked_uploads.get(upload_id):
+        return jsonify({
+            'error': 'Upload not found',
+            'success': False
+        }), 404
+
+    try:
+        new_offset = chunked_uploads.append(upload_id, offset, request.stream)
+    except OffsetMismatch as mismatch:
+        return jsonify({
+            'error': str(mismatch),
+            'success': False,
+            'offset': mismatch.expected_offset
+        }), 409
+    except ValueError as size_error:
+        return jsonify({
+            'error': str(size_error),
+            'success': False
+        }), 413
+
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'offset': new_offset
+    }), 200
+
+@app.route('/transcribe/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    """
+    Finish a chunked upload and transcribe it.
+    Accepts mode=sync|queue like /transcribe/audio.
+    """
+    upload = chunked_uploads.get(upload_id)
+
+    if not upload:
+        return jsonify({
+            'error': 'Upload not found',
+            'success': False
+        }), 404
+
+    if upload['offset'] == 0:
+        return jsonify({
+            'error': 'Upload is empty',
+            'success': False
+        }), 400
+
+    chunked_uploads.discard(upload_id)
+
+    return dispatch_transcription({
+        'file_path': chunked_uploads.path(upload_id),
+        'filename': upload['filename'],
+        'patient_id': upload['metadata'].get('patient_id'),
+        'doctor_id': upload['metadata'].get('doctor_id')
+    })
+
+@app.route('/transcribe/live', methods=['POST'])
+def start_live_transcription():
+    """
+    Start transcribing a consultation while it is being recorded.
+    
+    Expected JSON payload (optional):
+    {
+        "patient_id": "1",
+        "doctor_id": "2"
+    }
+    
+    Audio frames are then sent as raw request bodies to
+    POST /transcribe/live/<session_id>/audio, the rolling transcript and draft
+    note are read from GET /transcribe/live/<session_id>, and
+    POST /transcribe/live/<session_id>/finish saves the final note.
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        session = live_sessions.create(metadata={
+            'patient_id': data.get('patient_id') or "1",
+            'doctor_id': data.get('doctor_id') or "1"
+        })
+    except Exception as e:
+        return jsonify({
+            'error': f'Could not start live transcription: {str(e)}',
+            'success': False
+        }), 502
+
+    return jsonify({
+        'success': True,
+        'session_id': session.id
+    }), 201
+
+@app.route('/transcribe/live/<session_id>/audio', methods=['POST'])
+def append_live_audio(session_id):
+    """Forward the request body (recorded audio frames) to the live session's STT stream"""
+    session = live_sessions.get(session_id)
+
+    if not session:
+        return jsonify({
+            'error': 'Live session not found',
+            'success': False
+        }), 404
+
+    try:
+        while True:
+            frame = request.stream.read(LIVE_FRAME_READ_SIZE)
+            if not frame:
+                break
+            session.feed(frame)
+    except RuntimeError as finished_error:
+        return jsonify({
+            'error': str(finished_error),
+            'success': False
+        }), 409
+
+    return jsonify({
+        'success': True,
+        **session.snapshot(include_transcript=False)
+    }), 200
+
+@app.route('/transcribe/live/<session_id>', methods=['GET'])
+def get_live_transcription(session_id):
+    """Get the rolling transcript and the current draft clinical note"""
+    session = live_sessions.get(session_id)
+
+    if not session:
+        return jsonify({
+            'error': 'Live session not found',
+            'success': False
+        }), 404
+
+    return jsonify({
+        'success': True,
+        **session.snapshot()
+    }), 200
+
+@app.route('/transcribe/live/<session_id>/finish', methods=['POST'])
+def finish_live_transcription(session_id):
+    """
+    Stop the live session, extract whatever the draft note has not covered yet
+    and save the clinical note like /transcribe/audio does.
+    """
+    session = live_sessions.discard(session_id)
+
+    if not session:
+        return jsonify({
+            'error': 'Live session not found',
+            'success': False
+        }), 404
+
+    try:
+        clinical_note = session.finish()
+
+        if clinical_note is None:
+            return jsonify({
+                'error': 'No speech was transcribed',
+                'success': False
+            }), 400
+
+        result = save_clinical_note(clinical_note, session.metadata['patient_id'], session.metadata['doctor_id'])
+
+        return jsonify({
+            'success': True,
+            'message': 'Live transcription completed successfully',
+            'transcript': session.transcript(),
+            **result
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': f'Live transcription failed: {str(e)}',
+            'success': False
+        }), 500
+
+@app.route('/transcribe/bulk', methods=['POST'])
+@token_required
+def start_bulk_import():
+    """
+    Backfill archived recordings that are already on the server.
+    
+    Expected JSON payload (either the rows or a manifest file):
+    {
+        "manifest": [
+            {"audio_path": "2023/visit_0001.mp3", "patient_id": 12, "doctor_id": 3}
+        ],
+        "manifest_path": "2023/manifest.jsonl"
+    }
+    
+    Paths are resolved inside BULK_IMPORT_ROOT. Every row must name the
+    calling doctor and one of their patients. The run continues in the
+    background; poll GET /transcribe/bulk/<run_id> for progress.
+    """
+    data = request.get_json(silent=True) or {}
+
+    if not BULK_IMPORT_ROOT:
+        return jsonify({
+            'error': 'Bulk import is not enabled on this server',
+            'success': False
+        }), 503
+
+    try:
+        rows = data.get('manifest')
+        if rows is None and data.get('manifest_path'):
+            rows = read_manifest(resolve_import_path(data['manifest_path']))
+        if not rows:
+            return jsonify({
+                'error': 'manifest or manifest_path is required',
+                'success': False
+            }), 400
+        items = validate_manifest(rows)
+    except (ManifestError, OSError, ValueError) as manifest_error:
+        return jsonify({
+            'error': f'Invalid manifest: {str(manifest_error)}',
+            'success': False
+        }), 400
+
+    # Notes are written under the rows' doctor and patient, so both must be the caller's
+    doctor_id = request.current_doctor['id']
+    foreign_rows = [number for number, item in enumerate(items, start=1) if item['doctor_id'] != doctor_id]
+    if foreign_rows:
+        return jsonify({
+            'error': f'Unauthorized: manifest rows {foreign_rows[:10]} name another doctor',
+            'success': False
+        }), 403
+
+    patient_ids = sorted({item['patient_id'] for item in items})
+    own_patients = set()
+    try:
+        # In chunks so a large archive does not overflow the request URL
+        for start in range(0, len(patient_ids), 200):
+            result = supabase.table('patient_table') \
+                .select('id') \
+                .eq('primary_physician', doctor_id) \
+                .in_('id', patient_ids[start:start + 200]) \
+                .execute()
+            own_patients.update(row['id'] for row in result.data or [])
+    except Exception as e:
+        return jsonify({
+            'error': f'Error checking manifest patients: {str(e)}',
+            'success': False
+        }), 500
+    foreign_patients = [patient_id for patient_id in patient_ids if patient_id not in own_patients]
+    if foreign_patients:
+        return jsonify({
+            'error': f'Unauthorized: patients {foreign_patients[:10]} are not registered to you',
+            'success': False
+        }), 403
+
+    run = bulk_imports.start(items)
+
+    return jsonify({
+        'success': True,
+        'run_id': run.run_id,
+        'items': len(items),
+        'status_url': f'/transcribe/bulk/{run.run_id}'
+    }), 202
+
+@app.route('/transcribe/bulk/<run_id>', methods=['GET'])
+@token_required
+def get_bulk_import(run_id):
+    """Get progress counts and the first errors of a bulk import run"""
+    run = bulk_imports.get(run_id)
+
+    if not run:
+        return jsonify({
+            'error': 'Bulk import run not found',
+            'success': False
+        }), 404
+
+    return jsonify({
+        'success': True,
+        **run.status()
+    }), 200
+
+@app.route('/transcribe/bulk/<run_id>/resume', methods=['POST'])
+@token_required
+def resume_bulk_import(run_id):
+    """Resume an interrupted or stopped run; finished items are skipped"""
+    run = bulk_imports.resume(run_id)
+
+    if not run:
+        return jsonify({
+            'error': 'Bulk import run not found',
+            'success': False
+        }), 404
+
+    return jsonify({
+        'success': True,
+        **run.status()
+    }), 202
+
+@app.route('/transcribe/bulk/<run_id>/stop', methods=['POST'])
+@token_required
+def stop_bulk_import(run_id):
+    """Stop a run after the recordings in progress; it can be resumed later"""
+    run = bulk_imports.get(run_id)
+
+    if not run:
+        return jsonify({
+            'error': 'Bulk import run not found',
+            'success': False
+        }), 404
+
+    run.stop()
+
+    return jsonify({
+        'success': True,
+        **run.status()
+    }), 200
+
+def dispatch_transcription(payload):
+    """
+    Run a transcription job now, or queue it when mode=queue, and build the response.
+    
+    Args:
+        payload: Job payload for process_transcription_job
+    """
+    # Queue mode: hand the upload to the background workers and return straight away
+    if request.args.get('mode', TRANSCRIBE_MODE) == 'queue':
+        return jsonify(enqueue_transcription(payload)), 202
+
+    try:
+        result = process_transcription_job(payload)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Audio transcribed successfully',
+            **result
+        }), 200
+        
+    except Exception as transcription_error:
+        return jsonify({
+            'error': f'Transcription failed: {str(transcription_error)}',
+            'success': False
+        }), 500
+
+def enqueue_transcription(payload):
+    """
+    Queue a transcription job for the background workers.
+    
+    Returns:
+        dict: Body of the 202 response pointing at the job's status URL
+    """
+    job_id = get_transcription_queue().submit(payload)
+    return {
+        'success': True,
+        'message': 'Audio accepted for transcription',
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/transcribe/jobs/{job_id}'
+    }
+
+@app.route('/transcribe/callback', methods=['POST'])
+def transcription_callback():
+    """
+    Completion callback for the speech-to-text provider (Rev.ai webhook format).
+    Wakes the pipeline waiting on the job instead of waiting for its next poll.
+
+    Expected JSON payload:
+    {
+        "job": {"id": "<provider job id>", "status": "transcribed"}
+    }
+    """
+    # Without a secret anyone could post fake completions, so the route is off
+    if not CALLBACK_SECRET:
+        return jsonify({
+            'error': 'Transcription callbacks are not enabled on this server',
+            'success': False
+        }), 503
+
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {CALLBACK_SECRET}'):
+        return jsonify({
+            'error': 'Invalid callback credentials',
+            'success': False
+        }), 401
+
+    data = request.get_json(silent=True) or {}
+    job = data.get('job') or {}
+    job_id = job.get('id')
+
+    if not job_id:
+        return jsonify({
+            'error': 'Job id is required',
+            'success': False
+        }), 400
+
+    waiting = job_completions.notify(job_id)
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'waiting': waiting
+    }), 200
+
+@app.route('/transcribe/jobs/<job_id>', methods=['GET'])
+def get_transcription_job(job_id):
+    """
+    Get the status of a queued transcription job
+
+    Example request:
+        GET /transcribe/jobs/<job_id>
+    """
+    job = get_transcription_queue().get(job_id)
+
+    if not job:
+        return jsonify({
+            'error': 'Job not found',
+            'success': False
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+        'result_url': f'/transcribe/jobs/{job_id}/result' if job['status'] == DONE else None
+    }), 200
+
+@app.route('/transcribe/jobs/<job_id>/result', methods=['GET'])
+def get_transcription_job_result(job_id):
+    """
+    Get the finished clinical note for a queued transcription job.
+    Returns 202 while the job is still queued or running.
+    """
+    job = get_transcription_queue().get(job_id)
+
+    if not job:
+        return jsonify({
+            'error': 'Job not found',
+            'success': False
+        }), 404
+
+    if job['status'] == FAILED:
+        return jsonify({
+            'error': f'Transcription failed: {job["error"]}',
+            'success': False,
+            'status': job['status']
+        }), 500
+
+    if job['status'] != DONE:
+        return jsonify({
+            'success': True,
+            'message': 'Transcription still in progress',
+            'status': job['status']
+        }), 202
+
+    return jsonify({
+        'success': True,
+        'message': 'Audio transcribed successfully',
+        'status': job['status'],
+        **job['result']
+    }), 200
+
+
+def run_transcription_pipeline(audio_path, patient_id, doctor_id, filename=None):
+    """
+    Transcribe an audio file, store the clinical note and record it in the database.
+    The audio file is removed once processing finishes.
+
+    Args:
+        audio_path: Path to the audio file on disk
+        patient_id: ID of the patient
+        doctor_id: ID of the doctor
+        filename: Name to send to the provider, if audio_path has no usable extension
+
+    Returns:
+        dict: clinical_note, storage_url and database_result
+    """
+    try:
+        # Process the audio file
+        clinical_note = run_sync(transcribe(audio_path, filename=filename))
+    finally:
+        # Clean up temporary file
+        try:
+            os.unlink(audio_path)
+        except OSError:
+            pass
+
+    return save_clinical_note(clinical_note, patient_id, doctor_id)
+
+def save_clinical_note(clinical_note, patient_id, doctor_id):
+    """
+    Store a clinical note (inline or in the Notes bucket) and record it in the database.
+
+    Returns:
+        dict: clinical_note, storage_url and database_result
+    """
+    note_json = clinical_note.model_dump()
+    inline_note, storage_url = store_note_body(clinical_note)
+
+    # Save to database if patient_id and doctor_id are provided
+    db_result = None
+    if patient_id and doctor_id:
+        db_result = upload_note_to_db(
+            storage_url, 
+            int(patient_id), 
+            int(doctor_id),
+            note_json=inline_note
+        )
+
+    return {
+        'clinical_note': note_json,
+        'storage_url': storage_url,
+        'database_result': db_result
+    }
+
+def store_note_body(clinical_note):
+    """
+    Keep a small note inline or upload it to the Notes bucket.
+
+    Returns:
+        tuple: (inline note JSON or None, storage URL or None)
+    """
+    note_json = clinical_note.model_dump()
+
+    if NOTE_STORAGE_MODE == 'inline' and len(json.dumps(note_json).encode('utf-8')) <= NOTE_INLINE_MAX_BYTES:
+        # Small notes are stored in the clinical_notes row itself
+        return note_json, None
+
+    # Upload to storage bucket
+    upload_result = upload_clinical_note_to_storage(clinical_note)
+
+    if not upload_result.get('success'):
+        raise RuntimeError(f'Failed to upload to storage: {upload_result.get("error")}')
+    return None, upload_result['public_url']
+
+def save_clinical_notes(items):
+    """
+    Store many clinical notes and record them with a single database insert.
+    
+    Args:
+        items: list of (clinical_note, patient_id, doctor_id)
+    
+    Returns:
+        list: one dict per item, in order, with success, note_id and storage_url or error
+    """
+    def store(clinical_note):
+        try:
+            return store_note_body(clinical_note)
+        except Exception as e:
+            return e
+
+    bodies = list(note_fetch_executor.map(store, [clinical_note for clinical_note, _, _ in items]))
+    results = [None] * len(items)
+    records = []
+    record_items = []
+
+    for i, ((clinical_note, patient_id, doctor_id), body) in enumerate(zip(items, bodies)):
+        if isinstance(body, Exception):
+            results[i] = {'success': False, 'error': str(body)}
+            continue
+        inline_note, storage_url = body
+        record = {
+            'Note': storage_url,
+            'patient_id': int(patient_id),
+            'doctor_id': int(doctor_id),
+            'created_at': datetime.utcnow().isoformat()
+        }
+        if inline_note is not None:
+            record['note_json'] = inline_note
+        records.append(record)
+        record_items.append((i, storage_url))
+
+    if records:
+        with span('db_insert', 'supabase'):
+            result = supabase.table('clinical_notes').insert(records).execute()
+        for (i, storage_url), row in zip(record_items, result.data or []):
+            results[i] = {'success': True, 'note_id': row['id'], 'storage_url': storage_url}
+
+    return [r or {'success': False, 'error': 'Failed to save clinical note to database'} for r in results]
+
+def process_transcription_job(payload):
+    """
+    Job handler: run the transcription pipeline for an upload.
+    The payload holds either a file_path on disk or the provider_job_id of
+    audio that was already streamed to the provider.
+    """
+    # Provider calls for this upload queue behind older uploads, not newer ones
+    with span('pipeline'), work_started():
+        if payload.get('provider_job_id'):
+            clinical_note = run_sync(transcribe_job(payload['provider_job_id']))
+            return save_clinical_note(clinical_note, payload.get('patient_id'), payload.get('doctor_id'))
+
+        return run_transcription_pipeline(
+            payload['file_path'],
+            payload.get('patient_id'),
+            payload.get('doctor_id'),
+            filename=payload.get('filename')
+        )
+
+_transcription_queue = None
+_transcription_queue_lock = threading.Lock()
+
+def get_transcription_queue():
+    """Return the transcription job queue, starting its worker pool on first use."""
+    global _transcription_queue
+    with _transcription_queue_lock:
+        if _transcription_queue is None:
+            _transcription_queue = create_job_queue()
+            JobWorkerPool(_transcription_queue, process_transcription_job).start()
+        return _transcription_queue
+
+def resume_transcription_jobs():
+    """
+    Start the job queue and its workers at startup when the queue is persisted,
+    so jobs left queued or running by the previous process are picked up
+    without waiting for the next upload.
+    """
+    if QUEUE_BACKEND == 'sqlite':
+        get_transcription_queue()
+
+
+def upload_clinical_note_to_storage(clinical_note):
+    """
+    Upload clinical note JSON to Supabase storage bucket
+    
+    Args:
+        clinical_note: ClinicalNote object from transcription
+        doctor_id: Optional doctor ID (not used in filename)
+    
+    Returns:
+        dict: Upload result with file path and URL
+    """
+    try:
+        # Convert clinical note to JSON
+        json_data = clinical_note.model_dump()
+        json_string = json.dumps(json_data, indent=2)
+        
+        # Generate pure random filename
+        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        random_name = str(uuid.uuid4())[:8]  # Random 8-character string
+        
+        # Simple file path with random name only
+        file_path = f"Notes/{timestamp}_{random_name}.json"
+        
+        print(f"Attempting to upload to path: {file_path}")  # Debug log
+        
+        # Create temporary JSON file
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as temp_json_file:
+            temp_json_file.write(json_string)
+            temp_json_path = temp_json_file.name
+        
+        try:
+            # Upload the temporary file to Supabase storage
+            with span('storage_upload', 'supabase'), open(temp_json_path, 'rb') as f:
+                response = supabase.storage.from_("Notes").upload(
                     file=f,
                     path=file_path,
                     file_options={
@@ -850,26 +2146,32 @@ def upload_clinical_note_to_storage(clinical_note):
             'error': f'Upload error: {str(e)}'
         }
 
-def upload_note_to_db(clinical_note_url, patient_id, doctor_id):
+def upload_note_to_db(clinical_note_url, patient_id, doctor_id, note_json=None):
     """
-    Insert clinical note URL into the database
+    Insert clinical note into the database
     
     Args:
-        clinical_note_url: URL of the uploaded clinical note in storage
+        clinical_note_url: URL of the uploaded clinical note in storage (None for inline notes)
         patient_id: ID of the patient
         doctor_id: ID of the doctor
+        note_json: ClinicalNote payload to store inline in the note_json column (optional)
     
     Returns:
         dict: Database insertion result
     """
     try:
-        # Insert note record into clinical_notes table
-        result = supabase.table('clinical_notes').insert({
+        note_record = {
             'Note': clinical_note_url,
             'patient_id': patient_id,
             'doctor_id': doctor_id,
             'created_at': datetime.utcnow().isoformat()
-        }).execute()
+        }
+        if note_json is not None:
+            note_record['note_json'] = note_json
+
+        # Insert note record into clinical_notes table
+        with span('db_insert', 'supabase'):
+            result = supabase.table('clinical_notes').insert(note_record).execute()
         
         if result.data:
             return {
@@ -893,6 +2195,9 @@ def upload_note_to_db(clinical_note_url, patient_id, doctor_id):
 
 
 if __name__ == '__main__':
+    # The debug reloader runs this file in a watcher and a serving process; only the server takes jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_transcription_jobs()
     app.run(debug=True)
 
 
@@ -0,0 +1,145 @@
+import os
+import asyncio
+import itertools
+import threading
+import anyio
+import httpx
+from fastmcp import Client
+
+# --- Config ---
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "1"))
+MCP_MAX_CONCURRENCY = int(os.getenv("MCP_MAX_CONCURRENCY", "16"))
+MCP_HEALTH_INTERVAL = float(os.getenv("MCP_HEALTH_INTERVAL", "30"))  # seconds
+MCP_PING_TIMEOUT = 5
+MCP_DRAIN_TIMEOUT = 60  # seconds a replaced session waits for its in-flight calls before it is closed
+
+# Failures that mean the session's connection is gone, not that the call itself failed
+CONNECTION_ERRORS = (httpx.NetworkError, httpx.RemoteProtocolError, httpx.ConnectTimeout, ConnectionError,
+                     anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+class MCPSessionPool:
+    """
+    Long-lived MCP sessions shared by every request in the process.
+    The sessions live on a dedicated event loop thread, so callers running on
+    any loop (e.g. a per-request loop in Flask) reuse the same connections.
+    Broken sessions are replaced on the next call or by the health check; a
+    replaced session is closed once the calls still running on it finish.
+    """
+
+    def __init__(self, config, size=MCP_POOL_SIZE, max_concurrency=MCP_MAX_CONCURRENCY,
+                 health_interval=MCP_HEALTH_INTERVAL, message_handler=None):
+        self.config = config
+        self.message_handler = message_handler
+        self.size = size
+        self.max_concurrency = max_concurrency
+        self.health_interval = health_interval
+        self._loop = None
+        self._clients = []
+        self._connect_locks = []
+        self._round_robin = None
+        self._semaphore = None
+        self._in_flight = {}  # client -> calls running on it
+        self._calls_done = None
+        self._start_lock = threading.Lock()
+
+    async def run(self, operation):
+        """
+        Run operation(client) on a pooled session and return its result.
+        Can be awaited from any event loop.
+        """
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(self._run(operation), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._clients = [Client(self.config, message_handler=self.message_handler) for _ in range(self.size)]
+                self._connect_locks = [asyncio.Lock() for _ in range(self.size)]
+                self._round_robin = itertools.cycle(range(self.size))
+                self._calls_done = asyncio.Condition()
+                if self.health_interval:
+                    loop.create_task(self._health_check())
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run_loop, name="mcp-session-pool", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+
+    async def _run(self, operation):
+        async with self._semaphore:
+            index = next(self._round_robin)
+            client = await self._connect(index)
+            try:
+                return await self._call(client, operation)
+            except CONNECTION_ERRORS as e:
+                # The session went stale; retry once on a fresh one
+                print(f"MCP session {index} failed ({e!r}), reconnecting...")
+                client = await self._replace(index, client)
+                return await self._call(client, operation)
+
+    async def _call(self, client, operation):
+        self._in_flight[client] = self._in_flight.get(client, 0) + 1
+        try:
+            return await operation(client)
+        finally:
+            async with self._calls_done:
+                self._in_flight[client] -= 1
+                if not self._in_flight[client]:
+                    del self._in_flight[client]
+                self._calls_done.notify_all()
+
+    async def _connect(self, index):
+        async with self._connect_locks[index]:
+            client = self._clients[index]
+            if not client.is_connected():
+                await client.__aenter__()
+            return client
+
+    async def _replace(self, index, stale):
+        """Swap in a new session for `stale` (unless a caller already did) and return the current one."""
+        async with self._connect_locks[index]:
+            if self._clients[index] is stale:
+                client = Client(self.config, message_handler=self.message_handler)
+                await client.__aenter__()
+                self._clients[index] = client
+                asyncio.get_running_loop().create_task(self._retire(index, stale))
+            return self._clients[index]
+
+    async def _retire(self, index, client):
+        """Close a replaced session once the calls still running on it are done."""
+        try:
+            async with self._calls_done:
+                await asyncio.wait_for(self._calls_done.wait_for(lambda: client not in self._in_flight),
+                                       MCP_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Closing replaced MCP session {index} with calls still running")
+        try:
+            if client.is_connected():
+                await client.__aexit__(None, None, None)
+        except Exception as e:
+            print(f"Error closing MCP session {index}: {e}")
+
+    async def _health_check(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for index, client in enumerate(self._clients):
+                if not client.is_connected():
+                    continue
+                try:
+                    await asyncio.wait_for(client.ping(), timeout=MCP_PING_TIMEOUT)
+                except Exception as e:
+                    print(f"MCP session {index} failed health check ({e}), reconnecting...")
+                    try:
+                        await self._replace(index, client)
+                    except Exception as reconnect_error:
+                        print(f"MCP reconnect failed: {reconnect_error}")
@@ -0,0 +1,191 @@
+import os
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- Config ---
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)  # seconds
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "voice2vital")
+TRACE_MAX_SPANS = 500  # per trace, so a long poll loop cannot grow a response without bound
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """Prometheus-style histogram: cumulative bucket counts, sum and count per label set."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labelvalues, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['buckets']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, [("le", bound)])} {cumulative}')
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, [("le", "+Inf")])} {series["count"]}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, labelvalues)} {series["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics for the /metrics endpoint. Besides histograms it takes collectors:
+    callables returning {name: (type, help, value)} for counters and gauges
+    that other modules already keep (cache hits, outbound retries).
+    """
+
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, name, help_text, labelnames=(), buckets=STAGE_BUCKETS):
+        histogram = Histogram(f'{METRICS_PREFIX}_{name}', help_text, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for collector in self.collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, (metric_type, help_text, value) in samples.items():
+                name = f'{METRICS_PREFIX}_{name}'
+                lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}', f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.histogram(
+    'pipeline_stage_seconds',
+    'Time spent in each stage of the transcription pipeline',
+    labelnames=('stage', 'provider', 'outcome')
+)
+
+
+class Trace:
+    """Spans recorded while handling one request that asked for a trace."""
+
+    def __init__(self, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage, provider, started, duration, outcome):
+        with self._lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append({
+                'stage': stage,
+                'provider': provider or None,
+                'start_ms': round((started - self.started) * 1000, 1),
+                'duration_ms': round(duration * 1000, 1),
+                'outcome': outcome
+            })
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['start_ms'])
+            return {
+                'id': self.id,
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+                'spans': spans,
+                'dropped_spans': self.dropped
+            }
+
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+def start_trace(trace_id=None):
+    """Start collecting spans for the current request. Returns (trace, token for end_trace)."""
+    trace = Trace(trace_id)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+class _Span:
+    def __init__(self):
+        self.outcome = 'ok'
+
+
+@contextmanager
+def span(stage, provider=''):
+    """
+    Time a pipeline stage into the stage histogram, and into the request's
+    trace if one was started. Exceptions mark the span as an error; code that
+    reports failure by return value can set `s.outcome = 'error'` itself:
+
+        with span('storage_upload', 'supabase') as s:
+            ...
+    """
+    current = _Span()
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.outcome = 'error'
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        stage_seconds.observe(duration, stage, provider or '', current.outcome)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, provider, started, duration, current.outcome)
+
+
+def record(stage, seconds, provider='', outcome='ok'):
+    """Record a stage that was timed elsewhere, e.g. the sleeps summed over a poll loop."""
+    stage_seconds.observe(seconds, stage, provider or '', outcome)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, provider, time.perf_counter() - seconds, seconds, outcome)
@@ -0,0 +1,6 @@
+-- Store clinical notes inline as JSONB (NOTE_STORAGE_MODE=inline).
+-- Notes larger than NOTE_INLINE_MAX_BYTES keep using the Notes bucket, in which
+-- case "Note" holds the public URL and note_json stays NULL.
+
+ALTER TABLE clinical_notes ADD COLUMN IF NOT EXISTS note_json JSONB;
+ALTER TABLE clinical_notes ALTER COLUMN "Note" DROP NOT NULL;
@@ -0,0 +1,4 @@
+-- Bulk patient registration (/patients/bulk) upserts on id_number, which needs
+-- a unique constraint. Resolve any duplicate id_number rows before applying.
+
+ALTER TABLE patient_table ADD CONSTRAINT patient_table_id_number_key UNIQUE (id_number);
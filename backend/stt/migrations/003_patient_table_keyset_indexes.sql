@@ -0,0 +1,7 @@
+-- Keyset pagination on GET /doctor/<id>/patients filters on primary_physician
+-- and orders by (sort column, id), so each sortable column gets a composite index.
+
+CREATE INDEX IF NOT EXISTS patient_table_physician_id_idx ON patient_table (primary_physician, id);
+CREATE INDEX IF NOT EXISTS patient_table_physician_last_name_idx ON patient_table (primary_physician, last_name, id);
+CREATE INDEX IF NOT EXISTS patient_table_physician_first_name_idx ON patient_table (primary_physician, first_name, id);
+CREATE INDEX IF NOT EXISTS patient_table_physician_created_at_idx ON patient_table (primary_physician, created_at, id);
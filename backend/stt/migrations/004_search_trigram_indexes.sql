@@ -0,0 +1,81 @@
+-- Trigram indexes for the MCP search tools (search_patients, search_doctors,
+-- search_database). pg_trgm GIN indexes serve ILIKE '%term%' directly, so the
+-- existing queries stop scanning the whole table without any code change.
+-- clinical_notes is not indexed: the app never writes a patient_name column,
+-- so there is nothing there for search_database to match.
+-- The *_fuzzy functions back the fuzzy_search tool: ranked, typo-tolerant
+-- name matching ("Emely" finds "Emily").
+--
+-- On Supabase, pg_trgm lives in the extensions schema; run this with
+-- search_path including it (the functions keep the search_path they were created with).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS patient_table_first_name_trgm_idx ON patient_table USING gin (first_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patient_table_last_name_trgm_idx ON patient_table USING gin (last_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patient_table_id_number_trgm_idx ON patient_table USING gin (id_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patient_table_allergies_trgm_idx ON patient_table USING gin (allergies gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patient_table_med_conditions_trgm_idx ON patient_table USING gin (med_conditions gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patient_table_full_name_trgm_idx
+    ON patient_table USING gin ((coalesce(first_name, '') || ' ' || coalesce(last_name, '')) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS doctor_table_first_name_trgm_idx ON doctor_table USING gin (first_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS doctor_table_last_name_trgm_idx ON doctor_table USING gin (last_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS doctor_table_specialty_trgm_idx ON doctor_table USING gin (specialty gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS doctor_table_hospital_trgm_idx ON doctor_table USING gin (hospital gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS doctor_table_full_name_trgm_idx
+    ON doctor_table USING gin ((coalesce(first_name, '') || ' ' || coalesce(last_name, '')) gin_trgm_ops);
+
+-- Patients whose name resembles search_term (or whose id_number starts with it),
+-- best match first. score is pg_trgm word_similarity between 0 and 1.
+-- search_term is matched literally: % and _ in it are not LIKE wildcards.
+CREATE OR REPLACE FUNCTION search_patients_fuzzy(
+    search_term text,
+    max_results integer DEFAULT 5,
+    min_score real DEFAULT 0.3,
+    physician_id bigint DEFAULT NULL
+)
+RETURNS TABLE (patient jsonb, score real)
+LANGUAGE plpgsql
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    id_prefix text := replace(replace(replace(search_term, '\', '\\'), '%', '\%'), '_', '\_') || '%';
+BEGIN
+    PERFORM set_config('pg_trgm.word_similarity_threshold', min_score::text, true);
+    RETURN QUERY
+    SELECT to_jsonb(p) - 'password',
+           greatest(
+               word_similarity(search_term, coalesce(p.first_name, '') || ' ' || coalesce(p.last_name, '')),
+               CASE WHEN p.id_number LIKE id_prefix THEN 1 ELSE 0 END
+           )::real
+    FROM patient_table p
+    WHERE (search_term <% (coalesce(p.first_name, '') || ' ' || coalesce(p.last_name, ''))
+           OR p.id_number LIKE id_prefix)
+      AND (physician_id IS NULL OR p.primary_physician = physician_id)
+    ORDER BY 2 DESC, p.id
+    LIMIT max_results;
+END;
+$$;
+
+-- Doctors whose name resembles search_term, best match first.
+CREATE OR REPLACE FUNCTION search_doctors_fuzzy(
+    search_term text,
+    max_results integer DEFAULT 5,
+    min_score real DEFAULT 0.3
+)
+RETURNS TABLE (doctor jsonb, score real)
+LANGUAGE plpgsql
+SET search_path FROM CURRENT
+AS $$
+BEGIN
+    PERFORM set_config('pg_trgm.word_similarity_threshold', min_score::text, true);
+    RETURN QUERY
+    SELECT to_jsonb(d) - 'password',
+           word_similarity(search_term, coalesce(d.first_name, '') || ' ' || coalesce(d.last_name, ''))::real
+    FROM doctor_table d
+    WHERE search_term <% (coalesce(d.first_name, '') || ' ' || coalesce(d.last_name, ''))
+    ORDER BY 2 DESC, d.id
+    LIMIT max_results;
+END;
+$$;
@@ -0,0 +1,6 @@
+-- GET /doctor/<id>/patients also accepts sort=dob and sort=id_number; without
+-- these, those keyset pages fall back to a sequential scan plus sort.
+-- Completes 003_patient_table_keyset_indexes.sql.
+
+CREATE INDEX IF NOT EXISTS patient_table_physician_dob_idx ON patient_table (primary_physician, dob, id);
+CREATE INDEX IF NOT EXISTS patient_table_physician_id_number_idx ON patient_table (primary_physician, id_number, id);
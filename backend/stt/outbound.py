@@ -0,0 +1,352 @@
+import os
+import time
+import random
+import logging
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import MaxRetryError, ResponseError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+OUTBOUND_HTTP2 = os.getenv("OUTBOUND_HTTP2", "true").lower() == "true"
+OUTBOUND_MAX_CONNECTIONS = int(os.getenv("OUTBOUND_MAX_CONNECTIONS", "100"))
+OUTBOUND_MAX_PER_HOST = int(os.getenv("OUTBOUND_MAX_PER_HOST", "20"))  # concurrent requests per host
+OUTBOUND_KEEPALIVE_EXPIRY = float(os.getenv("OUTBOUND_KEEPALIVE_EXPIRY", "30"))  # seconds an idle connection is kept
+OUTBOUND_CONNECT_TIMEOUT = float(os.getenv("OUTBOUND_CONNECT_TIMEOUT", "3.05"))
+OUTBOUND_READ_TIMEOUT = float(os.getenv("OUTBOUND_READ_TIMEOUT", "60"))
+OUTBOUND_POOL_TIMEOUT = float(os.getenv("OUTBOUND_POOL_TIMEOUT", "10"))  # waiting for a free per-host slot
+OUTBOUND_RETRIES = int(os.getenv("OUTBOUND_RETRIES", "3"))
+OUTBOUND_BACKOFF = float(os.getenv("OUTBOUND_BACKOFF", "0.2"))  # seconds, doubled per attempt
+OUTBOUND_MAX_BACKOFF = float(os.getenv("OUTBOUND_MAX_BACKOFF", "5"))
+OUTBOUND_RETRY_RATIO = float(os.getenv("OUTBOUND_RETRY_RATIO", "0.1"))  # retries allowed per request sent
+OUTBOUND_RETRY_MIN_PER_SECOND = float(os.getenv("OUTBOUND_RETRY_MIN_PER_SECOND", "1"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "180"))  # seconds; long extractions take a while
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None  # override to point at a local stub of the Gemini API
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# The server refused these without doing the work, so even a POST can be resent
+REFUSED_STATUSES = frozenset({429, 503})
+
+
+class RetryBudget:
+    """
+    Caps retries at `ratio` of the requests sent, plus `min_per_second` so a
+    quiet service can still retry. When a host is down, callers fail fast
+    instead of multiplying the load with retries.
+    """
+
+    def __init__(self, ratio=OUTBOUND_RETRY_RATIO, min_per_second=OUTBOUND_RETRY_MIN_PER_SECOND):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(1.0, 10 * min_per_second)
+        self._balance = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self.capacity, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """Record a request; each one earns `ratio` of a retry."""
+        with self._lock:
+            self._refill()
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def withdraw(self):
+        """Take one retry from the budget. Returns False when it is spent."""
+        with self._lock:
+            self._refill()
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class HostLimits:
+    """Per-host concurrency slots and retry budgets, shared by every client in the process."""
+
+    def __init__(self, max_per_host=OUTBOUND_MAX_PER_HOST):
+        self.max_per_host = max_per_host
+        self.requests = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+        self._slots = {}
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def slot(self, host):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._slots[host]
+
+    def budget(self, host):
+        with self._lock:
+            if host not in self._budgets:
+                self._budgets[host] = RetryBudget()
+            return self._budgets[host]
+
+    def count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'retry_budget_exhausted': self.budget_exhausted,
+                'hosts': len(self._slots)
+            }
+
+
+host_limits = HostLimits()
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one."""
+    if retry_after:
+        try:
+            return min(float(retry_after), OUTBOUND_MAX_BACKOFF)
+        except ValueError:
+            pass
+    return random.uniform(0, min(OUTBOUND_MAX_BACKOFF, OUTBOUND_BACKOFF * 2 ** attempt))
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that gives the host slot back once it has been read or closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class PooledTransport(httpx.BaseTransport):
+    """
+    httpx transport that caps concurrent requests per host and retries
+    transient failures with jittered backoff, within the host's retry budget.
+
+    Connection failures are always retried (nothing reached the server);
+    timeouts and 502/504 only for idempotent methods; 429/503 for any method
+    whose body can be sent again. With retry_statuses=False, error responses
+    are returned as they are, for calls that a ratelimit.AdaptiveLimit backs
+    off on instead.
+    """
+
+    def __init__(self, transport, limits=host_limits, retries=OUTBOUND_RETRIES, pool_timeout=OUTBOUND_POOL_TIMEOUT,
+                 retry_statuses=True):
+        self.transport = transport
+        self.limits = limits
+        self.retries = retries
+        self.pool_timeout = pool_timeout
+        self.retry_statuses = retry_statuses
+
+    def _may_retry(self, request, attempt, budget):
+        if attempt >= self.retries or not isinstance(request.stream, httpx.ByteStream):
+            return False
+        if not budget.withdraw():
+            self.limits.count('budget_exhausted')
+            return False
+        self.limits.count('retries')
+        return True
+
+    def handle_request(self, request):
+        host = request.url.host
+        slot = self.limits.slot(host)
+        budget = self.limits.budget(host)
+        idempotent = request.method in IDEMPOTENT_METHODS
+        self.limits.count('requests')
+        budget.deposit()
+
+        attempt = 0
+        while True:
+            if not slot.acquire(timeout=self.pool_timeout):
+                raise httpx.PoolTimeout(f"No free connection slot for {host}", request=request)
+
+            released = threading.Event()
+
+            def release():
+                if not released.is_set():
+                    released.set()
+                    slot.release()
+
+            try:
+                response = self.transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                release()
+                if not self._may_retry(request, attempt, budget):
+                    raise
+                error = e
+                retry_after = None
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+                release()
+                if not idempotent or not self._may_retry(request, attempt, budget):
+                    raise
+                error = e
+                retry_after = None
+            except BaseException:
+                release()
+                raise
+            else:
+                retryable = self.retry_statuses and \
+                    response.status_code in (RETRY_STATUSES if idempotent else REFUSED_STATUSES)
+                if not retryable or not self._may_retry(request, attempt, budget):
+                    return httpx.Response(
+                        status_code=response.status_code,
+                        headers=response.headers,
+                        stream=_ReleasingStream(response.stream, release),
+                        extensions=response.extensions,
+                    )
+                retry_after = response.headers.get('Retry-After')
+                error = f"HTTP {response.status_code}"
+                response.close()
+                release()
+
+            delay = backoff_delay(attempt, retry_after)
+            # Counted in outbound_retries_total; per-retry detail only at debug level
+            logger.debug("Retrying %s %s in %.2fs after %s", request.method, host, delay, error)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+
+def _http2_available():
+    if not OUTBOUND_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("HTTP/2 needs the h2 package (pip install 'httpx[http2]'); using HTTP/1.1")
+        return False
+
+
+_http_transport = None
+_http_clients = {}
+_requests_sessions = {}
+_client_lock = threading.Lock()
+
+
+def default_timeout():
+    return httpx.Timeout(OUTBOUND_READ_TIMEOUT, connect=OUTBOUND_CONNECT_TIMEOUT, pool=OUTBOUND_POOL_TIMEOUT)
+
+
+def get_http_client(retry_statuses=True):
+    """
+    The process-wide httpx client for outbound calls (Supabase, storage, note
+    URLs, Gemini). Thread-safe; connections are kept alive and reused.
+    
+    Args:
+        retry_statuses: False for calls governed by a ratelimit.AdaptiveLimit,
+            so 429/5xx responses reach the limiter instead of being retried
+            here first. Both clients share the same connections.
+    """
+    global _http_transport
+    with _client_lock:
+        if _http_transport is None:
+            _http_transport = httpx.HTTPTransport(
+                http2=_http2_available(),
+                limits=httpx.Limits(
+                    max_connections=OUTBOUND_MAX_CONNECTIONS,
+                    max_keepalive_connections=OUTBOUND_MAX_CONNECTIONS,
+                    keepalive_expiry=OUTBOUND_KEEPALIVE_EXPIRY
+                )
+            )
+        if retry_statuses not in _http_clients:
+            _http_clients[retry_statuses] = httpx.Client(
+                transport=PooledTransport(_http_transport, retry_statuses=retry_statuses),
+                timeout=default_timeout(),
+                follow_redirects=True
+            )
+        return _http_clients[retry_statuses]
+
+
+class BudgetedRetry(Retry):
+    """urllib3 Retry that also draws from the host's retry budget."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        host = _pool.host if _pool is not None else None
+        if not host_limits.budget(host).withdraw():
+            host_limits.count('budget_exhausted')
+            raise MaxRetryError(_pool, url, error or ResponseError("retry budget exhausted"))
+        host_limits.count('retries')
+        return new_retry
+
+
+class PooledSession(requests.Session):
+    """requests.Session with the service's default timeouts."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (OUTBOUND_CONNECT_TIMEOUT, OUTBOUND_READ_TIMEOUT))
+        host_limits.count('requests')
+        host_limits.budget(requests.utils.urlparse(url).hostname).deposit()
+        return super().request(method, url, **kwargs)
+
+
+def get_requests_session(retry_statuses=True):
+    """
+    The process-wide requests session, for SDKs built on requests (Rev.ai).
+    Same policy as get_http_client: each host gets at most
+    OUTBOUND_MAX_PER_HOST connections (callers wait for a free one), and
+    retries come out of the same per-host budgets.
+    
+    Args:
+        retry_statuses: False for calls governed by a ratelimit.AdaptiveLimit
+            (see get_http_client)
+    """
+    with _client_lock:
+        if retry_statuses not in _requests_sessions:
+            retry = BudgetedRetry(
+                total=OUTBOUND_RETRIES,
+                backoff_factor=OUTBOUND_BACKOFF,
+                backoff_max=OUTBOUND_MAX_BACKOFF,
+                backoff_jitter=OUTBOUND_BACKOFF,
+                status_forcelist=RETRY_STATUSES if retry_statuses else (),
+                allowed_methods=IDEMPOTENT_METHODS,
+                respect_retry_after_header=retry_statuses,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=OUTBOUND_MAX_PER_HOST,
+                                  pool_block=True, max_retries=retry)
+            session = PooledSession()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _requests_sessions[retry_statuses] = session
+        return _requests_sessions[retry_statuses]
+
+
+def genai_http_options():
+    """
+    google-genai options that send sync calls over the shared client. Every
+    Gemini call runs under gemini_limit, so status retries are left to it.
+    """
+    from google.genai import types
+    return types.HttpOptions(httpx_client=get_http_client(retry_statuses=False), timeout=int(GEMINI_TIMEOUT * 1000), base_url=GEMINI_BASE_URL)
+
+
+def supabase_options():
+    """Supabase client options that send PostgREST, storage and auth calls over the shared client."""
+    from supabase import ClientOptions
+    return ClientOptions(httpx_client=get_http_client())
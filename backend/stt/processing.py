@@ -1,9 +1,10 @@
 import os
+import hashlib
 from utils import *
 from typing import Optional, List
 from dotenv import load_dotenv
-from google import genai
 from pydantic import BaseModel
+from extractors import get_extractor
 
 # --- Pydantic Models (Schema) ---
 
@@ -53,15 +54,28 @@ class ClinicalNote(BaseModel):
     medical_decision_making: Optional[str] = None
 
 
-# --- Load Environment & Init Client ---
+# --- Load Environment ---
 load_dotenv()
-client = genai.Client()  # reads GEMINI_API_KEY from .env
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "single")  # single|chunked
+EXTRACTION_CHUNK_CHARS = int(os.getenv("EXTRACTION_CHUNK_CHARS", "12000"))  # transcript characters per window
+EXTRACTION_CHUNK_OVERLAP_LINES = int(os.getenv("EXTRACTION_CHUNK_OVERLAP_LINES", "2"))
+EXTRACTION_RECONCILE = os.getenv("EXTRACTION_RECONCILE", "false").lower() == "true"
+NOT_STATED = "Not stated"
+# Free-text fields where each window may describe a different part of the visit
+NARRATIVE_FIELDS = {
+    "history_of_present_illness", "assessment", "medical_decision_making",
+    "examination_findings", "social_history", "personal_note"
+}
 
 
 # --- Core Functions ---
 
-def build_prompt(transcript: str) -> str:
-    """Build the Gemini extraction prompt."""
+def build_prompt(transcript: str, part_note: str = "") -> str:
+    """
+    Build the clinical note extraction prompt.
+    part_note goes after the fixed instructions, just before the transcript,
+    so every prompt starts with the same text and a local model can reuse its KV cache for it.
+    """
     return f"""
 You are a medical scribe. Extract structured data from the transcript and return valid JSON strictly following the ClinicalNote schema.  
 
@@ -135,23 +149,169 @@ Schema:
 - icd10_codes: list[str]
 - plan: list[str]
 - mdm: str
-
+{part_note}
 Transcript:
 {transcript}
 """
 
+def build_window_prompt(window: str, index: int, total: Optional[int] = None) -> str:
+    """
+    Build the extraction prompt for one window of a long transcript.
+    Leave total unset while the consultation is still being recorded.
+    """
+    part = f"part {index + 1} of {total}" if total else f"part {index + 1}"
+    return build_prompt(window, part_note=f"""
+This transcript is {part} of a longer consultation.
+Only extract what is said in this part. Use "Not stated" and [] for anything it does not cover;
+the other parts are extracted separately and merged afterwards.
+""")
+
+def build_reconcile_prompt(note_json: str) -> str:
+    """Build the prompt that tidies a note merged from several windows."""
+    return f"""
+You are a medical scribe. The clinical note below was merged from notes extracted from consecutive
+parts of one consultation. Return the same note as valid JSON following the ClinicalNote schema, with:
+1. Duplicate or overlapping list items combined into one item.
+2. Free-text fields rewritten as one coherent text, keeping every clinical detail.
+3. No information added that is not already in the note.
+
+Note:
+{note_json}
+"""
+
+def prompt_version() -> str:
+    """Fingerprint of the extraction prompt, model and mode; changes whenever any of them does."""
+    fingerprint = get_extractor().cache_key + build_prompt("")
+    if EXTRACTION_MODE == "chunked":
+        fingerprint += f"{build_window_prompt('', 0, 1)}{EXTRACTION_CHUNK_CHARS}:{EXTRACTION_CHUNK_OVERLAP_LINES}"
+        if EXTRACTION_RECONCILE:
+            fingerprint += build_reconcile_prompt("")
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+def split_transcript(transcript: str, max_chars: int = EXTRACTION_CHUNK_CHARS,
+                     overlap_lines: int = EXTRACTION_CHUNK_OVERLAP_LINES) -> List[str]:
+    """
+    Split a transcript into windows of at most max_chars on line boundaries.
+    Each window repeats the last overlap_lines lines of the previous one for context.
+    """
+    lines = transcript.split("\n")
+    windows = []
+    start = 0
+    while start < len(lines):
+        end = start
+        size = 0
+        while end < len(lines) and (end == start or size + len(lines[end]) + 1 <= max_chars):
+            size += len(lines[end]) + 1
+            end += 1
+        windows.append("\n".join(lines[start:end]))
+        if end >= len(lines):
+            break
+        start = max(end - overlap_lines, start + 1)
+    return windows
+
+def _is_stated(value) -> bool:
+    return value not in (None, "", []) and not (isinstance(value, str) and value.strip().lower() == NOT_STATED.lower())
+
+def _merge_values(values: list, field: str = None):
+    """Merge one field across window notes, in transcript order."""
+    stated = [v for v in values if _is_stated(v)]
+    if not stated:
+        return values[0] if values else None
+    if isinstance(stated[0], dict):
+        keys = list(dict.fromkeys(k for v in stated for k in v))
+        return {k: _merge_values([v.get(k) for v in stated], k) for k in keys}
+    if isinstance(stated[0], list):
+        # Union, dropping repeats that differ only in case or spacing
+        merged, seen = [], set()
+        for item in (i for v in stated for i in v):
+            key = " ".join(str(item).lower().split())
+            if _is_stated(item) and key not in seen:
+                seen.add(key)
+                merged.append(item)
+        return merged
+    if field in NARRATIVE_FIELDS:
+        return " ".join(dict.fromkeys(v.strip() for v in stated))
+    return stated[0]
+
+def merge_notes(notes: List[Optional[ClinicalNote]]) -> ClinicalNote:
+    """
+    Merge notes extracted from consecutive windows with deterministic rules:
+    lists are unioned, narrative fields are joined, and other fields take the
+    first value that is not "Not stated". Windows whose extraction failed
+    (None) are skipped; if every window failed, raises ValueError.
+    """
+    extracted = [n for n in notes if n is not None]
+    if not extracted:
+        raise ValueError(f"Clinical note extraction failed for all {len(notes)} transcript windows")
+    if len(extracted) < len(notes):
+        print(f"Merging {len(extracted)} of {len(notes)} transcript windows; the rest could not be extracted")
+    return ClinicalNote.model_validate(_merge_values([n.model_dump() for n in extracted]))
+
+def generate_note(prompt: str) -> ClinicalNote:
+    """Run one extraction prompt on the configured extractor and return the parsed note."""
+    return get_extractor().generate(prompt, ClinicalNote)
+
+def generate_notes(prompts: List[str]) -> List[ClinicalNote]:
+    """Run several extraction prompts as one batch, keeping their order."""
+    return get_extractor().generate_batch(prompts, ClinicalNote)
+
+def generate_window_notes(prompts: List[str]) -> List[Optional[ClinicalNote]]:
+    """
+    generate_notes for the windows of one transcript. A window that fails or
+    comes back without a note is retried once on its own, then left as None.
+    """
+    try:
+        notes = generate_notes(prompts)
+    except Exception as e:
+        print(f"Window batch failed ({e}), extracting the windows one by one")
+        notes = [None] * len(prompts)
+
+    for i, note in enumerate(notes):
+        if note is None:
+            try:
+                notes[i] = generate_note(prompts[i])
+            except Exception as e:
+                print(f"Transcript window {i + 1} of {len(prompts)} failed: {e}")
+    return notes
+
+def extract_clinical_note_chunked(transcript: str, reconcile: bool = EXTRACTION_RECONCILE) -> ClinicalNote:
+    """
+    Extract a partial note from each transcript window in parallel and merge them.
+    Optionally runs one more call over the merged note to tidy it.
+    """
+    windows = split_transcript(transcript)
+    print(f"Extracting clinical note from {len(windows)} transcript windows...")
+    notes = generate_window_notes([build_window_prompt(window, i, len(windows)) for i, window in enumerate(windows)])
+
+    note = merge_notes(notes)
+    if reconcile:
+        # The merged note is already complete; keep it if the tidy-up pass comes back empty
+        note = generate_note(build_reconcile_prompt(note.model_dump_json(indent=2))) or note
+    return note
+
 def extract_clinical_note(transcript: str) -> ClinicalNote:
-    """Send transcript to Gemini and return structured ClinicalNote."""
-    prompt = build_prompt(transcript)
-    resp = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": ClinicalNote,
-        },
-    )
-    return resp.parsed  # returns ClinicalNote object
+    """Send transcript to the extractor and return structured ClinicalNote."""
+    if EXTRACTION_MODE == "chunked" and len(transcript) > EXTRACTION_CHUNK_CHARS:
+        return extract_clinical_note_chunked(transcript)
+
+    return generate_note(build_prompt(transcript))
+
+def extract_clinical_notes(transcripts: List[str]) -> List[ClinicalNote]:
+    """
+    Extract notes for many transcripts in one batch, e.g. a backlog of recordings.
+    Long transcripts still go through chunked extraction when it is enabled.
+    """
+    notes = [None] * len(transcripts)
+    short = []
+    for i, transcript in enumerate(transcripts):
+        if EXTRACTION_MODE == "chunked" and len(transcript) > EXTRACTION_CHUNK_CHARS:
+            notes[i] = extract_clinical_note_chunked(transcript)
+        else:
+            short.append(i)
+
+    for i, note in zip(short, generate_notes([build_prompt(transcripts[i]) for i in short])):
+        notes[i] = note
+    return notes
 
 
 def print_note(note: ClinicalNote):
@@ -0,0 +1,508 @@
+import os
+import json
+import time
+import bisect
+import random
+import sqlite3
+import asyncio
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+from metrics import record
+
+load_dotenv()
+
+# --- Config ---
+PROVIDER_LIMIT_BACKEND = os.getenv("PROVIDER_LIMIT_BACKEND", "memory")  # memory | sqlite (shared by every worker on the host)
+PROVIDER_LIMIT_DB = os.getenv("PROVIDER_LIMIT_DB", os.path.join(tempfile.gettempdir(), "voice2vital_limits.db"))
+REV_AI_RATE = float(os.getenv("REV_AI_RATE", "0"))  # requests per second, 0 = unlimited
+REV_AI_MAX_CONCURRENCY = int(os.getenv("REV_AI_MAX_CONCURRENCY", "32"))
+GEMINI_RATE = float(os.getenv("GEMINI_RATE", "0"))  # requests per second, 0 = unlimited
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+PROVIDER_OVERLOAD_RETRIES = int(os.getenv("PROVIDER_OVERLOAD_RETRIES", "2"))  # after a 429/5xx the transport gave up on
+PROVIDER_OVERLOAD_BACKOFF = float(os.getenv("PROVIDER_OVERLOAD_BACKOFF", "1"))  # seconds, doubled per retry
+PROVIDER_QUEUE_TIMEOUT = float(os.getenv("PROVIDER_QUEUE_TIMEOUT", "300"))  # seconds a call may wait for a slot
+PROVIDER_LEASE_TTL = 900  # seconds before a slot held by a vanished caller is reclaimed
+PROVIDER_MAX_BACKOFF = 30
+AIMD_DECREASE = 0.5  # concurrency multiplier on overload
+SHARED_POLL_INTERVAL = 0.05  # seconds; how often a process's first waiter rechecks a shared store for slots freed elsewhere
+MAX_POLL_INTERVAL = 1.0  # longest a first waiter sleeps without rechecking the store
+WAITER_TTL = 10  # seconds a waiter that stopped polling keeps its place
+
+# The provider turned these away without doing the work, so even a job submission can be resent
+REFUSED_STATUSES = (429, 503)
+
+
+_work_started = contextvars.ContextVar('work_started', default=None)
+
+
+@contextmanager
+def work_started(started=None):
+    """
+    Mark the start of a unit of work, such as one upload going through the
+    pipeline. Provider calls made inside wait in line by this time, so work
+    that is already underway is served before new work. Nested blocks keep
+    the outermost start.
+    """
+    if _work_started.get() is not None:
+        yield
+        return
+    token = _work_started.set(started or time.time())
+    try:
+        yield
+    finally:
+        _work_started.reset(token)
+
+
+def provider_status(error):
+    """HTTP status and Retry-After seconds carried by a provider SDK error, or (None, None)."""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None and isinstance(getattr(error, 'code', None), int):
+        status = error.code
+    retry_after = None
+    headers = getattr(response, 'headers', None)
+    if headers is not None and headers.get('Retry-After'):
+        try:
+            retry_after = float(headers.get('Retry-After'))
+        except ValueError:
+            pass
+    return status, retry_after
+
+
+def is_overload(status):
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WaitQueue:
+    """
+    Callers in this process waiting on one limit, oldest first. Only the first
+    asks the store for a slot; the rest sleep until they move up, and releases
+    in this process wake the first straight away.
+    """
+
+    def __init__(self):
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    def join(self, waiter):
+        with self._lock:
+            bisect.insort(self._waiters, ((waiter.since, waiter.id), waiter))
+
+    def is_first(self, waiter):
+        with self._lock:
+            return bool(self._waiters) and self._waiters[0][1] is waiter
+
+    def leave(self, waiter):
+        with self._lock:
+            self._waiters = [entry for entry in self._waiters if entry[1] is not waiter]
+        self.wake_first()
+
+    def wake_first(self):
+        with self._lock:
+            first = self._waiters[0][1] if self._waiters else None
+        if first is not None:
+            first.wake()
+
+
+class Waiter:
+    """One caller in a WaitQueue, woken through a threading.Event or, for coroutines, an asyncio.Event."""
+
+    def __init__(self, since, loop=None):
+        self.id = os.urandom(8).hex()
+        self.since = since
+        self.loop = loop
+        self.event = asyncio.Event() if loop else threading.Event()
+        self.queued_at = time.monotonic()
+        self.in_store = False  # has a place in line in the store
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class LimitStore:
+    """Base for limiter state stores; also keeps this process's WaitQueue per limit."""
+
+    shared = False  # other processes change the state too
+    poll_interval = MAX_POLL_INTERVAL
+
+    def __init__(self):
+        self._queues = {}
+        self._queues_lock = threading.Lock()
+
+    def queue(self, name):
+        with self._queues_lock:
+            if name not in self._queues:
+                self._queues[name] = WaitQueue()
+            return self._queues[name]
+
+
+class MemoryLimitStore(LimitStore):
+    """Limiter state for this process only."""
+
+    def __init__(self):
+        super().__init__()
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, name, initial, change):
+        """Apply change(state) atomically and return its result."""
+        with self._lock:
+            if name not in self._states:
+                self._states[name] = initial()
+            return change(self._states[name])
+
+
+class SQLiteLimitStore(LimitStore):
+    """
+    Limiter state in a SQLite file, so every worker process on the host shares
+    the same limits. Waiting is still done in-process: only the first waiter of
+    each process polls the file, every SHARED_POLL_INTERVAL.
+    """
+
+    shared = True
+    poll_interval = SHARED_POLL_INTERVAL
+
+    def __init__(self, db_path=PROVIDER_LIMIT_DB):
+        super().__init__()
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS provider_limits (name TEXT PRIMARY KEY, state TEXT NOT NULL)")
+
+    def update(self, name, initial, change):
+        """Apply change(state) in a write transaction and return its result."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT state FROM provider_limits WHERE name = ?", (name,)).fetchone()
+                state = json.loads(row[0]) if row else initial()
+                result = change(state)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO provider_limits (name, state) VALUES (?, ?)",
+                    (name, json.dumps(state))
+                )
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+_limit_store = None
+_limit_store_lock = threading.Lock()
+
+
+def get_limit_store():
+    """The limiter state store selected by PROVIDER_LIMIT_BACKEND."""
+    global _limit_store
+    with _limit_store_lock:
+        if _limit_store is None:
+            _limit_store = SQLiteLimitStore() if PROVIDER_LIMIT_BACKEND == 'sqlite' else MemoryLimitStore()
+        return _limit_store
+
+
+class AdaptiveLimit:
+    """
+    Governs calls to one provider:
+
+    - a token bucket keeps the request rate at or below `rate` per second
+    - the number of calls in flight adapts (AIMD): it grows by about one per
+      `limit` successful calls and is cut by AIMD_DECREASE when the provider
+      answers 429 or 5xx, so throughput settles at what the provider accepts
+    - waiting calls are served oldest first, by the age of the work they
+      belong to (see work_started). Within a process they wait on a
+      WaitQueue; the store only holds each process's first waiter
+
+    Calls that fail with an overload status are retried after a backoff.
+    """
+
+    def __init__(self, name, rate=0, max_concurrency=32, burst=None, min_concurrency=1,
+                 retries=PROVIDER_OVERLOAD_RETRIES, backoff=PROVIDER_OVERLOAD_BACKOFF,
+                 queue_timeout=PROVIDER_QUEUE_TIMEOUT, store=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_limit_store()
+        return self._store
+
+    @property
+    def queue(self):
+        return self.store.queue(self.name)
+
+    def _initial(self):
+        return {
+            'tokens': self.burst,
+            'updated': time.time(),
+            'limit': float(self.max_concurrency),
+            'decreased_at': 0.0,
+            'paused_until': 0.0,
+            'throttled': 0,
+            'leases': {},
+            'waiters': {}
+        }
+
+    def _tidy(self, state, now):
+        """Refill the bucket and drop leases and places in line of callers that went away."""
+        if self.rate:
+            state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+        state['updated'] = now
+        # Limits may have been lowered since the state was written
+        state['limit'] = max(self.min_concurrency, min(state['limit'], self.max_concurrency))
+
+        alive = {}
+        for key, expires_at in (('leases', PROVIDER_LEASE_TTL), ('waiters', WAITER_TTL)):
+            for entry_id, entry in list(state[key].items()):
+                pid, seen = entry[0], entry[-1]
+                if pid not in alive:
+                    alive[pid] = pid == os.getpid() or _pid_alive(pid)
+                if not alive[pid] or now - seen > expires_at:
+                    del state[key][entry_id]
+
+    def _try_acquire(self, waiter_id, since):
+        """
+        Take a slot if one is free for this caller, i.e. fewer older callers are
+        waiting than there are free slots (and tokens). Returns (granted, seconds
+        to wait), where None means until a slot is released.
+        """
+        def change(state):
+            now = time.time()
+            self._tidy(state, now)
+            state['waiters'][waiter_id] = [os.getpid(), since, now]
+            if state['paused_until'] > now:
+                return False, state['paused_until'] - now
+
+            position = (since, waiter_id)
+            ahead = sum(1 for other_id, other in state['waiters'].items() if (other[1], other_id) < position)
+            if ahead >= int(state['limit']) - len(state['leases']):
+                return False, None
+            if self.rate and state['tokens'] < ahead + 1:
+                return False, (ahead + 1 - state['tokens']) / self.rate
+
+            if self.rate:
+                state['tokens'] -= 1
+            del state['waiters'][waiter_id]
+            state['leases'][waiter_id] = [os.getpid(), now]
+            return True, 0
+        return self.store.update(self.name, self._initial, change)
+
+    def _leave(self, waiter_id):
+        def change(state):
+            state['waiters'].pop(waiter_id, None)
+        self.store.update(self.name, self._initial, change)
+
+    def release(self, lease_id, status=None, retry_after=None):
+        """Give the slot back and adjust the concurrency limit to how the call went."""
+        def change(state):
+            now = time.time()
+            lease = state['leases'].pop(lease_id, None)
+            if is_overload(status):
+                state['throttled'] += 1
+                # One cut per congestion event: calls that started before the last cut already counted
+                if lease is None or lease[1] >= state['decreased_at']:
+                    state['limit'] = max(self.min_concurrency, state['limit'] * AIMD_DECREASE)
+                    state['decreased_at'] = now
+                if retry_after:
+                    state['paused_until'] = max(state['paused_until'], now + min(retry_after, PROVIDER_MAX_BACKOFF))
+            elif status is None:
+                state['limit'] = min(self.max_concurrency, state['limit'] + 1 / state['limit'])
+        self.store.update(self.name, self._initial, change)
+        self.queue.wake_first()
+
+    def _join(self, since, loop=None):
+        waiter = Waiter(since or _work_started.get() or time.time(), loop)
+        self.queue.join(waiter)
+        return waiter
+
+    def _attempt(self, waiter):
+        """
+        Ask the store for a slot if waiter is first in line in this process.
+        Returns (granted, seconds to wait), where None means until woken.
+        """
+        if not self.queue.is_first(waiter):
+            if waiter.in_store:
+                # An older caller joined; it holds this process's place in line now
+                self._leave(waiter.id)
+                waiter.in_store = False
+            return False, None
+        waiter.in_store = True
+        granted, wait = self._try_acquire(waiter.id, waiter.since)
+        if granted:
+            record('provider_queue', time.monotonic() - waiter.queued_at, self.name)
+            return True, 0
+        return False, min(MAX_POLL_INTERVAL, self.store.poll_interval if wait is None else wait)
+
+    def _wait_time(self, waiter, wait):
+        remaining = self.queue_timeout - (time.monotonic() - waiter.queued_at)
+        if remaining <= 0:
+            raise TimeoutError(f"No {self.name} slot became free within {self.queue_timeout:.0f}s")
+        return remaining if wait is None else min(wait, remaining)
+
+    def _depart(self, waiter, granted):
+        self.queue.leave(waiter)
+        if waiter.in_store and not granted:
+            self._leave(waiter.id)
+
+    def acquire(self, since=None):
+        """Wait for a slot; returns a lease id for release."""
+        waiter = self._join(since)
+        granted = False
+        try:
+            while True:
+                waiter.event.clear()
+                granted, wait = self._attempt(waiter)
+                if granted:
+                    return waiter.id
+                waiter.event.wait(self._wait_time(waiter, wait))
+        finally:
+            self._depart(waiter, granted)
+
+    async def acquire_async(self, since=None):
+        """acquire for coroutines; waits without holding a thread."""
+        waiter = self._join(since, asyncio.get_running_loop())
+        granted = False
+        try:
+            while True:
+                waiter.event.clear()
+                granted, wait = self._attempt(waiter)
+                if granted:
+                    return waiter.id
+                timeout = self._wait_time(waiter, wait)
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout)
+                except TimeoutError:
+                    pass
+        finally:
+            self._depart(waiter, granted)
+
+    @contextmanager
+    def slot(self, since=None):
+        """Hold a slot for the block, e.g. while consuming a streamed response. No retries."""
+        lease = self.acquire(since)
+        status = retry_after = None
+        try:
+            yield
+        except BaseException as e:
+            status, retry_after = provider_status(e)
+            status = status or 0
+            raise
+        finally:
+            self.release(lease, status, retry_after)
+
+    @asynccontextmanager
+    async def slot_async(self, since=None):
+        """slot for coroutines; waits without holding a thread."""
+        lease = await self.acquire_async(since)
+        status = retry_after = None
+        try:
+            yield
+        except BaseException as e:
+            status, retry_after = provider_status(e)
+            status = status or 0
+            raise
+        finally:
+            self.release(lease, status, retry_after)
+
+    def _retry_delay(self, error, attempt, idempotent):
+        """Seconds to wait before retrying a failed call, or None if it should not be retried."""
+        status, retry_after = provider_status(error)
+        if not is_overload(status) or attempt >= self.retries:
+            return None
+        if not idempotent and status not in REFUSED_STATUSES:
+            return None
+        delay = retry_after or random.uniform(0, self.backoff * 2 ** attempt)
+        print(f"{self.name} overloaded (HTTP {status}), retrying in {delay:.2f}s")
+        return min(delay, PROVIDER_MAX_BACKOFF)
+
+    def run(self, call, idempotent=True, retry=True, since=None):
+        """
+        Run call() in a slot, retrying overload errors.
+
+        Args:
+            call: Function making one provider request
+            idempotent: False if a 5xx may mean the request took effect (only 429/503 are retried)
+            retry: False if the request cannot be sent twice, e.g. a streamed upload
+            since: Queue position; defaults to the enclosing work_started time
+
+        Returns:
+            Whatever call() returns
+        """
+        since = since or _work_started.get() or time.time()
+        attempt = 0
+        while True:
+            lease = self.acquire(since)
+            try:
+                result = call()
+            except Exception as e:
+                status, retry_after = provider_status(e)
+                self.release(lease, status or 0, retry_after)
+                delay = self._retry_delay(e, attempt, idempotent) if retry else None
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.release(lease)
+            return result
+
+    async def run_async(self, call, idempotent=True, retry=True, since=None):
+        """run for coroutine functions: awaits call() in a slot, retrying overload errors."""
+        since = since or _work_started.get() or time.time()
+        attempt = 0
+        while True:
+            lease = await self.acquire_async(since)
+            try:
+                result = await call()
+            except Exception as e:
+                status, retry_after = provider_status(e)
+                self.release(lease, status or 0, retry_after)
+                delay = self._retry_delay(e, attempt, idempotent) if retry else None
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.release(lease)
+            return result
+
+    def stats(self):
+        def change(state):
+            self._tidy(state, time.time())
+            return {
+                'concurrency_limit': round(state['limit'], 2),
+                'in_flight': len(state['leases']),
+                'waiting': len(state['waiters']),
+                'throttled': state['throttled']
+            }
+        return self.store.update(self.name, self._initial, change)
+
+
+revai_limit = AdaptiveLimit('revai', REV_AI_RATE, REV_AI_MAX_CONCURRENCY)
+gemini_limit = AdaptiveLimit('gemini', GEMINI_RATE, GEMINI_MAX_CONCURRENCY)
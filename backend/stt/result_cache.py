@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+# --- Config ---
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "voice2vital_cache"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1GB
+
+HASH_CHUNK_SIZE = 1024 * 1024
+EVICT_TO = 0.9  # an eviction pass trims the cache to this share of max_bytes, so the next pass is many writes away
+
+
+def sha256_file(file_path):
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_text(*parts):
+    """SHA-256 over one or more strings."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def normalize_transcript(transcript):
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return "\n".join(" ".join(line.split()) for line in transcript.strip().splitlines() if line.strip())
+
+
+class DiskCache:
+    """
+    Content-addressed JSON store on disk with size-based LRU eviction.
+    Entries are touched on read, so file mtime doubles as the LRU clock.
+    The total size is tracked as entries are written; the directory is only
+    scanned once at first write and again when that total passes max_bytes.
+    """
+
+    def __init__(self, root=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None  # bytes on disk, counted on first write
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, namespace, key):
+        path = self._path(namespace, key)
+        with self._lock:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                return None
+            os.utime(path)
+        return value
+
+    def set(self, namespace, key, value):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            # Write then rename so readers never see a half-written entry
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._entries())
+            self._total += os.path.getsize(tmp_path) - self._size(path)
+            os.replace(tmp_path, path)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _path(self, namespace, key):
+        return os.path.join(self.root, namespace, f"{key}.json")
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _entries(self):
+        """(mtime, size, path) of every entry on disk."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        # Rescan rather than trust the running total; other processes may share the directory
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+        self._total = total
+
+
+class ResultCache:
+    """
+    Cache of transcription and extraction results.
+    - "audio" entries are keyed by the SHA-256 of the audio bytes and hold the
+      provider transcript JSON plus the extracted ClinicalNote.
+    - "transcript" entries are keyed by the normalized refined transcript and the
+      extraction prompt, so re-extracting an unchanged transcript is free.
+    """
+
+    def __init__(self, store=None, enabled=RESULT_CACHE_ENABLED):
+        self.enabled = enabled
+        self.store = store if store is not None or not enabled else DiskCache()
+
+    def get_audio(self, audio_hash):
+        if not self.enabled or not audio_hash:
+            return None
+        return self.store.get("audio", audio_hash)
+
+    def set_audio(self, audio_hash, transcript_json, clinical_note=None):
+        if not self.enabled or not audio_hash:
+            return
+        self.store.set("audio", audio_hash, {
+            'transcript': transcript_json,
+            'clinical_note': clinical_note
+        })
+
+    def get_note(self, transcript, prompt_version):
+        if not self.enabled:
+            return None
+        return self.store.get("transcript", sha256_text(normalize_transcript(transcript), prompt_version))
+
+    def set_note(self, transcript, prompt_version, clinical_note):
+        if not self.enabled:
+            return
+        self.store.set("transcript", sha256_text(normalize_transcript(transcript), prompt_version), clinical_note)
+
+
+result_cache = ResultCache()
@@ -0,0 +1,191 @@
+import os
+import json
+import uuid
+import threading
+from dotenv import load_dotenv
+from cache import TTLCache
+
+load_dotenv()
+
+# --- Config ---
+ROW_CACHE_TTL = int(os.getenv("ROW_CACHE_TTL", "300"))  # seconds
+ROW_CACHE_SIZE = int(os.getenv("ROW_CACHE_SIZE", "10000"))
+ROW_CACHE_REDIS_URL = os.getenv("ROW_CACHE_REDIS_URL") or None  # e.g. redis://127.0.0.1:6379/0
+ROW_CACHE_REDIS_PREFIX = os.getenv("ROW_CACHE_REDIS_PREFIX", "v2v:rows:")
+ROW_CACHE_VERSION_TTL = 7 * 24 * 3600  # seconds; versions only need to outlive the values
+ROW_CACHE_ENABLED = os.getenv("ROW_CACHE_ENABLED", "true").lower() == "true"
+
+
+def patient_scope(patient_id):
+    return f"patient:{patient_id}"
+
+
+def doctor_scope(doctor_id):
+    return f"doctor:{doctor_id}"
+
+
+def doctor_patients_scope(doctor_id):
+    return f"doctor_patients:{doctor_id}"
+
+
+class RowCache:
+    """
+    Read-through cache for rows that rarely change (patients, doctors and
+    per-doctor patient lists).
+
+    Values live in an in-process LRU, optionally backed by a Redis-compatible
+    server shared by every worker. Entries are grouped by scope ("patient:7"),
+    with any number of variants per scope (e.g. one per page of a list), and
+    invalidating a scope drops all of its variants.
+
+    With Redis each scope has a version stored in Redis and the version is part
+    of every key, so an invalidation in one process is seen by all the others
+    on their next lookup, while the value itself is still served from memory.
+    If Redis is unreachable, lookups go straight to the database.
+    """
+
+    def __init__(self, max_size=ROW_CACHE_SIZE, ttl=ROW_CACHE_TTL, redis_url=ROW_CACHE_REDIS_URL,
+                 prefix=ROW_CACHE_REDIS_PREFIX, enabled=ROW_CACHE_ENABLED):
+        self.local = TTLCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self.enabled = enabled
+        self.loads = 0
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self._redis = None
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        if self.redis_url and self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._redis
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _version(self, scope):
+        """Current version of a scope in Redis, creating one if it has none yet."""
+        version_key = f"{self.prefix}version:{scope}"
+        version = self.redis.get(version_key)
+        if version is None:
+            self.redis.set(version_key, uuid.uuid4().hex, nx=True, ex=ROW_CACHE_VERSION_TTL)
+            version = self.redis.get(version_key)
+        return version.decode() if isinstance(version, bytes) else version
+
+    def get_or_load(self, scope, loader, variant=""):
+        """
+        Return the cached value for (scope, variant), calling loader() on a miss.
+        A loader result of None (row not found) is not cached.
+        """
+        if not self.enabled:
+            return loader()
+
+        if not self.redis_url:
+            key = f"{scope}|{variant}"
+            value = self.local.get(key)
+            if value is None:
+                self._count('loads')
+                value = loader()
+                if value is not None:
+                    self.local.set(key, value)
+            return value
+
+        try:
+            key = f"{scope}|{self._version(scope)}|{variant}"
+            value = self.local.get(key)
+            if value is not None:
+                return value
+            cached = self.redis.get(self.prefix + key)
+        except Exception as e:
+            self._count('redis_errors')
+            print(f"Row cache Redis error ({e}), reading from the database")
+            return loader()
+
+        if cached is not None:
+            self._count('redis_hits')
+            value = json.loads(cached)
+            self.local.set(key, value)
+            return value
+
+        self._count('loads')
+        value = loader()
+        if value is not None:
+            self.local.set(key, value)
+            try:
+                self.redis.set(self.prefix + key, json.dumps(value, default=str), ex=self.ttl)
+            except Exception:
+                self._count('redis_errors')
+        return value
+
+    def invalidate(self, *scopes):
+        """Drop every cached variant of the given scopes, in this process and in Redis."""
+        for scope in scopes:
+            self.local.invalidate_where(lambda key, value: key.startswith(f"{scope}|"))
+            if self.redis_url:
+                try:
+                    # A new version orphans the old keys; they expire on their own
+                    self.redis.set(f"{self.prefix}version:{scope}", uuid.uuid4().hex, ex=ROW_CACHE_VERSION_TTL)
+                except Exception as e:
+                    self._count('redis_errors')
+                    print(f"Row cache Redis error while invalidating {scope}: {e}")
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        stats = self.local.stats()
+        with self._lock:
+            stats.update({
+                'redis': bool(self.redis_url),
+                'redis_hits': self.redis_hits,
+                'redis_errors': self.redis_errors,
+                'loads': self.loads
+            })
+        return stats
+
+
+# Shared by the API and the MCP server. Only with Redis do they share entries
+# and invalidations; server.py turns its copy off otherwise.
+row_cache = RowCache()
+
+
+def cached_patient(supabase, patient_id):
+    """patient_table row by id, or None."""
+    def load():
+        result = supabase.table('patient_table').select('*').eq('id', patient_id).execute()
+        return result.data[0] if result.data else None
+    return row_cache.get_or_load(patient_scope(patient_id), load)
+
+
+def cached_doctor(supabase, doctor_id):
+    """doctor_table row by id without the password, or None."""
+    def load():
+        result = supabase.table('doctor_table').select('*').eq('id', doctor_id).execute()
+        if not result.data:
+            return None
+        return {k: v for k, v in result.data[0].items() if k != 'password'}
+    return row_cache.get_or_load(doctor_scope(doctor_id), load)
+
+
+def forget_patients(rows, previous_physicians=()):
+    """
+    Invalidate cached patient rows and the patient lists of their doctors.
+    previous_physicians are the doctors the rows were assigned to before the
+    write, whose lists change too when a patient is reassigned.
+    """
+    scopes = {doctor_patients_scope(doctor_id) for doctor_id in previous_physicians if doctor_id is not None}
+    for row in rows:
+        if row.get('id') is not None:
+            scopes.add(patient_scope(row['id']))
+        if row.get('primary_physician') is not None:
+            scopes.add(doctor_patients_scope(row['primary_physician']))
+    row_cache.invalidate(*scopes)
+
+
+def forget_doctor(doctor_id):
+    row_cache.invalidate(doctor_scope(doctor_id))
@@ -0,0 +1,210 @@
+import os
+import re
+import shutil
+import subprocess
+from dataclasses import dataclass
+
+# --- Config ---
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "300"))
+SEGMENT_OVERLAP = float(os.getenv("TRANSCRIBE_SEGMENT_OVERLAP", "5"))  # seconds shared by neighbouring segments
+SILENCE_SEARCH_WINDOW = float(os.getenv("TRANSCRIBE_SILENCE_WINDOW", "30"))  # how far a cut may move to reach silence
+SILENCE_NOISE_DB = os.getenv("TRANSCRIBE_SILENCE_NOISE_DB", "-30dB")
+SILENCE_MIN_DURATION = float(os.getenv("TRANSCRIBE_SILENCE_MIN_DURATION", "0.5"))
+WORD_MATCH_TOLERANCE = 0.5  # seconds between two timestamps of the same word
+
+
+@dataclass
+class Segment:
+    """
+    A slice of the recording. start/end is the audio actually sent to the
+    provider (including overlap); own_start/own_end is the part of the
+    timeline whose words are taken from this segment when stitching.
+    """
+    index: int
+    start: float
+    end: float
+    own_start: float
+    own_end: float
+    path: str = None
+
+
+def ffmpeg_available():
+    return shutil.which(FFMPEG_BIN) is not None and shutil.which(FFPROBE_BIN) is not None
+
+
+def probe_duration(file_path):
+    """Return the duration of an audio file in seconds."""
+    result = subprocess.run(
+        [FFPROBE_BIN, "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", file_path],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip())
+
+
+def detect_silences(file_path, noise=SILENCE_NOISE_DB, min_duration=SILENCE_MIN_DURATION):
+    """Return (start, end) pairs of silent stretches found by ffmpeg's silencedetect filter."""
+    result = subprocess.run(
+        [FFMPEG_BIN, "-hide_banner", "-nostats", "-i", file_path,
+         "-af", f"silencedetect=noise={noise}:d={min_duration}", "-f", "null", "-"],
+        capture_output=True, text=True, check=True
+    )
+    starts = [float(x) for x in re.findall(r"silence_start: (-?[\d.]+)", result.stderr)]
+    ends = [float(x) for x in re.findall(r"silence_end: ([\d.]+)", result.stderr)]
+    return list(zip(starts, ends))
+
+
+def plan_segments(duration, silences, target=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP,
+                  window=SILENCE_SEARCH_WINDOW):
+    """
+    Choose cut points roughly every `target` seconds, moved to the middle of the
+    nearest silence within `window` seconds so cuts rarely land mid-word.
+    """
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+    cuts = [0.0]
+    while duration - cuts[-1] > target + window:
+        ideal = cuts[-1] + target
+        nearby = [m for m in midpoints if abs(m - ideal) <= window and m > cuts[-1] + overlap]
+        cuts.append(min(nearby, key=lambda m: abs(m - ideal)) if nearby else ideal)
+    cuts.append(duration)
+
+    return [
+        Segment(
+            index=i,
+            start=max(0.0, cuts[i] - overlap),
+            end=min(duration, cuts[i + 1] + overlap),
+            own_start=cuts[i],
+            own_end=cuts[i + 1]
+        )
+        for i in range(len(cuts) - 1)
+    ]
+
+
+def cut_segment(file_path, segment, out_path):
+    """Write one segment of the recording to out_path as mono 16 kHz FLAC."""
+    subprocess.run(
+        [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+         "-ss", f"{segment.start:.3f}", "-t", f"{segment.end - segment.start:.3f}",
+         "-i", file_path, "-vn", "-ac", "1", "-ar", "16000", out_path],
+        check=True
+    )
+    segment.path = out_path
+    return segment
+
+
+def split_audio(file_path, work_dir, target=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP):
+    """
+    Split a recording at silence boundaries into overlapping segments.
+    Returns a single segment covering the whole file when it is short enough.
+    """
+    duration = probe_duration(file_path)
+    if duration <= target + SILENCE_SEARCH_WINDOW:
+        return [Segment(0, 0.0, duration, 0.0, duration, file_path)]
+
+    segments = plan_segments(duration, detect_silences(file_path), target, overlap)
+    for segment in segments:
+        cut_segment(file_path, segment, os.path.join(work_dir, f"segment_{segment.index:03d}.flac"))
+    return segments
+
+
+def _shifted_words(transcript, segment):
+    """
+    Flatten a segment transcript into (speaker, element) pairs on the recording's
+    timeline. Punctuation has no timestamps and inherits the preceding word's.
+    """
+    words = []
+    last_ts = segment.start
+    for mono in transcript.get("monologues", []):
+        for element in mono["elements"]:
+            element = dict(element)
+            if "ts" in element:
+                element["ts"] = round(element["ts"] + segment.start, 3)
+                element["end_ts"] = round(element.get("end_ts", element["ts"] - segment.start) + segment.start, 3)
+                last_ts = element["ts"]
+            words.append((mono["speaker"], element, last_ts))
+    return words
+
+
+def _normalize_word(value):
+    return re.sub(r"[^\w']", "", value).lower()
+
+
+def match_speakers(previous_words, words, mapping_so_far, overlap_start, overlap_end, next_speaker):
+    """
+    Map a segment's local speaker labels onto the stitched transcript's labels.
+    Words heard in both segments' overlap vote for which labels are the same
+    person; labels without votes take the lowest unclaimed existing label, or a
+    new one. Returns (mapping, next_speaker).
+    """
+    previous = [(mapping_so_far.get(speaker, speaker), el) for speaker, el, ts in previous_words
+                if el.get("type") == "text" and overlap_start <= ts <= overlap_end]
+    votes = {}
+    for local, element, ts in words:
+        if element.get("type") != "text" or not (overlap_start <= ts <= overlap_end):
+            continue
+        value = _normalize_word(element["value"])
+        for global_speaker, prev in previous:
+            if _normalize_word(prev["value"]) == value and abs(prev["ts"] - element["ts"]) <= WORD_MATCH_TOLERANCE:
+                votes[(local, global_speaker)] = votes.get((local, global_speaker), 0) + 1
+                break
+
+    mapping = {}
+    claimed = set()
+    for (local, global_speaker), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if local not in mapping and global_speaker not in claimed:
+            mapping[local] = global_speaker
+            claimed.add(global_speaker)
+
+    known = sorted(set(range(next_speaker)) - claimed)
+    for local in sorted({speaker for speaker, _, _ in words}):
+        if local in mapping:
+            continue
+        if known:
+            mapping[local] = known.pop(0)
+        else:
+            mapping[local] = next_speaker
+            next_speaker += 1
+    return mapping, next_speaker
+
+
+def stitch_transcripts(segments, transcripts):
+    """
+    Merge per-segment provider transcripts into one transcript in the same
+    monologue format, so refine_transcript can consume it unchanged.
+    Each word is taken from the segment that owns its timestamp, which drops
+    the duplicates heard in the overlaps.
+    """
+    monologues = []
+    previous_words = []
+    previous_mapping = {}
+    next_speaker = 0
+
+    for segment, transcript in zip(segments, transcripts):
+        words = _shifted_words(transcript, segment)
+        if segment.index == 0:
+            local_speakers = sorted({speaker for speaker, _, _ in words})
+            mapping = {speaker: i for i, speaker in enumerate(local_speakers)}
+            next_speaker = len(local_speakers)
+        else:
+            mapping, next_speaker = match_speakers(previous_words, words, previous_mapping,
+                                                   segment.start, segments[segment.index - 1].end, next_speaker)
+
+        last_own_segment = segment.index == len(segments) - 1
+        for local, element, ts in words:
+            if ts < segment.own_start or (ts >= segment.own_end and not last_own_segment):
+                continue
+            speaker = mapping[local]
+            if monologues and monologues[-1]["speaker"] == speaker:
+                elements = monologues[-1]["elements"]
+                if element.get("type") == "text" and elements[-1].get("type") == "text":
+                    # Words joined across a cut lose the space between them
+                    elements.append({"type": "punct", "value": " "})
+                elements.append(element)
+            elif element.get("type") == "text":
+                monologues.append({"speaker": speaker, "elements": [element]})
+
+        previous_words, previous_mapping = words, mapping
+
+    return {"monologues": monologues}
@@ -42,21 +42,41 @@
 # basic import 
 import os
 import json
+import hashlib
 from typing import List, Dict, Any
 from fastmcp import FastMCP
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from cache import TTLCache
+from outbound import supabase_options
+from row_cache import row_cache, cached_patient, cached_doctor
 
 # Load environment variables
 load_dotenv()
 
+# The API invalidates rows it writes; without Redis those invalidations never
+# reach this process, so it would serve stale patients until the TTL ran out
+if not row_cache.redis_url:
+    row_cache.enabled = False
+
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")  # Using SUPABASE_KEY from your .env
-supabase: Client = create_client(url, key)
+supabase: Client = create_client(url, key, options=supabase_options())
 
 # instantiate an MCP server client
 mcp = FastMCP("MCP_Server")
 
+# Tools and table schemas are all defined in this file, so its contents
+# identify the catalog the server exposes
+with open(__file__, 'rb') as server_source:
+    CATALOG_VERSION = hashlib.sha256(server_source.read()).hexdigest()[:12]
+
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", "300"))  # seconds
+catalog_cache = TTLCache(max_size=16, ttl=SCHEMA_CACHE_TTL)
+FUZZY_SEARCH_MIN_SCORE = float(os.getenv("FUZZY_SEARCH_MIN_SCORE", "0.3"))  # pg_trgm word similarity
+FUZZY_SEARCH_MAX_RESULTS = int(os.getenv("FUZZY_SEARCH_MAX_RESULTS", "50"))
+MCP_PORT = int(os.getenv("MCP_PORT", "8008"))
+
 # Configure the server to run on all interfaces for Docker
 def run_server(transport="stdio", host="localhost", port=8008):
     """Run the MCP server with configurable transport"""
@@ -73,7 +93,8 @@ def get_clinical_notes(doctor_id: str = None, patient_name: str = None, limit: i
         limit: Maximum number of records to return (default 10)
     
     Returns:
-        JSON string containing clinical notes data
+        JSON string containing clinical notes data. Notes stored inline carry the
+        full note in note_json; older notes only have a storage URL in Note.
     """
     try:
         query = supabase.table('clinical_notes').select('*')
@@ -104,18 +125,24 @@ def get_patient_info(patient_id: str = None, medical_record_number: str = None)
     
     Args:
         patient_id: Patient ID to search for
-        medical_record_number: Medical record number to search for
+        medical_record_number: Medical record number (the patient's id_number) to search for
         
     Returns:
         JSON string containing patient data
     """
     try:
-        query = supabase.table('patients').select('*')
-        
         if patient_id:
-            query = query.eq('id', patient_id)
-        elif medical_record_number:
-            query = query.eq('medical_record_number', medical_record_number)
+            # Served from the row cache shared with the API
+            patient = cached_patient(supabase, int(patient_id))
+            if patient:
+                return json.dumps({"success": True, "data": patient}, indent=2)
+            return json.dumps({"success": True, "message": "No patient found"})
+
+        query = supabase.table('patient_table').select('*')
+        
+        if medical_record_number:
+            # patient_table keys patients on id_number; there is no separate record number column
+            query = query.eq('id_number', medical_record_number)
         else:
             return json.dumps({"success": False, "error": "Either patient_id or medical_record_number is required"})
             
@@ -175,12 +202,12 @@ def get_doctor_info(doctor_id: str) -> str:
         JSON string containing doctor data
     """
     try:
-        result = supabase.table('doctors').select('*').eq('id', doctor_id).execute()
+        doctor = cached_doctor(supabase, int(doctor_id))
         
-        if result.data:
+        if doctor:
             return json.dumps({
                 "success": True,
-                "data": result.data[0]
+                "data": doctor
             }, indent=2)
         else:
             return json.dumps({"success": True, "message": "No doctor found"})
@@ -252,6 +279,18 @@ def execute_custom_query(table_name: str, filters: str = None, columns: str = "*
     except Exception as e:
         return json.dumps({"success": False, "error": str(e)})
 
+@mcp.tool()
+def get_catalog_version() -> str:
+    """
+    Get the version stamp of the database context and tool catalog.
+    Clients can cache get_database_context, get_table_relationships and the
+    tool list until this value changes.
+    
+    Returns:
+        JSON string containing the catalog version
+    """
+    return json.dumps({"success": True, "catalog_version": CATALOG_VERSION})
+
 @mcp.tool()
 def get_database_context() -> str:
     """
@@ -261,6 +300,18 @@ def get_database_context() -> str:
     Returns:
         JSON string containing all tables and their column information
     """
+    # The context is near-static, so the per-table probes only run once per TTL
+    cached = catalog_cache.get('database_context')
+    if cached is not None:
+        return cached
+
+    context = build_database_context()
+    if '"error"' not in context:
+        catalog_cache.set('database_context', context)
+    return context
+
+def build_database_context() -> str:
+    """Build the get_database_context payload, probing each table for data."""
     try:
         # Actual tables in your database
         tables = [
@@ -309,6 +360,20 @@ def get_database_context() -> str:
                         "allergies": "Known allergies",
                         "med_conditions": "Medical conditions"
                     }
+                },
+                "clinical_notes": {
+                    "columns": [
+                        "id", "Note", "note_json", "patient_id", "doctor_id", "created_at"
+                    ],
+                    "description": "Clinical notes generated from consultation recordings",
+                    "searchable_fields": [],
+                    "key_fields": {
+                        "id": "Primary key",
+                        "Note": "Storage URL of the note (only for notes kept in the Notes bucket)",
+                        "note_json": "The structured clinical note itself (for notes stored inline)",
+                        "patient_id": "References patient_table.id",
+                        "doctor_id": "References doctor_table.id"
+                    }
                 }
             }
         }
@@ -327,6 +392,7 @@ def get_database_context() -> str:
                 database_context["table_schemas"][table]["error"] = str(table_error)
                 database_context["table_schemas"][table]["accessible"] = False
         
+        database_context["catalog_version"] = CATALOG_VERSION
         return json.dumps(database_context, indent=2)
         
     except Exception as e:
@@ -404,7 +470,56 @@ def search_patients(search_term: str, search_field: str = "first_name", limit: i
             "count": len(result.data),
             "patients": result.data
         }, indent=2)
-        
+
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@mcp.tool()
+def fuzzy_search(search_term: str, table_name: str = "patient_table", limit: int = 5,
+                 primary_physician: int = None) -> str:
+    """
+    Find patients or doctors by name even when it is misspelled ("Emely" finds "Emily").
+    Results are ranked best match first, each with a score between 0 and 1.
+    Patients also match on the start of their id_number.
+
+    Args:
+        search_term: Name (first, last or both) or id_number prefix to look for
+        table_name: patient_table or doctor_table
+        limit: Maximum number of results
+        primary_physician: Only return patients of this doctor id (patient_table only)
+
+    Returns:
+        JSON string containing ranked search results
+    """
+    try:
+        functions = {"patient_table": "search_patients_fuzzy", "doctor_table": "search_doctors_fuzzy"}
+        if table_name not in functions:
+            return json.dumps({
+                "success": False,
+                "error": f"Invalid table name. Valid tables: {list(functions)}"
+            })
+
+        params = {
+            "search_term": search_term.strip(),
+            "max_results": max(1, min(limit, FUZZY_SEARCH_MAX_RESULTS)),
+            "min_score": FUZZY_SEARCH_MIN_SCORE
+        }
+        if table_name == "patient_table" and primary_physician is not None:
+            params["physician_id"] = primary_physician
+
+        # Ranking runs in Postgres on the trigram indexes (migrations/004_search_trigram_indexes.sql)
+        result = supabase.rpc(functions[table_name], params).execute()
+        row_key = "patient" if table_name == "patient_table" else "doctor"
+        matches = [dict(row[row_key], score=round(row["score"], 3)) for row in result.data or []]
+
+        return json.dumps({
+            "success": True,
+            "table": table_name,
+            "search_term": search_term,
+            "count": len(matches),
+            "data": matches
+        }, indent=2)
+
     except Exception as e:
         return json.dumps({"success": False, "error": str(e)})
 
@@ -447,6 +562,7 @@ def get_table_relationships() -> str:
         
         return json.dumps({
             "success": True,
+            "catalog_version": CATALOG_VERSION,
             "relationships": relationships,
             "notes": [
                 "Use first_name or last_name to search for people",
@@ -608,4 +724,4 @@ def get_table_schema(table_name: str) -> str:
 if __name__ == "__main__":
     print("Starting MCP server...")
     print(f"Supabase URL: {url}")
-    run_server(transport="streamable-http", host="localhost", port=8008)
\ No newline at end of file
+    run_server(transport="streamable-http", host="localhost", port=MCP_PORT)
\ No newline at end of file
@@ -0,0 +1,53 @@
+import os
+import re
+import time
+
+os.environ.setdefault('GEMINI_API_KEY', 'stub-key')
+
+from live import LiveSession, FakeStreamingProvider, FAKE_SCRIPT
+from processing import ClinicalNote, merge_notes
+
+FRAME_SIZE = 4000  # bytes per recorded frame
+BYTES_PER_UTTERANCE = 16000
+
+extracted_windows = []
+
+
+def fake_extract(window, index):
+    """Stands in for Gemini: picks medications and allergies out of the window."""
+    extracted_windows.append(window)
+    time.sleep(0.05)
+    return ClinicalNote.model_validate({
+        "patient_info": {},
+        "medications": re.findall(r"Just (\w+ \d+ mg)", window),
+        "allergies": re.findall(r"allergic to (\w+)", window),
+        "previous_history": {}, "review_of_systems": {}, "physical_exam": {}
+    })
+
+
+session = LiveSession(FakeStreamingProvider(bytes_per_utterance=BYTES_PER_UTTERANCE),
+                      draft_interval=0, extract=fake_extract, merge=merge_notes)
+
+# Record the consultation frame by frame, stopping halfway through the last utterance
+total_bytes = (len(FAKE_SCRIPT) - 0.5) * BYTES_PER_UTTERANCE
+sent = 0
+while sent < total_bytes:
+    session.feed(b"\0" * FRAME_SIZE)
+    sent += FRAME_SIZE
+    time.sleep(0.01)
+
+snapshot = session.snapshot()
+print(f"While recording: {snapshot['line_count']} lines, {snapshot['drafted_lines']} drafted, partial '{snapshot['partial']}'")
+assert snapshot['draft_note'] is not None, "Draft note was never updated during recording"
+assert snapshot['partial'], "Expected a partial hypothesis for the unfinished utterance"
+
+note = session.finish()
+transcript = session.transcript()
+expected = "\n".join(f"Person {u['speaker'] + 1}: {u['text']}" for u in FAKE_SCRIPT)
+
+assert transcript == expected, transcript
+assert note.medications == ["lisinopril 10 mg"], note.medications
+assert note.allergies == ["penicillin"], note.allergies
+# The final pass only re-reads the tail, not the whole consultation
+assert len(extracted_windows[-1].split("\n")) < len(FAKE_SCRIPT), extracted_windows[-1]
+print(f"Final note from {len(extracted_windows)} incremental extractions, last window {len(extracted_windows[-1].splitlines())} lines")
@@ -0,0 +1,45 @@
+import time
+import asyncio
+from metrics import Histogram, span, record, start_trace, end_trace, stage_seconds
+from event_loop import run_sync
+
+# --- Histogram buckets are cumulative and "le" is inclusive ---
+histogram = Histogram("test_seconds", "Test histogram", labelnames=("stage",), buckets=(0.1, 1, 10))
+for value in (0.05, 0.1, 0.5, 5, 50):
+    histogram.observe(value, "upload")
+lines = histogram.render()
+assert 'test_seconds_bucket{stage="upload",le="0.1"} 2' in lines, lines
+assert 'test_seconds_bucket{stage="upload",le="1"} 3' in lines, lines
+assert 'test_seconds_bucket{stage="upload",le="+Inf"} 5' in lines, lines
+assert 'test_seconds_count{stage="upload"} 5' in lines, lines
+
+
+# --- Spans reach the request trace across threads and the shared event loop ---
+async def pipeline():
+    with span("speech_to_text", "fake"):
+        await asyncio.sleep(0.01)
+    await asyncio.to_thread(record, "poll_sleep", 0.5, "fake")
+
+
+trace, token = start_trace("t-1")
+try:
+    with span("pipeline"):
+        run_sync(pipeline())
+    try:
+        with span("extraction", "fake"):
+            raise ValueError("model overloaded")
+    except ValueError:
+        pass
+finally:
+    end_trace(token)
+
+# Outside the trace, spans only feed the histogram
+with span("pipeline"):
+    time.sleep(0.001)
+
+result = trace.to_dict()
+stages = {(s["stage"], s["outcome"]) for s in result["spans"]}
+assert result["id"] == "t-1"
+assert stages == {("pipeline", "ok"), ("speech_to_text", "ok"), ("poll_sleep", "ok"), ("extraction", "error")}, stages
+assert 'voice2vital_pipeline_stage_seconds_count{stage="pipeline",provider="",outcome="ok"} 2' in stage_seconds.render()
+print(f"Trace with {len(result['spans'])} spans: {sorted(stages)}")
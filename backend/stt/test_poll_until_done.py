@@ -0,0 +1,81 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Local stub of the Rev.ai job API ---
+STUB_PORT = 8765
+JOB_COUNT = 200
+TURNAROUND = 2.0  # seconds until a stub job reports "transcribed"
+
+os.environ['REV_AI_URL'] = f"http://127.0.0.1:{STUB_PORT}"
+os.environ.setdefault('REV_AI_TOKEN', 'stub-token')
+os.environ.setdefault('GEMINI_API_KEY', 'stub-key')
+
+from transcribe import poll_until_done, job_completions
+
+job_started = {}
+status_requests = 0
+
+
+class StubRevAiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        global status_requests
+        job_id = self.path.rstrip('/').split('/')[-1]
+        status_requests += 1
+        done = time.time() - job_started.get(job_id, time.time()) >= TURNAROUND
+        body = json.dumps({
+            "id": job_id,
+            "status": "transcribed" if done else "in_progress",
+            "created_on": "2025-01-01T00:00:00Z"
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def wait_for_all():
+    now = time.time()
+    for i in range(JOB_COUNT):
+        job_started[f"job-{i}"] = now
+    await asyncio.gather(*(poll_until_done(job_id, timeout=30, initial_delay=0.5, max_delay=4)
+                           for job_id in job_started))
+
+
+async def wait_with_callback():
+    job_started["callback-job"] = time.time() - TURNAROUND + 0.1  # finishes just before the callback
+    waiter = asyncio.create_task(poll_until_done("callback-job", timeout=30, initial_delay=20, max_delay=20))
+    await asyncio.sleep(0.2)
+    # Simulate the webhook arriving from another thread
+    threading.Thread(target=job_completions.notify, args=("callback-job",)).start()
+    await waiter
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", STUB_PORT), StubRevAiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    start = time.time()
+    asyncio.run(wait_for_all())
+    elapsed = time.time() - start
+    print(f"{JOB_COUNT} jobs finished in {elapsed:.2f}s with {status_requests} status requests")
+    assert elapsed < TURNAROUND + 5, "poller added too much latency"
+
+    start = time.time()
+    asyncio.run(wait_with_callback())
+    elapsed = time.time() - start
+    print(f"Callback woke the poller after {elapsed:.2f}s")
+    assert elapsed < 5, "callback did not wake the poller"
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
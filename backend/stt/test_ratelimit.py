@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+import tempfile
+import threading
+from ratelimit import AdaptiveLimit, MemoryLimitStore, SQLiteLimitStore
+
+
+class Overloaded(Exception):
+    """Provider error shaped like requests.HTTPError, with a response carrying the status."""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type('Response', (), {'status_code': status, 'headers': {}})()
+
+
+# --- AIMD: a provider that refuses more than 4 calls at once ---
+in_flight = 0
+refused = 0
+lock = threading.Lock()
+
+
+def provider_call():
+    global in_flight, refused
+    with lock:
+        in_flight += 1
+        over = in_flight > 4
+        if over:
+            refused += 1
+    try:
+        if over:
+            raise Overloaded(429)
+        time.sleep(0.01)
+        return "ok"
+    finally:
+        with lock:
+            in_flight -= 1
+
+
+limit = AdaptiveLimit('fake', max_concurrency=16, retries=8, backoff=0.01, store=MemoryLimitStore())
+results = []
+
+
+def worker():
+    for _ in range(20):
+        results.append(limit.run(provider_call))
+
+
+threads = [threading.Thread(target=worker) for _ in range(16)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+stats = limit.stats()
+assert results == ["ok"] * 320, len(results)
+assert refused > 0 and stats['throttled'] == refused, (refused, stats)
+assert stats['concurrency_limit'] < 16 and stats['in_flight'] == 0 and stats['waiting'] == 0, stats
+print(f"AIMD settled at {stats['concurrency_limit']} after {refused} refusals")
+
+# Errors other than 429/5xx are not retried
+calls = []
+
+
+def bad_request():
+    calls.append(1)
+    raise Overloaded(400)
+
+
+try:
+    limit.run(bad_request)
+    raise AssertionError("expected the 400 to be raised")
+except Overloaded:
+    assert len(calls) == 1
+
+# --- Waiting calls are served oldest first ---
+serial = AdaptiveLimit('serial', max_concurrency=1, store=MemoryLimitStore())
+order = []
+held = serial.acquire()
+
+
+def queued(since):
+    serial.run(lambda: order.append(since), since=since)
+
+
+waiters = []
+for since in (300.0, 100.0, 200.0):
+    waiters.append(threading.Thread(target=queued, args=(since,)))
+    waiters[-1].start()
+    time.sleep(0.05)
+serial.release(held)
+for thread in waiters:
+    thread.join()
+assert order == [100.0, 200.0, 300.0], order
+
+# --- Waiters sleep until a release wakes them instead of polling the store ---
+class CountingStore(MemoryLimitStore):
+    updates = 0
+
+    def update(self, name, initial, change):
+        CountingStore.updates += 1
+        return super().update(name, initial, change)
+
+
+counted = AdaptiveLimit('counted', max_concurrency=1, store=CountingStore())
+held = counted.acquire()
+sleepers = [threading.Thread(target=counted.run, args=(lambda: None,)) for _ in range(8)]
+for thread in sleepers:
+    thread.start()
+time.sleep(0.5)
+assert CountingStore.updates <= 3, CountingStore.updates
+counted.release(held)
+for thread in sleepers:
+    thread.join(timeout=5)
+assert not any(thread.is_alive() for thread in sleepers) and counted.stats()['in_flight'] == 0
+
+# Coroutines and threads wait in the same line
+async def async_waiters():
+    served = []
+
+    async def call(since):
+        served.append(since)
+
+    lease = await counted.acquire_async()
+    tasks = [asyncio.create_task(counted.run_async(lambda since=since: call(since), since=since)) for since in (2.0, 1.0)]
+    await asyncio.sleep(0.05)
+    counted.release(lease)
+    await asyncio.wait_for(asyncio.gather(*tasks), 5)
+    return served
+
+
+assert asyncio.run(async_waiters()) == [1.0, 2.0]
+assert counted.stats()['in_flight'] == 0 and counted.stats()['waiting'] == 0
+
+# --- Two workers sharing a SQLite store draw from the same slots ---
+db_path = os.path.join(tempfile.mkdtemp(), "limits.db")
+worker_a = AdaptiveLimit('shared', max_concurrency=2, queue_timeout=0.2, store=SQLiteLimitStore(db_path))
+worker_b = AdaptiveLimit('shared', max_concurrency=2, queue_timeout=0.2, store=SQLiteLimitStore(db_path))
+leases = [worker_a.acquire(), worker_a.acquire()]
+try:
+    worker_b.acquire()
+    raise AssertionError("worker B should have had to wait")
+except TimeoutError:
+    pass
+worker_a.release(leases.pop())
+leases.append(worker_b.acquire())
+assert worker_b.stats()['in_flight'] == 2 and worker_b.stats()['waiting'] == 0
+print(f"Shared limit ok: {worker_a.stats()}")
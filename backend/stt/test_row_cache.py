@@ -0,0 +1,63 @@
+from row_cache import RowCache
+
+
+class FakeRedis:
+    """Just enough of redis.Redis for the row cache, shared like a real server."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+
+loads = []
+
+
+def loader(value):
+    def load():
+        loads.append(value)
+        return value
+    return load
+
+
+# --- In-process only ---
+cache = RowCache(redis_url=None, enabled=True)
+assert cache.get_or_load("doctor_patients:1", loader({"page": 1}), variant="limit=2") == {"page": 1}
+assert cache.get_or_load("doctor_patients:1", loader({"page": 1}), variant="limit=2") == {"page": 1}
+assert cache.get_or_load("doctor_patients:1", loader({"page": 2}), variant="limit=2&cursor=x") == {"page": 2}
+assert cache.get_or_load("doctor_patients:10", loader({"other": True})) == {"other": True}
+assert len(loads) == 3, loads
+
+# Invalidating a scope drops all of its variants, and only that scope
+cache.invalidate("doctor_patients:1")
+cache.get_or_load("doctor_patients:1", loader({"page": 1}), variant="limit=2")
+cache.get_or_load("doctor_patients:10", loader({"other": True}))
+assert len(loads) == 4, loads
+
+# Missing rows are not cached, so a new row shows up right away
+assert cache.get_or_load("patient:5", loader(None)) is None
+assert cache.get_or_load("patient:5", loader({"id": 5})) == {"id": 5}
+
+# --- Two workers sharing Redis ---
+redis = FakeRedis()
+worker_a = RowCache(redis_url="redis://test", enabled=True)
+worker_b = RowCache(redis_url="redis://test", enabled=True)
+worker_a._redis = worker_b._redis = redis
+
+loads.clear()
+assert worker_a.get_or_load("patient:1", loader({"name": "Emily"})) == {"name": "Emily"}
+assert worker_b.get_or_load("patient:1", loader({"name": "unused"})) == {"name": "Emily"}
+assert worker_b.stats()["redis_hits"] == 1 and len(loads) == 1
+
+# An invalidation in one worker reaches the other on its next lookup
+worker_b.invalidate("patient:1")
+assert worker_a.get_or_load("patient:1", loader({"name": "Emely"})) == {"name": "Emely"}
+assert len(loads) == 2, loads
+print(f"Row cache ok: {worker_a.stats()}")
@@ -0,0 +1,49 @@
+from refine import refine_transcript
+from segments import plan_segments, stitch_transcripts
+
+# --- Synthetic consultation: speakers alternate every 10 words, one word every 0.5s ---
+DURATION = 900.0
+TARGET = 300.0
+OVERLAP = 5.0
+
+words = []
+t = 0.0
+i = 0
+while t < DURATION - 1:
+    words.append({"speaker": (i // 10) % 2, "value": f"w{i}", "ts": t, "end_ts": t + 0.4})
+    t += 0.5
+    i += 1
+
+# Silence between turns, so cuts land between speakers
+silences = [(words[n]["end_ts"], words[n + 1]["ts"]) for n in range(9, len(words) - 1, 10)]
+segments = plan_segments(DURATION, silences, target=TARGET, overlap=OVERLAP, window=30)
+
+
+def monologues_for(segment, relabel):
+    """What the provider would return for one segment, with its own speaker labels."""
+    monologues = []
+    for word in words:
+        if not (segment.start <= word["ts"] < segment.end):
+            continue
+        speaker = relabel[word["speaker"]]
+        element = {"type": "text", "value": word["value"], "ts": round(word["ts"] - segment.start, 3),
+                   "end_ts": round(word["end_ts"] - segment.start, 3), "confidence": 1.0}
+        if monologues and monologues[-1]["speaker"] == speaker:
+            monologues[-1]["elements"] += [{"type": "punct", "value": " "}, element]
+        else:
+            monologues.append({"speaker": speaker, "elements": [element]})
+    return {"monologues": monologues}
+
+
+# Diarization labels are independent per segment; flip them on every other one
+transcripts = [monologues_for(s, {0: 1, 1: 0} if s.index % 2 else {0: 0, 1: 1}) for s in segments]
+stitched = stitch_transcripts(segments, transcripts)
+
+expected = monologues_for(segments[0].__class__(0, 0.0, DURATION, 0.0, DURATION), {0: 0, 1: 1})
+
+print(f"Segments: {[(round(s.start, 1), round(s.end, 1)) for s in segments]}")
+assert len(segments) == 3, segments
+assert all(abs(s.own_end - s.own_start - TARGET) <= 30 for s in segments[:-1])
+assert refine_transcript(stitched) == refine_transcript(expected), "Stitched transcript differs from the original"
+assert {m["speaker"] for m in stitched["monologues"]} == {0, 1}
+print(f"Stitched {len(stitched['monologues'])} monologues, speakers reconciled across segments")
@@ -1,13 +1,25 @@
-import time
 import json
+import uuid
+import random
 import asyncio
+import tempfile
+import threading
 from rev_ai import apiclient
+from requests.exceptions import HTTPError
+from rev_ai.models import CustomerUrlData, Job
+from urllib.parse import urljoin
 from dotenv import load_dotenv
 import os
 
 from utils import *
 from refine import refine_transcript
-from processing import ClinicalNote, extract_clinical_note, print_note
+from processing import ClinicalNote, extract_clinical_note, print_note, prompt_version
+from extractors import get_extractor
+from result_cache import result_cache, sha256_file, sha256_text
+from segments import ffmpeg_available, probe_duration, split_audio, stitch_transcripts
+from outbound import get_requests_session
+from metrics import span, record
+from ratelimit import revai_limit
 
 load_dotenv()
 token = os.getenv('REV_AI_TOKEN')
@@ -16,64 +28,346 @@ token = os.getenv('REV_AI_TOKEN')
 TOKEN = token
 FILEPATH = "./consultation_x1_combined_dialogue.mp3"
 RAW_TRANSCRIPT_FILE = "transcript_raw.json"
+REV_AI_URL = os.getenv('REV_AI_URL')  # override to point at a local stub of the job API
+CALLBACK_URL = os.getenv('REV_AI_CALLBACK_URL')  # e.g. https://api.example.com/transcribe/callback
+CALLBACK_SECRET = os.getenv('REV_AI_CALLBACK_SECRET')
+POLL_INITIAL_DELAY = float(os.getenv('REV_AI_POLL_INITIAL_DELAY', '1'))
+POLL_MAX_DELAY = float(os.getenv('REV_AI_POLL_MAX_DELAY', '30'))
+STREAM_CHUNK_SIZE = 256 * 1024  # bytes held in memory at a time when streaming audio
+SPLIT_MODE = os.getenv('TRANSCRIBE_SPLIT_MODE', 'off')  # off|auto
+SPLIT_MIN_SECONDS = float(os.getenv('TRANSCRIBE_SPLIT_MIN_SECONDS', '600'))  # only split recordings longer than this
+SPLIT_MAX_PARALLEL = int(os.getenv('TRANSCRIBE_SPLIT_MAX_PARALLEL', '8'))
+STT_BACKEND = os.getenv('STT_BACKEND', 'revai')  # revai | local
 
 # --- Initialize client ---
-client = apiclient.RevAiAPIClient(TOKEN)
+class PooledRevAiAPIClient(apiclient.RevAiAPIClient):
+    """Rev.ai client that reuses the shared outbound session instead of opening a new one per call."""
+
+    def _make_http_request(self, method, url, **kwargs):
+        headers = self.default_headers.copy()
+        headers.update(kwargs.pop('headers', None) or {})
+        # Every Rev.ai call runs under revai_limit, which decides on 429/5xx retries
+        response = get_requests_session(retry_statuses=False).request(method, url, headers=headers, **kwargs)
+        try:
+            response.raise_for_status()
+            return response
+        except HTTPError as err:
+            if response.content:
+                err.args = (err.args[0] + f"; Server Response : {response.content.decode('utf-8')}",)
+            raise
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Rev.ai API client, created on first use so local-only deployments need no token."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PooledRevAiAPIClient(TOKEN, REV_AI_URL)
+        return _client
+
+
+class JobCompletions:
+    """
+    Thread-safe registry of jobs waiting on a provider callback.
+    The callback route runs on a Flask worker thread, so waiters are woken
+    through their own event loop.
+    """
+
+    def __init__(self):
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def register(self, job_id):
+        """Register the current event loop as waiting on job_id."""
+        event = asyncio.Event()
+        with self._lock:
+            self._waiters[job_id] = (asyncio.get_running_loop(), event)
+        return event
+
+    def discard(self, job_id):
+        with self._lock:
+            self._waiters.pop(job_id, None)
+
+    def notify(self, job_id):
+        """Wake whoever is waiting on job_id. Returns False if nobody is."""
+        with self._lock:
+            waiter = self._waiters.get(job_id)
+        if waiter is None:
+            return False
+        loop, event = waiter
+        loop.call_soon_threadsafe(event.set)
+        return True
+
+
+job_completions = JobCompletions()
+
+def notification_config():
+    """Completion webhook settings for submitted jobs, if a callback URL and secret are configured."""
+    # /transcribe/callback refuses every call without a secret, so jobs just poll
+    if not (CALLBACK_URL and CALLBACK_SECRET):
+        return None
+    return CustomerUrlData(CALLBACK_URL, {"Authorization": f"Bearer {CALLBACK_SECRET}"})
 
 def submit_audio_file(file_path):
     """Submit an audio file for transcription."""
-    job = client.submit_job_local_file(file_path)
+    # A 5xx may still have created the job, so only refusals are resent
+    job = revai_limit.run(
+        lambda: get_client().submit_job_local_file(file_path, notification_config=notification_config()),
+        idempotent=False
+    )
+    print(f"Job submitted with id: {job.id}")
+
+    return job.id
+
+class AudioTooLarge(ValueError):
+    """Raised when a streamed upload goes past its max_bytes."""
+
+
+def submit_audio_stream(stream, filename, max_bytes=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Submit audio for transcription straight from a readable byte stream.
+    The multipart body is sent with chunked transfer encoding as the stream is
+    read, so only one chunk is held in memory and nothing is written to disk.
+    Raises AudioTooLarge once more than max_bytes have been read.
+    """
+    boundary = uuid.uuid4().hex
+    options = {}
+    config = notification_config()
+    if config:
+        options["notification_config"] = config.to_dict()
+
+    def multipart_body():
+        yield (f'--{boundary}\r\n'
+               f'Content-Disposition: form-data; name="media"; filename="{filename}"\r\n'
+               f'Content-Type: application/octet-stream\r\n\r\n').encode()
+        sent = 0
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            sent += len(chunk)
+            if max_bytes is not None and sent > max_bytes:
+                raise AudioTooLarge(f"Audio stream exceeds {max_bytes} bytes")
+            yield chunk
+        yield (f'\r\n--{boundary}\r\n'
+               f'Content-Disposition: form-data; name="options"\r\n\r\n'
+               f'{json.dumps(options, sort_keys=True)}\r\n'
+               f'--{boundary}--\r\n').encode()
+
+    client = get_client()
+    # The stream is consumed by the first attempt, so this one is never resent
+    response = revai_limit.run(lambda: client._make_http_request(
+        "POST",
+        urljoin(client.base_url, 'jobs'),
+        data=multipart_body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    ), retry=False)
+    job = Job.from_json(response.json())
     print(f"Job submitted with id: {job.id}")
 
     return job.id
 
 def poll_job_status(job_id):
     """Poll the job status until it is finished."""
-    job_details = client.get_job_details(job_id)
+    job_details = revai_limit.run(lambda: get_client().get_job_details(job_id))
     return job_details.status    
 
-def poll_until_done(job_id, timeout=300):
-    """Poll the job status until it is finished or times out."""
-    start_time = time.time()
-    while True:
-        job = client.get_job_details(job_id)
-        if job.status == "transcribed":
-            print("Job completed.")
-            return
-        elif job.status == "failed":
-            raise RuntimeError("Transcription job failed.")
-        elif time.time() - start_time > timeout:
-            raise TimeoutError("Polling timed out before transcription finished.")
-        time.sleep(5)  # wait before polling again
+async def poll_until_done(job_id, timeout=300, initial_delay=POLL_INITIAL_DELAY, max_delay=POLL_MAX_DELAY):
+    """
+    Wait for the job to finish or time out.
+    Checks the job status with exponential backoff and jitter, and re-checks
+    immediately when the provider callback fires for this job.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = initial_delay
+    slept = 0.0
+    completed = job_completions.register(job_id)
+    try:
+        while True:
+            completed.clear()
+            with span('poll_status', 'revai'):
+                job = await asyncio.to_thread(revai_limit.run, lambda: get_client().get_job_details(job_id))
+            if job.status == "transcribed":
+                print("Job completed.")
+                return
+            elif job.status == "failed":
+                raise RuntimeError("Transcription job failed.")
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError("Polling timed out before transcription finished.")
+
+            # Full jitter keeps hundreds of waiters from polling in lockstep
+            wait = min(random.uniform(0, delay), remaining)
+            sleep_started = loop.time()
+            try:
+                await asyncio.wait_for(completed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            slept += loop.time() - sleep_started
+            delay = min(delay * 2, max_delay)
+    finally:
+        job_completions.discard(job_id)
+        # One sample for the whole wait; per-sleep samples would swamp the histogram
+        record('poll_sleep', slept, 'revai')
 
 def get_transcript_json(job_id):
     """Get the transcript in JSON format."""
-    transcript = client.get_transcript_json(job_id)
+    transcript = revai_limit.run(lambda: get_client().get_transcript_json(job_id))
     print(f"Transcript retrieved for job id: {job_id}")
     return transcript
 
 def submit_clinical_json(transcript_json):
     """Submit the transcript JSON to Gemini for processing;"""
 
-async def transcribe(file_path) -> ClinicalNote:
-    """Main function to handle the transcription process."""
+class RevAiBackend:
+    """Speech-to-text through Rev.ai async jobs."""
+
+    name = "revai"
+    cache_key = name
+
+    async def transcribe_file(self, file_path, filename=None):
+        """
+        Submit an audio file, wait for the job and return the transcript JSON.
+        If filename is given, the file is streamed to the provider under that name.
+        """
+        with span('upload', self.name):
+            if filename:
+                with open(file_path, 'rb') as audio:
+                    job_id = await asyncio.to_thread(submit_audio_stream, audio, filename)
+            else:
+                job_id = await asyncio.to_thread(submit_audio_file, file_path)
+
+        print("Waiting for transcription to complete...")
+        with span('provider_wait', self.name):
+            await poll_until_done(job_id)
+        with span('fetch_transcript', self.name):
+            return await asyncio.to_thread(get_transcript_json, job_id)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_stt_backend():
+    """Speech-to-text backend selected by STT_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STT_BACKEND == 'local':
+                from local_stt import LocalWhisperBackend
+                _backend = LocalWhisperBackend()
+            else:
+                _backend = RevAiBackend()
+        return _backend
+
+def audio_cache_key(audio_hash, backend):
+    """Result cache key for audio; transcripts from different backends are kept apart."""
+    if backend.cache_key == RevAiBackend.cache_key:
+        return audio_hash
+    return sha256_text(backend.cache_key, audio_hash)
+
+async def transcribe(file_path, filename=None) -> ClinicalNote:
+    """
+    Main function to handle the transcription process.
+    Audio that was already processed is answered from the result cache.
+    If filename is given, Rev.ai receives the file streamed under that name.
+    """
     print(f"Starting transcription for file: {file_path}")
 
-    # Submit audio file for processing
-    job_id = submit_audio_file(file_path)
+    backend = get_stt_backend()
+    with span('hash_audio'):
+        audio_hash = audio_cache_key(await asyncio.to_thread(sha256_file, file_path), backend)
+    cached = result_cache.get_audio(audio_hash)
+    if cached and cached.get('clinical_note'):
+        print(f"Result cache hit for audio {audio_hash[:12]}")
+        return ClinicalNote.model_validate(cached['clinical_note'])
+
+    if cached and cached.get('transcript'):
+        # Transcript is known but extraction never finished; skip the provider
+        print(f"Transcript cache hit for audio {audio_hash[:12]}")
+        return await asyncio.to_thread(extract_from_transcript, cached['transcript'], audio_hash)
+
+    if await asyncio.to_thread(should_split, file_path):
+        return await transcribe_segmented(file_path, audio_hash=audio_hash, backend=backend)
 
+    with span('speech_to_text', backend.name):
+        transcription_json = await backend.transcribe_file(file_path, filename=filename)
+    result_cache.set_audio(audio_hash, transcription_json)
+
+    return await asyncio.to_thread(extract_from_transcript, transcription_json, audio_hash)
+
+async def transcribe_job(job_id, audio_hash=None) -> ClinicalNote:
+    """Wait for a submitted job and turn its transcript into a clinical note."""
     # Wait for job to complete
     print("Waiting for transcription to complete...")
-    poll_until_done(job_id)
+    with span('provider_wait', RevAiBackend.name):
+        await poll_until_done(job_id)
 
     # Get the completed transcript
-    transcription_json = get_transcript_json(job_id)
+    with span('fetch_transcript', RevAiBackend.name):
+        transcription_json = await asyncio.to_thread(get_transcript_json, job_id)
+    result_cache.set_audio(audio_hash, transcription_json)
+
+    return await asyncio.to_thread(extract_from_transcript, transcription_json, audio_hash)
+
+def should_split(file_path):
+    """Whether a recording is long enough to be transcribed in parallel segments."""
+    if SPLIT_MODE != 'auto':
+        return False
+    if not ffmpeg_available():
+        print("ffmpeg not found, transcribing without splitting")
+        return False
+    try:
+        return probe_duration(file_path) > SPLIT_MIN_SECONDS
+    except Exception as e:
+        print(f"Could not read audio duration ({e}), transcribing without splitting")
+        return False
+
+async def transcribe_segmented(file_path, audio_hash=None, backend=None) -> ClinicalNote:
+    """
+    Split a long recording at silences, transcribe the segments in parallel
+    and stitch the results into one transcript.
+    """
+    backend = backend or get_stt_backend()
+    limit = asyncio.Semaphore(SPLIT_MAX_PARALLEL)
 
+    async def transcribe_segment(segment):
+        async with limit:
+            return await backend.transcribe_file(segment.path)
+
+    with tempfile.TemporaryDirectory(prefix="segments_") as work_dir:
+        with span('split_audio'):
+            segments = await asyncio.to_thread(split_audio, file_path, work_dir)
+        print(f"Transcribing {len(segments)} segments in parallel...")
+        with span('speech_to_text', backend.name):
+            transcripts = await asyncio.gather(*(transcribe_segment(segment) for segment in segments))
+
+    with span('stitch_transcripts'):
+        transcription_json = stitch_transcripts(segments, transcripts)
+    result_cache.set_audio(audio_hash, transcription_json)
+
+    return await asyncio.to_thread(extract_from_transcript, transcription_json, audio_hash)
+
+def extract_from_transcript(transcription_json, audio_hash=None) -> ClinicalNote:
+    """Refine a provider transcript and extract the clinical note, reusing cached extractions."""
     # Refine the transcript into a chat-like format
-    refined_transcript = refine_transcript(transcription_json)
+    with span('refine_transcript'):
+        refined_transcript = refine_transcript(transcription_json)
 
     # Create clinical note from refined transcript
-    clinical_note = extract_clinical_note(refined_transcript)
+    version = prompt_version()
+    cached_note = result_cache.get_note(refined_transcript, version)
+    if cached_note:
+        print("Extraction cache hit")
+        clinical_note = ClinicalNote.model_validate(cached_note)
+    else:
+        with span('extraction', get_extractor().name):
+            clinical_note = extract_clinical_note(refined_transcript)
+        result_cache.set_note(refined_transcript, version, clinical_note.model_dump())
+
+    result_cache.set_audio(audio_hash, transcription_json, clinical_note.model_dump())
 
     print("Transcription and processing complete.")
     return clinical_note
@@ -0,0 +1,96 @@
+import os
+import json
+import uuid
+import tempfile
+import threading
+from datetime import datetime
+
+# --- Config ---
+UPLOAD_DIR = os.getenv("CHUNKED_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "voice2vital_uploads"))
+MAX_UPLOAD_SIZE = int(os.getenv("CHUNKED_UPLOAD_MAX_BYTES", str(500 * 1024 * 1024)))  # 500MB
+CHUNK_READ_SIZE = 256 * 1024
+
+
+class OffsetMismatch(Exception):
+    """Raised when a chunk does not start where the upload currently ends."""
+
+    def __init__(self, expected_offset):
+        super().__init__(f"Chunk offset does not match upload offset {expected_offset}")
+        self.expected_offset = expected_offset
+
+
+class ChunkedUploadStore:
+    """
+    Resumable uploads assembled on disk one chunk at a time.
+    The upload offset is the size of the partial file, so a client that lost
+    its connection can ask for the offset and resend from there.
+    """
+
+    def __init__(self, root=UPLOAD_DIR, max_size=MAX_UPLOAD_SIZE):
+        self.root = root
+        self.max_size = max_size
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def create(self, filename, metadata=None):
+        """Start a new upload and return its description."""
+        upload_id = uuid.uuid4().hex
+        meta = {
+            'id': upload_id,
+            'filename': filename,
+            'metadata': metadata or {},
+            'created_at': datetime.utcnow().isoformat()
+        }
+        with open(self._meta_path(upload_id), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        open(self.path(upload_id), 'wb').close()
+        return self.get(upload_id)
+
+    def get(self, upload_id):
+        """Return the upload description with its current offset, or None."""
+        try:
+            with open(self._meta_path(upload_id), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        meta['offset'] = os.path.getsize(self.path(upload_id))
+        return meta
+
+    def append(self, upload_id, offset, stream):
+        """Append a chunk read from stream at offset. Returns the new offset."""
+        with self._lock_for(upload_id):
+            current = os.path.getsize(self.path(upload_id))
+            if offset != current:
+                raise OffsetMismatch(current)
+
+            with open(self.path(upload_id), 'ab') as f:
+                while True:
+                    chunk = stream.read(CHUNK_READ_SIZE)
+                    if not chunk:
+                        break
+                    if f.tell() + len(chunk) > self.max_size:
+                        # Drop the partial chunk so the client can retry from the old offset
+                        f.truncate(current)
+                        raise ValueError(f"Upload exceeds {self.max_size} bytes")
+                    f.write(chunk)
+                return f.tell()
+
+    def path(self, upload_id):
+        return os.path.join(self.root, f"{upload_id}.part")
+
+    def discard(self, upload_id):
+        """Remove the upload's metadata; the data file is left for the caller to clean up."""
+        try:
+            os.unlink(self._meta_path(upload_id))
+        except OSError:
+            pass
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.root, f"{upload_id}.meta")
+
+    def _lock_for(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())